@@ -1,5 +1,6 @@
 # app/config/__init__.py
 from __future__ import annotations
+import logging
 import os
 
 # اختر الإعداد حسب ENV (dev هو الافتراضي)
@@ -12,6 +13,8 @@ else:
 
 settings = Settings()
 
+logger = logging.getLogger(__name__)
+
 # ---- Post-init helpers/warnings ----
 from pathlib import Path
 import os as _os
@@ -24,18 +27,48 @@ if settings.USE_GDRIVE and settings.GOOGLE_APPLICATION_CREDENTIALS:
         from .base import BASE_DIR
         cred_path = BASE_DIR / cred_path
     _os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(cred_path)
-    print("[config] CRED PATH ->", cred_path, cred_path.exists())
+    logger.debug("CRED PATH -> %s (exists=%s)", cred_path, cred_path.exists())
+
+
+def ensure_storage_dirs() -> None:
+    """
+    Create the storage directories. Called once at startup (app lifespan /
+    gunicorn master), not at import time.
+    """
+    settings.STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+    settings.THUMBS_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def web_workers() -> int:
+    """Number of gunicorn workers, with the same default as gunicorn.conf.py."""
+    return int(_os.getenv("WEB_CONCURRENCY", (_os.cpu_count() or 1) * 2 + 1))
+
+
+def db_connections() -> int:
+    """Most connections all workers may open: two engines (sync + async) each."""
+    return web_workers() * 2 * (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
 
-# تأكد من مجلدات التخزين
-settings.STORAGE_DIR.mkdir(parents=True, exist_ok=True)
-settings.THUMBS_DIR.mkdir(parents=True, exist_ok=True)
 
-# تحذيرات Drive
-if settings.USE_GDRIVE:
-    if not settings.GDRIVE_ROOT_FOLDER_ID:
-        print("[config] WARNING: USE_GDRIVE=True but GDRIVE_ROOT_FOLDER_ID is not set.")
-    cred_env = _os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-    if not cred_env or not Path(cred_env).exists():
-        print("[config] WARNING: GOOGLE_APPLICATION_CREDENTIALS is missing or invalid.")
+def check_settings() -> None:
+    """
+    Log the loaded profile and warn about incomplete Drive settings.
 
-print(f"[config] Loaded {settings.ENV} config | USE_GDRIVE={settings.USE_GDRIVE}")
+    Raises:
+        RuntimeError: If the connection pools of all workers could exceed
+            ``DB_MAX_CONNECTIONS`` of a network database.
+    """
+    if not settings.DATABASE_URL.startswith("sqlite"):
+        total = db_connections()
+        if total > settings.DB_MAX_CONNECTIONS:
+            raise RuntimeError(
+                f"{web_workers()} workers x 2 engines x (DB_POOL_SIZE={settings.DB_POOL_SIZE} + "
+                f"DB_MAX_OVERFLOW={settings.DB_MAX_OVERFLOW}) = {total} connections > "
+                f"DB_MAX_CONNECTIONS={settings.DB_MAX_CONNECTIONS}; lower WEB_CONCURRENCY or the pool sizes."
+            )
+    if settings.USE_GDRIVE:
+        if not settings.GDRIVE_ROOT_FOLDER_ID:
+            logger.warning("USE_GDRIVE=True but GDRIVE_ROOT_FOLDER_ID is not set.")
+        cred_env = _os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+        if not cred_env or not Path(cred_env).exists():
+            logger.warning("GOOGLE_APPLICATION_CREDENTIALS is missing or invalid.")
+    logger.info("Loaded %s config | USE_GDRIVE=%s", settings.ENV, settings.USE_GDRIVE)
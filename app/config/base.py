@@ -1,7 +1,7 @@
 # app/config/base.py
 from __future__ import annotations
 from pathlib import Path
-from typing import Optional, List
+from typing import Any, Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # dichfoto_server/ (جذر المشروع)
@@ -15,6 +15,37 @@ class BaseConfig(BaseSettings):
     SITE_TITLE: str = "Dich Foto"
     ENV: str = "base"  # تُغيّر في local/server
 
+    # ===== Database =====
+    DB_POOL_PRE_PING: Optional[bool] = None  # None: معطّل لـ SQLite (ملف محلي)، مفعّل لقواعد الشبكة
+    DB_STATS_HEADER: Optional[bool] = None   # ترويسة X-DB-Stats لكل طلب؛ None: مفعّلة خارج prod
+    AUTO_MIGRATE: bool = True                # alembic upgrade head عند بدء كل عامل (lifespan)؛ في prod يتولاها gunicorn.conf.py
+    # pool لكل محرك ولكل عامل gunicorn (لا يُطبَّق على SQLite). مجموع الاتصالات
+    # الأقصى = العمال × 2 (sync + async) × (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    # ويجب أن يبقى دون DB_MAX_CONNECTIONS (max_connections في Postgres، 100
+    # افتراضيًا)، وإلا رفض check_settings الإقلاع. 2+3 تكفي 9 عمال (4 أنوية)؛
+    # لأجهزة أكبر اضبط WEB_CONCURRENCY أو القيم هنا.
+    DB_POOL_SIZE: int = 2
+    DB_MAX_OVERFLOW: int = 3
+    DB_MAX_CONNECTIONS: int = 100
+    DB_POOL_TIMEOUT: int = 30      # ثوانٍ انتظار اتصال حر قبل الخطأ
+    DB_POOL_RECYCLE: int = 1800    # أعد فتح الاتصالات الأقدم من هذا (خلف pgbouncer/جدران نارية)
+
+    # ===== Metrics (Prometheus) =====
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: Optional[str] = None  # إن ضُبط: /metrics يتطلب Authorization: Bearer <token>
+
+    # ===== Tracing (upload / rotate pipeline) =====
+    TRACE_FILE: Optional[Path] = None          # JSON-lines: spans + ملخص لكل رفع
+    TRACE_OTLP_ENDPOINT: Optional[str] = None  # مثال: http://localhost:4318/v1/traces
+
+    # ===== Password verification / brute-force protection =====
+    PASSWORD_WORKERS: int = 2          # خيوط bcrypt المخصصة (لا تشارك threadpool المعرض)
+    PASSWORD_QUEUE_MAX: int = 16       # أقصى تحقّقات جارية/منتظرة قبل الرد بـ 429
+    UNLOCK_RATE_PER_MINUTE: int = 10   # لكل (slug, IP)
+    UNLOCK_BURST: int = 5
+    UNLOCK_MAX_FAILURES: int = 10
+    UNLOCK_LOCKOUT_SECONDS: int = 900
+
     # ===== Upload service =====
     UPLOAD_BASE_URL: str = "https://upload.dichfoto.com"
 
@@ -25,17 +56,84 @@ class BaseConfig(BaseSettings):
     STORAGE_DIR: Path = BASE_DIR / "storage"
     THUMBS_DIR: Path = STORAGE_DIR / "_thumbs"
     THUMB_MAX_WIDTH: int = 800
+    # إن ضُبط (مثل "/_protected/") يرسل التطبيق X-Accel-Redirect فقط ويترك
+    # nginx يخدم الأصل (sendfile + Range). مثال nginx:
+    #   location /_protected/ { internal; alias /home/dichfoto/storage/; }
+    X_ACCEL_REDIRECT_PREFIX: Optional[str] = None
 
     # ===== Image / thumbnail options =====
     FORCE_JPEG: bool = True
     ENABLE_WEBP: bool = True
     ENABLE_AVIF: bool = False
 
+    # ===== Variants =====
+    # الأحجام التي تُولَّد فور الرفع؛ الباقي يُولَّد عند أول طلب عبر /s/{slug}/img
+    EAGER_VARIANTS: List[str] = ["thumb", "disp"]
+    LAZY_VARIANT_WIDTHS: List[int] = [200, 400, 800, 1200, 1600, 2048]
+    LAZY_VARIANT_FORMATS: List[str] = ["jpg", "webp"]
+
+    # ===== Encoding profiles =====
+    # وسائط Pillow لكل صيغة. "max" = الإعدادات التاريخية (الأبطأ والأصغر حجمًا)
+    ENCODING_PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+        "fast": {
+            "jpg": {"quality": 80},
+            "webp": {"quality": 80, "method": 2},
+            "avif": {"quality": 60, "speed": 8},
+        },
+        "balanced": {
+            "jpg": {"quality": 80, "optimize": True},
+            "webp": {"quality": 80, "method": 4},
+            "avif": {"quality": 60, "speed": 6},
+        },
+        "max": {
+            "jpg": {"quality": 80, "optimize": True, "progressive": True},
+            "webp": {"quality": 80, "method": 6},
+            "avif": {"quality": 60},
+        },
+    }
+    ENCODING_PROFILE: str = "max"   # الافتراضي؛ Album.encoding_profile يتجاوزه لكل ألبوم
+    # إن ضُبط (مثلًا "fast"): الرفع يرمّز بهذا الملف ثم يُعاد الترميز بملف الألبوم في الخلفية
+    UPLOAD_ENCODING_PROFILE: Optional[str] = None
+
+    # ===== Client previews =====
+    # الرفع قد يحمل معاينات (thumb/disp) صغّرها المتصفح: تُخزَّن كمشتقات بعد التحقق
+    # من أبعادها وبصمتها دون فك الأصل، وتُعاد بملف الألبوم حين يهدأ الرفع
+    ACCEPT_CLIENT_PREVIEWS: bool = True
+    CLIENT_PREVIEW_MAX_BYTES: int = 4 * 1024 * 1024
+    RERENDER_IDLE_SECONDS: int = 30   # ثوانٍ بلا رفع في العامل قبل إعادة الترميز
+
+    # ===== Admin sprite sheets =====
+    # أطالس WebP لمصغّرات شبكة الإدارة (services/sprites.py)
+    SPRITE_CELL: int = 200
+    SPRITE_PER_SHEET: int = 100
+    SPRITE_QUALITY: int = 75
+
+    # ===== Contact sheet PDF =====
+    # صفحات A4 من المصغّرات (services/contact_sheet.py)
+    CONTACT_SHEET_COLUMNS: int = 4
+    CONTACT_SHEET_ROWS: int = 5
+    CONTACT_SHEET_DPI: int = 150
+
+    # ===== Share analytics =====
+    # أحداث المشاهدة/التنزيل في حلقة بالذاكرة تُفرَّغ على دفعات (services/analytics.py)
+    ANALYTICS_ENABLED: bool = True
+    ANALYTICS_BUFFER_SIZE: int = 50_000   # الأقدم يسقط إن امتلأت
+    ANALYTICS_BATCH_SIZE: int = 1000
+    ANALYTICS_FLUSH_SECONDS: int = 5
+    ANALYTICS_RETENTION_DAYS: int = 90    # للأحداث الخام؛ العدادات اليومية تبقى
+
     # ===== Google Drive =====
     USE_GDRIVE: bool = False
     GDRIVE_ROOT_FOLDER_ID: Optional[str] = None
     GOOGLE_APPLICATION_CREDENTIALS: Optional[str] = None
 
+    # ===== Storage GC =====
+    # الحذف يكتب tombstones في نفس المعاملة؛ جامع خلفي يمسح الملفات وكائنات Drive
+    GC_INTERVAL_SECONDS: int = 30   # 0 = بلا جامع في العامل (reconcile_storage.py --collect)
+    GC_BATCH_SIZE: int = 200
+    GC_MAX_ATTEMPTS: int = 8        # بعدها يبقى الـ tombstone للفحص اليدوي
+    GC_RETRY_BASE_SECONDS: int = 60  # تضاعف بعد كل فشل حتى 6 ساعات
+
     # Pydantic v2
     model_config = SettingsConfigDict(
         env_file_encoding="utf-8",
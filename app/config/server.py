@@ -18,3 +18,6 @@ class Settings(BaseConfig):
     USE_GDRIVE: bool = True  # أو True حسب حاجتك
     UPLOAD_BASE_URL: str = "https://upload.dichfoto.com"
 
+    # المخطط يُرقّى مرة واحدة في master الخاص بـ gunicorn (gunicorn.conf.py)
+    AUTO_MIGRATE: bool = False
+
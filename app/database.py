@@ -1,27 +1,101 @@
 # app/database.py
 from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import settings
 
-DATABASE_URL = settings.DATABASE_URL
+def _sync_url(url: str) -> str:
+    """
+    Normalize a Postgres URL to the psycopg (v3) driver shipped in
+    requirements.txt; ``postgres://`` and bare ``postgresql://`` would
+    otherwise select psycopg2. Other URLs are returned unchanged.
+    """
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        url = "postgresql+psycopg://" + url[len("postgresql://"):]
+    return url
+
+
+DATABASE_URL = _sync_url(settings.DATABASE_URL)
 
 # Detect if SQLite is being used and set appropriate connection arguments
 is_sqlite = DATABASE_URL.startswith("sqlite")
 connect_args = {"check_same_thread": False} if is_sqlite else {}
 
+# Pool sizing for network databases (one pool per engine per gunicorn worker)
+pool_args = {} if is_sqlite else {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+}
+
+# pre_ping يضيف رحلة ذهاب وإياب (SELECT 1) عند كل استعارة اتصال من الـ pool؛
+# لا فائدة منه مع ملف SQLite محلي، لذا يُفعَّل افتراضيًا لقواعد الشبكة فقط.
+pool_pre_ping = settings.DB_POOL_PRE_PING if settings.DB_POOL_PRE_PING is not None else not is_sqlite
+
 # Create the database engine
 engine = create_engine(
     DATABASE_URL,
     connect_args=connect_args,
-    pool_pre_ping=True,  # Verify connection before using
+    pool_pre_ping=pool_pre_ping,  # Verify connection before using
     future=True,
+    **pool_args,
+)
+
+
+def _async_url(url: str) -> str:
+    """
+    Map a sync DATABASE_URL to its asyncio driver.
+
+    ``sqlite://`` becomes ``sqlite+aiosqlite://`` and ``postgresql://`` (or
+    ``postgres://``, ``postgresql+psycopg2://``) becomes
+    ``postgresql+asyncpg://``. URLs that already name an async driver are
+    returned unchanged.
+
+    Args:
+        url: The configured database URL.
+
+    Returns:
+        str: The URL to pass to ``create_async_engine``.
+    """
+    u = make_url(url.replace("postgres://", "postgresql://", 1))
+    backend = u.get_backend_name()
+    if backend == "sqlite" and u.drivername != "sqlite+aiosqlite":
+        u = u.set(drivername="sqlite+aiosqlite")
+    elif backend == "postgresql" and u.drivername != "postgresql+asyncpg":
+        u = u.set(drivername="postgresql+asyncpg")
+    return u.render_as_string(hide_password=False)
+
+
+# Async engine for the hot public endpoints (event loop, no threadpool hop)
+async_engine = create_async_engine(
+    _async_url(DATABASE_URL),
+    pool_pre_ping=pool_pre_ping,
+    **pool_args,
 )
 
 
+def reset_pools_after_fork() -> None:
+    """
+    Drop connections inherited from the parent process.
+
+    Called from gunicorn's ``post_fork`` hook: with ``preload_app`` the
+    master may have opened connections (e.g. while migrating) and a socket
+    shared by two processes corrupts both sessions. ``close=False`` leaves
+    the parent's connections alone; each worker then opens its own pool.
+    """
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+
 # Apply SQLite-specific PRAGMAs when a new connection is established
 if is_sqlite:
 
     @event.listens_for(engine, "connect")
+    @event.listens_for(async_engine.sync_engine, "connect")
     def _sqlite_pragmas(dbapi_con, con_record):
         """
         Apply SQLite PRAGMAs to optimize performance and stability.
@@ -46,5 +120,22 @@ SessionLocal = sessionmaker(
     future=True,
 )
 
+# Read-mostly session factory for GET routes: objects are not expired on commit
+ReadSessionLocal = sessionmaker(
+    bind=engine,
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    future=True,
+)
+
+# Async session factory; objects stay usable after commit (no lazy reload in async)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 # Base class for ORM models
 Base = declarative_base()
@@ -1,9 +1,37 @@
 # app/dependencies.py
-from .database import SessionLocal
+from typing import AsyncGenerator, Generator
 
-def get_db():
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .database import AsyncSessionLocal, ReadSessionLocal, SessionLocal
+from .services import dbstats
+
+# FastAPI يخزّن نتيجة الاعتماد داخل الطلب الواحد، فكل Depends(get_db)
+# في نفس الطلب (بما فيها الاعتمادات الفرعية) تتشارك جلسة واحدة.
+
+def get_db() -> Generator[Session, None, None]:
+    """Read/write session for routes that modify data."""
+    dbstats.count_session()
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_read_db() -> Generator[Session, None, None]:
+    """
+    Lightweight session for GET routes: no autoflush and no expire-on-commit,
+    so loaded objects are never refreshed behind the handler's back.
+    """
+    dbstats.count_session()
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    dbstats.count_session()
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,3 +1,8 @@
+from contextlib import asynccontextmanager
+import logging
+import os
+import secrets
+
 from fastapi import FastAPI, Response, Request  
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
@@ -9,9 +14,12 @@ from app.config import settings
 
 import mimetypes
 
-from .config import settings
-from .database import engine, Base
-from .routers import admin, public, likes
+from .config import settings, check_settings, ensure_storage_dirs
+from .database import async_engine
+from .migrate import upgrade_to_head
+from .routers import admin, public, likes, images
+from .services import analytics, contact_sheet, gc, metrics, tracing
+from .services.dbstats import DBStatsMiddleware
 
 # Register additional MIME types
 mimetypes.add_type("image/avif", ".avif")
@@ -34,11 +42,40 @@ class StaticFilesCached(StaticFiles):
         return resp
 
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Per-worker startup/shutdown. Nothing here runs at import time, so
+    importing ``app.main`` (gunicorn preload, tests, scripts) stays cheap.
+    """
+    ensure_storage_dirs()
+    check_settings()
+    # Bring the schema up to date (alembic upgrade head); under gunicorn this runs
+    # once in the master instead (see gunicorn.conf.py, AUTO_MIGRATE=False in prod)
+    if settings.AUTO_MIGRATE:
+        upgrade_to_head()
+    logger.info("DB URL %s | ENV %s", settings.DATABASE_URL, settings.ENV)
+    # جامع الملفات المحذوفة (tombstones) في خيط لكل عامل
+    gc.start()
+    # أحداث التحليلات: تفريغ دفعات من حلقة الذاكرة في خيط لكل عامل
+    analytics.start()
+    yield
+    analytics.stop()
+    gc.stop()
+    contact_sheet.shutdown()
+    # Close pooled async connections (aiosqlite threads / asyncpg sockets)
+    await async_engine.dispose()
+
+
 # ===== FastAPI setup =====
 app = FastAPI(
     title=settings.SITE_TITLE,
     docs_url=None,
-    redoc_url=None
+    redoc_url=None,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -49,16 +86,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Media + static mounts
+# Media + static mounts (storage dirs are created in lifespan, hence check_dir=False)
 media_root = str(settings.STORAGE_DIR)
-app.mount("/media", StaticFilesCached(directory=media_root), name="media")
+app.mount("/media", StaticFilesCached(directory=media_root, check_dir=False), name="media")
 
 thumbs_dir = str(settings.THUMBS_DIR)
-app.mount("/static/thumbs", StaticFilesCached(directory=thumbs_dir), name="thumbs")
+app.mount("/static/thumbs", StaticFilesCached(directory=thumbs_dir, check_dir=False), name="thumbs")
 app.mount("/static", StaticFilesCached(directory="static"), name="static")
 
-# Create database tables if they don't exist
-Base.metadata.create_all(bind=engine)
 
 # Add session middleware
 #app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
@@ -81,11 +116,27 @@ else:
         https_only=False,
     )
 
+# عدّاد الجلسات/الاستعلامات لكل طلب في ترويسة X-DB-Stats (للتطوير)
+db_stats_header = settings.DB_STATS_HEADER
+if db_stats_header is None:
+    db_stats_header = settings.ENV != "prod"
+if db_stats_header:
+    app.add_middleware(DBStatsMiddleware)
+
+# تتبّع مسار الرفع/التدوير: ختم لحظة وصول الطلب (قبل تحليل multipart)
+if tracing.enabled():
+    app.add_middleware(tracing.RequestStartMiddleware)
+
+# زمن/حالة كل طلب حسب قالب المسار (الأبعد للخارج ليشمل كل الطبقات)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 
 # Routers
 app.include_router(admin.router)
 app.include_router(public.router)
 app.include_router(likes.router)
+app.include_router(images.router)
 
 
 # ====== Homepage ======
@@ -127,6 +178,23 @@ def robots():
 
 
 
+# --- Metrics ---
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    """
+    Prometheus exposition. Under gunicorn (PROMETHEUS_MULTIPROC_DIR set in
+    gunicorn.conf.py) the values of all workers are aggregated.
+    """
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=404)
+    if settings.METRICS_TOKEN:
+        auth = request.headers.get("authorization", "")
+        if not secrets.compare_digest(auth, f"Bearer {settings.METRICS_TOKEN}"):
+            return Response(status_code=401)
+    body, content_type = metrics.render_latest(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+    return Response(body, media_type=content_type, headers={"Cache-Control": "no-store"})
+
+
 # --- Health checks ---
 
 
@@ -140,12 +208,3 @@ def health(request: Request):
         return Response(status_code=200, headers=headers)
 
     return JSONResponse({"ok": True}, headers=headers)
-
-
-
-
-
-
-
-print("[DB URL]", settings.DATABASE_URL)
-print("[ENV]", settings.ENV)
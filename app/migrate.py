@@ -0,0 +1,33 @@
+# app/migrate.py
+from __future__ import annotations
+
+from .config.base import BASE_DIR
+from .database import engine
+
+# alembic يُستورد داخل الدوال فقط: العمال في prod لا يرقّون المخطط (gunicorn master يفعل)
+
+
+def alembic_config():
+    """Alembic config pointing at the repo's ``alembic.ini`` and ``migrations/``."""
+    from alembic.config import Config
+
+    cfg = Config(str(BASE_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(BASE_DIR / "migrations"))
+    cfg.attributes["embedded"] = True  # env.py: لا تُعِد ضبط السجلات
+    return cfg
+
+
+def upgrade_to_head() -> None:
+    """
+    Apply pending migrations (``alembic upgrade head``) on the app's engine.
+
+    Replaces ``Base.metadata.create_all``: an empty database gets the full
+    schema and a database created before migrations existed is adopted by
+    the baseline revision.
+    """
+    from alembic import command
+
+    cfg = alembic_config()
+    with engine.begin() as conn:
+        cfg.attributes["connection"] = conn
+        command.upgrade(cfg, "head")
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import json
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Boolean, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -20,7 +21,10 @@ class Album(Base):
 
     event_date = Column(DateTime, nullable=True)  # Event date (optional)
 
-    created_at = Column(DateTime, server_default=func.now())
+    # Encoding profile name (settings.ENCODING_PROFILES); NULL = settings.ENCODING_PROFILE
+    encoding_profile = Column(String(16), nullable=True)
+
+    created_at = Column(DateTime, server_default=func.now(), index=True)  # Admin list order
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     # Cover image: Explicit FK to assets.id
@@ -77,6 +81,10 @@ class Asset(Base):
     """Represents a digital asset (e.g., photo) linked to an album with multiple formats."""
 
     __tablename__ = "assets"
+    __table_args__ = (
+        # جيران الأصل داخل الألبوم (ordering.move) و MAX(sort_order) عند الرفع
+        Index("ix_assets_album_order", "album_id", "sort_order"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -86,13 +94,14 @@ class Asset(Base):
     # Also declare the foreign_keys argument here
     album = relationship("Album", back_populates="assets", foreign_keys=[album_id])
 
-    sort_order = Column(Integer, nullable=True)  # Optional ordering
+    sort_order = Column(Integer, nullable=False, default=0, server_default="0")  # ordering.GAP keys
 
     # File information
     filename = Column(String(255), nullable=False)
     original_name = Column(String(255), nullable=False)
     mime_type = Column(String(128), nullable=True)
     size = Column(Integer, nullable=True)
+    sha256 = Column(String(64), nullable=True)  # Digest of the original (ETag source)
 
     # Dimensions + LQIP (Low Quality Image Placeholder)
     width = Column(Integer, nullable=True)
@@ -117,6 +126,9 @@ class Asset(Base):
     avif_1280 = Column(String(255), nullable=True)
     avif_1920 = Column(String(255), nullable=True)
 
+    # Compact JSON manifest of generated variants (see services/variants.py)
+    variants_manifest = Column(Text, nullable=True)
+
     # Google Drive information
     gdrive_file_id = Column(String(255), nullable=True)
     gdrive_thumb_id = Column(String(255), nullable=True)
@@ -141,6 +153,97 @@ class Asset(Base):
             setattr(self, f"{ext}_1280", d.get(1280))
             setattr(self, f"{ext}_1920", d.get(1920))
 
+    @property
+    def manifest(self) -> dict:
+        """Return the parsed variant manifest (empty dict if missing or invalid)."""
+        if not self.variants_manifest:
+            return {}
+        try:
+            return json.loads(self.variants_manifest)
+        except ValueError:
+            return {}
+
+    def merged_manifest(self, manifest: dict, replace: bool = False) -> dict:
+        """Return the stored manifest merged with ``manifest`` (nothing is assigned).
+
+        ``replace`` drops the recorded variants but keeps ``drive`` (ids of the
+        Drive copies, which a local re-render does not touch).
+        """
+        current = self.manifest
+        if replace:
+            current = {"drive": current["drive"]} if current.get("drive") else {}
+        items = dict(current.get("items") or {})
+        items.update(manifest.get("items") or {})
+        return {**current, **{k: v for k, v in manifest.items() if k != "items"}, "items": items}
+
+    def update_manifest(self, manifest: dict, replace: bool = False) -> None:
+        """Merge (or replace) the stored variant manifest.
+
+        Args:
+            manifest (dict): Partial manifest with optional ``v``, ``w``, ``h``
+                and ``items`` keys.
+            replace (bool): Drop previously recorded items first (e.g. after
+                all variants were regenerated).
+        """
+        merged = self.merged_manifest(manifest, replace)
+        self.variants_manifest = json.dumps(merged, separators=(",", ":"))
+        if merged.get("w") and merged.get("h"):
+            self.width, self.height = merged["w"], merged["h"]
+
+
+class Tombstone(Base):
+    """A storage object left behind by a deleted row, queued for the GC collector.
+
+    ``kind`` is ``"path"`` (file or directory, relative to ``STORAGE_DIR``),
+    ``"drive"`` (Google Drive file/folder id) or ``"drivedir"`` (Drive folder
+    path under ``GDRIVE_ROOT_FOLDER_ID``). Rows are written in the same
+    transaction as the delete and removed once the object is gone
+    (see services/gc.py).
+    """
+
+    __tablename__ = "tombstones"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(8), nullable=False)
+    target = Column(String(1024), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=False, index=True)  # UTC
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class AnalyticsEvent(Base):
+    """One share view/download, appended in batches by the analytics flusher.
+
+    ``kind`` is ``"visit"`` (album page), ``"thumb"``, ``"view"`` (disp/big)
+    or ``"download"`` (original). No foreign keys: the log outlives deleted
+    shares and assets (see services/analytics.py).
+    """
+
+    __tablename__ = "analytics_events"
+
+    id = Column(Integer, primary_key=True)
+    ts = Column(DateTime, nullable=False, index=True)  # UTC
+    kind = Column(String(16), nullable=False)
+    share_id = Column(Integer, nullable=False)
+    asset_id = Column(Integer, nullable=True)
+
+
+class AnalyticsDaily(Base):
+    """Pre-aggregated event counts per UTC day, share, asset and kind.
+
+    ``asset_id`` is 0 for share-level events (visits). Incremented by the
+    same flush that appends the events; the admin stats page reads only this.
+    """
+
+    __tablename__ = "analytics_daily"
+
+    day = Column(Date, primary_key=True)
+    share_id = Column(Integer, primary_key=True)
+    asset_id = Column(Integer, primary_key=True)
+    kind = Column(String(16), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
 
 class Like(Base):
     """Represents a user's like on an image, optionally linked to a user ID."""
@@ -1,34 +1,43 @@
 from fastapi import (
-    APIRouter, Depends, Header, Request, UploadFile, File, Form,
-    HTTPException, Response
+    APIRouter, BackgroundTasks, Depends, Header, Request, UploadFile, File, Form,
+    HTTPException, Query, Response
 )
 from fastapi.responses import (
     HTMLResponse, RedirectResponse, StreamingResponse, FileResponse
 )
-from fastapi.templating import Jinja2Templates
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 from slugify import slugify
 from pathlib import Path
-import json, shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import hashlib, json, secrets, threading, time
 from pydantic import BaseModel
 
 from ..database import SessionLocal
+from ..dependencies import get_db, get_read_db
+from ..templating import templates
 from .. import models
 from ..config import settings
 from ..utils import gen_slug, hash_password
-from ..services import thumbs, gdrive
-from ..services.variants import make_variants
-from ..utils import safe_filename
+from ..services import (
+    thumbs, gdrive, gc, tracing, ondemand, ordering, orientation, previews, sprites, contact_sheet,
+    analytics,
+)
+from ..services import albums as album_list
+from ..services.auth_guard import TooManyAttempts, unlock_guard
+from ..services.variants import (
+    SIZES, make_avif_variants, make_variants, manifest_key, manifest_profile, open_image,
+    parse_manifest_key, reencode_variants, resolve_profile, rotate_variants, variant_rel,
+)
+from ..utils import file_sha256, safe_filename
 from PIL import Image, ImageOps
 
 from app.utils import _parse_dt
 
 
-templates = Jinja2Templates(directory="templates")
-templates.env.globals["settings"] = settings
-
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 # ===========================
@@ -41,18 +50,129 @@ class ThemePayload(BaseModel):
     vars: dict[str, str] = {}
     disableDark: bool = False
 
-def _variant_paths(album_id: int, stem: str) -> list[Path]:
-    base = Path(settings.STORAGE_DIR)
-    rels = [
-        f"albums/{album_id}/thumb/400/{stem}.jpg",
-        f"albums/{album_id}/thumb/400/{stem}.webp",
-        f"albums/{album_id}/disp/1600/{stem}.jpg",
-        f"albums/{album_id}/disp/1600/{stem}.webp",
-        f"albums/{album_id}/big/2048/{stem}.jpg",
-        f"albums/{album_id}/big/2048/{stem}.webp",
-    ]
-    return [base / r for r in rels]
+def _encode_avif(asset_id: int) -> None:
+    """مهمة خلفية: ترميز AVIF لأصل ثم تسجيله في الـ manifest."""
+    db = SessionLocal()
+    try:
+        asset = db.get(models.Asset, asset_id)
+        if not asset:
+            return
+        base = Path(settings.STORAGE_DIR)
+        rel = Path(str(asset.filename).replace("\\", "/"))
+        entry: dict = {}
+        with tracing.trace("encode_avif", asset_id=asset_id):
+            with tracing.span("variants", fmt="avif"):
+                make_avif_variants(base / rel, base, asset.album_id, rel.stem,
+                                   settings.EAGER_VARIANTS, manifest=entry,
+                                   profile=asset.album.encoding_profile)
+            if entry.get("items"):
+                with tracing.span("db.commit"):
+                    ondemand.save_manifest(db, asset, entry)
+    finally:
+        db.close()
+
+
+# ترقية المشتقات (رفع سريع ← ملف الألبوم) والتدوير الجماعي في خيط واحد: مشتق
+# واحد يُرمَّز في كل لحظة فيبقى باقي المعالج للطلبات والرفع
+_upgrades = ThreadPoolExecutor(max_workers=1, thread_name_prefix="variant-upgrade")
+
+
+def _upgrade_variants(asset_id: int) -> None:
+    """مهمة خلفية: إعادة ترميز كل مشتقات أصل بملف ترميز ألبومه إن اختلف."""
+    db = SessionLocal()
+    try:
+        asset = db.get(models.Asset, asset_id)
+        if not asset:
+            return
+        target = resolve_profile(asset.album.encoding_profile)
+        manifest = asset.manifest
+        if manifest_profile(manifest) == target:
+            return
+        keys = {parse_manifest_key(k) for k in manifest.get("items") or {}}
+        if manifest_profile(manifest) == previews.CLIENT_PROFILE:
+            # معاينات المتصفح قد تغطي صيغة واحدة فقط: أكمل المشتقات الفورية كلها
+            keys |= {(SIZES[k], fmt) for k in settings.EAGER_VARIANTS for fmt in ("jpg", "webp")}
+        base = Path(settings.STORAGE_DIR)
+        rel = Path(str(asset.filename).replace("\\", "/"))
+        entry: dict = {}
+        with tracing.trace("upgrade_variants", asset_id=asset_id, profile=target):
+            with tracing.span("variants"):
+                reencode_variants(base / rel, base, asset.album_id, rel.stem, keys,
+                                  manifest=entry, profile=target)
+            # ربما أضاف AVIF أو طلب عند الطلب عناصر أثناء الترميز: دمج ذرّي في أحدث نسخة
+            with tracing.span("db.commit"):
+                ondemand.save_manifest(db, asset, entry)
+    except Exception as e:
+        print("[variants] upgrade failed:", asset_id, e)
+    finally:
+        db.close()
+
+
+# إعادة ترميز معاينات المتصفح بجودة الألبوم تنتظر هدوء الرفع في هذا العامل
+# (RERENDER_IDLE_SECONDS بلا طلب رفع) حتى لا تنافس الرفوعات الجارية على المعالج
+_idle_rerenders = ThreadPoolExecutor(max_workers=1, thread_name_prefix="idle-rerender")
+_uploads_idle = threading.Condition()
+_uploads_active = 0
+_last_upload = 0.0
+
+
+@contextmanager
+def _uploading():
+    global _uploads_active, _last_upload
+    with _uploads_idle:
+        _uploads_active += 1
+    try:
+        yield
+    finally:
+        with _uploads_idle:
+            _uploads_active -= 1
+            _last_upload = time.monotonic()
+            _uploads_idle.notify_all()
+
+
+def _wait_for_idle() -> None:
+    with _uploads_idle:
+        while True:
+            if _uploads_active:
+                _uploads_idle.wait()
+                continue
+            left = _last_upload + settings.RERENDER_IDLE_SECONDS - time.monotonic()
+            if left <= 0:
+                return
+            _uploads_idle.wait(left)
+
 
+# ألبومات بانتظار بناء أطالسها (لا تُكرَّر في الطابور)
+_sprites_pending: set[int] = set()
+_sprites_lock = threading.Lock()
+
+
+def _queue_sprites(album_id: int) -> None:
+    with _sprites_lock:
+        if album_id in _sprites_pending:
+            return
+        _sprites_pending.add(album_id)
+    _upgrades.submit(_build_sprites, album_id)
+
+
+def _build_sprites(album_id: int) -> None:
+    """مهمة خلفية: تحديث أطالس مصغّرات الألبوم وخريطتها."""
+    with _sprites_lock:
+        _sprites_pending.discard(album_id)
+    db = SessionLocal()
+    try:
+        with tracing.trace("sprites", album_id=album_id):
+            sprites.build(db, album_id)
+    except Exception as e:
+        print("[sprites] build failed:", album_id, e)
+    finally:
+        db.close()
+
+
+def _rerender_when_idle(asset_id: int) -> None:
+    """مهمة خلفية: بعد هدوء الرفع، إعادة ترميز مشتقات المتصفح بملف الألبوم."""
+    _wait_for_idle()
+    _upgrade_variants(asset_id)
 
 
 @router.get("/theme", response_class=HTMLResponse)
@@ -98,13 +218,6 @@ def theme_config():
 # ================
 # Helpers
 # ================
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 def is_admin(request: Request) -> bool:
     return bool(request.session.get("admin"))
@@ -170,14 +283,16 @@ def create_album(
 
 
 @router.get("/albums/{album_id}", response_class=HTMLResponse)
-def view_album(request: Request, album_id: int, db: Session = Depends(get_db)):
+def view_album(request: Request, album_id: int, db: Session = Depends(get_read_db)):
     require_admin(request)
     album = db.get(models.Album, album_id)
     if not album:
         raise HTTPException(404)
 
-    # ✅ الترتيب بالـ sort_order ثم id
-    assets = sorted(album.assets, key=lambda a: ((a.sort_order or 0), a.id))
+    # الشبكة تُحمَّل من /assets (JSON بمؤشر) وتُرسم نافذتها المرئية فقط
+    total = db.scalar(
+        select(func.count(models.Asset.id)).where(models.Asset.album_id == album_id)
+    )
 
     return templates.TemplateResponse(
         "admin_album_view.html",
@@ -185,16 +300,77 @@ def view_album(request: Request, album_id: int, db: Session = Depends(get_db)):
             "request": request,
             "site_title": settings.SITE_TITLE,
             "album": album,
-            "assets": assets,  # ← ORM objects
+            "total": total,
+            "preview_widths": [SIZES[k] for k in settings.EAGER_VARIANTS],
         },
     )
 
 
+@router.get("/albums/{album_id}/assets")
+def album_assets(
+    request: Request,
+    album_id: int,
+    after: Optional[str] = None,  # مؤشر "<key>:<id>" من الصفحة السابقة
+    limit: int = Query(200, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+):
+    """Album assets in display order, keyset-paginated for the admin grid."""
+    require_admin(request)
+    try:
+        cursor = album_list.parse_cursor(after)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    items, nxt = album_list.assets_page(db, album_id, cursor, limit)
+    return {"items": items, "next": nxt}
+
+
+@router.get("/albums/{album_id}/sprites")
+def album_sprites(request: Request, album_id: int, db: Session = Depends(get_read_db)):
+    """
+    The album's thumbnail sprite map if it is current and all its sheets
+    exist; otherwise queue a rebuild and answer 202 so the grid falls back
+    to one thumb per asset.
+    """
+    require_admin(request)
+    current = sprites.load_map(album_id)
+    if current and current.get("v") == sprites.version(db, album_id) and sprites.is_complete(current):
+        return current
+    _queue_sprites(album_id)
+    return Response(status_code=202)
+
+
+@router.get("/albums/{album_id}/contact-sheet")
+def album_contact_sheet(request: Request, album_id: int, db: Session = Depends(get_read_db)):
+    """
+    Contact sheet (proof) PDF of the album's visible assets. Served from the
+    cache when this album version was exported before; otherwise the export
+    process starts and the PDF is streamed while its pages are written.
+    """
+    require_admin(request)
+    album = db.get(models.Album, album_id)
+    if not album:
+        raise HTTPException(status_code=404, detail="Album not found")
+    version, entries = contact_sheet.plan(db, album)
+    final = contact_sheet.export_path(album.id, version)
+    name = f"{slugify(album.title) or 'album'}-contact-sheet.pdf"
+    if final.exists():
+        return FileResponse(final, media_type="application/pdf", filename=name)
+    fut, part = contact_sheet.build(album, version, entries)
+    return StreamingResponse(
+        contact_sheet.stream(fut, part, final),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
+
+
 @router.post("/albums/{album_id}/upload")
 async def upload_files(
     request: Request,
     album_id: int,
+    background_tasks: BackgroundTasks,
     files: list[UploadFile] = File(...),
+    previews_files: Optional[list[UploadFile]] = File(None, alias="previews"),
+    preview_meta: Optional[str] = Form(None),
     db: Session = Depends(get_db),
 ):
     require_admin(request)
@@ -203,151 +379,241 @@ async def upload_files(
     if not album:
         raise HTTPException(status_code=404, detail="Album not found")
 
-    STORAGE_ROOT = Path(settings.STORAGE_DIR)
-    album_root = STORAGE_ROOT / "albums" / str(album.id)
-    orig_dir = album_root / "original"
-    orig_dir.mkdir(parents=True, exist_ok=True)
-
-    # ===== Drive setup (اختياري) =====
-    service = None
-    d_album = d_orig = d_thumb400 = d_disp1600 = d_big2048 = None
-    if getattr(settings, "USE_GDRIVE", False):
+    # معاينات المتصفح (اختيارية، services/previews.py): index → {"400.jpg": bytes}
+    client: dict[int, dict[str, bytes]] = {}
+    client_meta: list = []
+    if previews_files and preview_meta and settings.ACCEPT_CLIENT_PREVIEWS:
         try:
-            service = gdrive._service()
-            root_id = settings.GDRIVE_ROOT_FOLDER_ID
-            if not root_id:
-                print("[gdrive] WARNING: GDRIVE_ROOT_FOLDER_ID not set")
-            else:
-                d_albums   = gdrive.ensure_subfolder(service, root_id, "albums")
-                d_album    = gdrive.ensure_subfolder(service, d_albums, str(album.id))
-                d_orig     = gdrive.ensure_subfolder(service, d_album, "original")
-                d_thumb    = gdrive.ensure_subfolder(service, d_album, "thumb")   # متغير داخلي فقط
-                d_thumb400 = gdrive.ensure_subfolder(service, d_thumb, "400")
-                d_disp     = gdrive.ensure_subfolder(service, d_album, "disp")
-                d_disp1600 = gdrive.ensure_subfolder(service, d_disp, "1600")
-                d_big      = gdrive.ensure_subfolder(service, d_album, "big")
-                d_big2048  = gdrive.ensure_subfolder(service, d_big, "2048")
-        except Exception as e:
-            print("[gdrive] init failed:", e)
-            service = None
-    # ===== end Drive setup =====
-
-    saved_assets = []
-
-    max_order = max([a.sort_order or 0 for a in album.assets], default=0)
-
-    for file in files:
-        # (1) قيد النوع — صور فقط
-        if not (file.content_type or "").startswith("image/"):
-            raise HTTPException(status_code=400, detail="Only image files are allowed")
-
-        # اسم آمن
-        filename = safe_filename(file.filename)
-        original_path = orig_dir / filename
-
-        # (2) منع التصادم بالأسماء (إن وجد نفس الاسم)
-        if original_path.exists():
-            ts = int(datetime.now().timestamp())
-            original_path = original_path.with_name(f"{original_path.stem}-{ts}{original_path.suffix}")
-            filename = original_path.name  # مهم: حدِّث الاسم
-
-        # نسخ ستريمي بدون تحميل كامل الذاكرة
-        with open(original_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-        await file.close()
-
-        # توليد المشتقات (jpg+webp)
-        stem = Path(filename).stem
-        variants = make_variants(
-            original_path=original_path,
-            out_root=STORAGE_ROOT,
-            album_id=album.id,
-            filename_stem=stem,
-        )
-
-        # (اختياري) LQIP
-        try:
-            lqip = thumbs.tiny_placeholder_base64(original_path)
-        except Exception:
-            lqip = None
-
-        # رفع إلى Google Drive إن كان مفعّلًا
-        gfile_id = None
-        gthumb_id = None
-        if service and d_album:
+            client_meta = json.loads(preview_meta)
+            if not isinstance(client_meta, list):
+                raise ValueError
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid preview_meta")
+        for pf in previews_files:
             try:
-                # الأصل
-                with open(original_path, "rb") as fp:
-                    gfile_id = gdrive.upload_bytes(
-                        service, d_orig, filename,
-                        file.content_type or "application/octet-stream",
-                        fp.read(),
-                    )
-
-                # util لرفع ملف مشتق
-                def _up(rel: str, folder_id: str):
-                    p = STORAGE_ROOT / rel
-                    if p.exists():
-                        mime = "image/webp" if p.suffix.lower() == ".webp" else "image/jpeg"
-                        with open(p, "rb") as fp:
-                            return gdrive.upload_bytes(service, folder_id, p.name, mime, fp.read())
-                    return None
-
-                # thumb/400
-                tid_jpg  = _up(variants["thumb_jpg"], d_thumb400)
-                _up(variants["thumb_webp"], d_thumb400)
-                if tid_jpg:
-                    gthumb_id = tid_jpg
-
-                # disp/1600
-                _up(variants["disp_jpg"], d_disp1600)
-                _up(variants["disp_webp"], d_disp1600)
-
-                # big/2048
-                _up(variants["big_jpg"], d_big2048)
-                _up(variants["big_webp"], d_big2048)
+                index, key = previews.parse_name(pf.filename)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid preview name: {pf.filename}")
+            if (pf.size or 0) <= settings.CLIENT_PREVIEW_MAX_BYTES:
+                client.setdefault(index, {})[key] = await pf.read()
+            await pf.close()
+
+    # تتبّع المراحل (TRACE_FILE / TRACE_OTLP_ENDPOINT): الجذر يبدأ لحظة وصول الطلب
+    # كي يظهر زمن استقبال multipart (يُحلَّل قبل دخول الدالة)
+    start_ns = getattr(request.state, "start_ns", None)
+    with _uploading(), tracing.trace("upload", start_ns=start_ns, album_id=album_id,
+                                     files=len(files)) as root:
+        if start_ns is not None:
+            with tracing.span("multipart.spool", start_ns=start_ns,
+                              bytes=sum(f.size or 0 for f in files)):
+                pass
 
+        STORAGE_ROOT = Path(settings.STORAGE_DIR)
+        album_root = STORAGE_ROOT / "albums" / str(album.id)
+        orig_dir = album_root / "original"
+        orig_dir.mkdir(parents=True, exist_ok=True)
+
+        # ملف الترميز: UPLOAD_ENCODING_PROFILE (سريع) إن ضُبط، ثم ترقية لملف الألبوم
+        album_profile = resolve_profile(album.encoding_profile)
+        upload_profile = resolve_profile(settings.UPLOAD_ENCODING_PROFILE or album_profile)
+        if root:
+            root.set(profile=upload_profile)
+
+        # ===== Drive setup (اختياري) =====
+        service = None
+        d_album = d_orig = d_thumb400 = d_disp1600 = d_big2048 = None
+        if getattr(settings, "USE_GDRIVE", False):
+            try:
+                service = gdrive._service()
+                root_id = settings.GDRIVE_ROOT_FOLDER_ID
+                if not root_id:
+                    print("[gdrive] WARNING: GDRIVE_ROOT_FOLDER_ID not set")
+                else:
+                    with tracing.span("gdrive.setup"):
+                        d_albums   = gdrive.ensure_subfolder(service, root_id, "albums")
+                        d_album    = gdrive.ensure_subfolder(service, d_albums, str(album.id))
+                        d_orig     = gdrive.ensure_subfolder(service, d_album, "original")
+                        d_thumb    = gdrive.ensure_subfolder(service, d_album, "thumb")   # متغير داخلي فقط
+                        d_thumb400 = gdrive.ensure_subfolder(service, d_thumb, "400")
+                        d_disp     = gdrive.ensure_subfolder(service, d_album, "disp")
+                        d_disp1600 = gdrive.ensure_subfolder(service, d_disp, "1600")
+                        d_big      = gdrive.ensure_subfolder(service, d_album, "big")
+                        d_big2048  = gdrive.ensure_subfolder(service, d_big, "2048")
             except Exception as e:
-                print("[gdrive] upload failed:", e)
-
-        # (3) خزِّن المسار النسبي بصيغة URL (forward slashes) — مهم لو ويندوز
-        filename_rel = (Path("albums") / str(album.id) / "original" / filename).as_posix()
-
-        asset = models.Asset(
-            album_id=album.id,
-            filename=filename_rel,  # ← هنا الفرق
-            original_name=file.filename,
-            mime_type=file.content_type,
-            size=original_path.stat().st_size,
-            gdrive_file_id=gfile_id,
-            gdrive_thumb_id=gthumb_id,
-        )
-
-        asset.sort_order = max_order + 10
-        max_order += 10
-        # إن كان لديك حقل JSON للمشتقات
-        try:
-            asset.set_variants(variants)  # يحتفظ بالمسارات المحلية
-        except Exception:
-            pass
-        asset.lqip = lqip
-
-        db.add(asset)
-        saved_assets.append(asset)
-
-    db.commit()
+                print("[gdrive] init failed:", e)
+                service = None
+        # ===== end Drive setup =====
+
+        saved_assets = []
+        from_client = []
+
+        # MAX() واحد بدل تحميل كل أصول الألبوم
+        next_order = ordering.next_key(db, album.id)
+
+        for index, file in enumerate(files):
+            # (1) قيد النوع — صور فقط
+            if not (file.content_type or "").startswith("image/"):
+                raise HTTPException(status_code=400, detail="Only image files are allowed")
+
+            # اسم آمن
+            filename = safe_filename(file.filename)
+            original_path = orig_dir / filename
+
+            # (2) منع التصادم بالأسماء (إن وجد نفس الاسم)
+            if original_path.exists():
+                ts = int(datetime.now().timestamp())
+                original_path = original_path.with_name(f"{original_path.stem}-{ts}{original_path.suffix}")
+                filename = original_path.name  # مهم: حدِّث الاسم
+
+            # نسخ ستريمي بدون تحميل كامل الذاكرة (مع حساب SHA-256 في نفس المرور)
+            digest = hashlib.sha256()
+            with tracing.span("original.write", file=filename) as sp:
+                with open(original_path, "wb") as f:
+                    while chunk := file.file.read(1024 * 1024):
+                        digest.update(chunk)
+                        f.write(chunk)
+                await file.close()
+                if sp:
+                    sp.set(bytes=original_path.stat().st_size)
+
+            stem = Path(filename).stem
+            manifest: dict = {}
+            variants: dict = {}
+            if index in client:
+                with tracing.span("variants.client", file=filename) as sp:
+                    variants = previews.accept(
+                        client[index],
+                        client_meta[index] if index < len(client_meta) else None,
+                        original_path, digest.hexdigest(), STORAGE_ROOT, album.id, stem, manifest,
+                    )
+                    if sp:
+                        sp.set(accepted=len(variants))
+
+            # توليد المشتقات (jpg+webp) لما لم يغطّه المتصفح
+            remaining = [k for k in settings.EAGER_VARIANTS
+                         if not any(v.startswith(f"{k}_") for v in variants)]
+            if remaining:
+                with tracing.span("variants", file=filename):
+                    variants.update(make_variants(
+                        original_path=original_path,
+                        out_root=STORAGE_ROOT,
+                        album_id=album.id,
+                        filename_stem=stem,
+                        create=remaining,
+                        manifest=manifest,
+                        profile=upload_profile,
+                    ))
+            if manifest.get("items") and len(remaining) < len(settings.EAGER_VARIANTS):
+                manifest["p"] = previews.CLIENT_PROFILE
+
+            # (اختياري) LQIP — من المصغّرة إن وُجدت بدل فك الأصل
+            small = variants.get("thumb_jpg") or variants.get("thumb_webp")
+            try:
+                with tracing.span("lqip", file=filename):
+                    lqip = thumbs.tiny_placeholder_base64(STORAGE_ROOT / small if small else original_path)
+            except Exception:
+                lqip = None
+
+            # رفع إلى Google Drive إن كان مفعّلًا
+            gfile_id = None
+            gthumb_id = None
+            drive_ids: dict[str, str] = {}
+            if service and d_album:
+                try:
+                    # الأصل
+                    with tracing.span("gdrive.upload", kind="original", file=filename):
+                        with open(original_path, "rb") as fp:
+                            gfile_id = gdrive.upload_bytes(
+                                service, d_orig, filename,
+                                file.content_type or "application/octet-stream",
+                                fp.read(),
+                            )
+
+                    # util لرفع ملف مشتق
+                    def _up(rel: str | None, folder_id: str):
+                        if not rel:
+                            return None  # حجم غير مولَّد عند الرفع (يُولَّد عند الطلب)
+                        p = STORAGE_ROOT / rel
+                        if p.exists():
+                            mime = "image/webp" if p.suffix.lower() == ".webp" else "image/jpeg"
+                            with tracing.span("gdrive.upload", kind=p.parent.parent.name, fmt=p.suffix[1:]):
+                                with open(p, "rb") as fp:
+                                    return gdrive.upload_bytes(service, folder_id, p.name, mime, fp.read())
+                        return None
+
+                    # thumb/400 و disp/1600 و big/2048؛ المعرّفات في الـ manifest
+                    # ("drive") حتى يحذفها gc مع الأصل
+                    for kind, folder_id in (("thumb", d_thumb400), ("disp", d_disp1600), ("big", d_big2048)):
+                        for fmt in ("jpg", "webp"):
+                            fid = _up(variants.get(f"{kind}_{fmt}"), folder_id)
+                            if fid:
+                                drive_ids[manifest_key(SIZES[kind], fmt)] = fid
+                    gthumb_id = drive_ids.get(manifest_key(SIZES["thumb"], "jpg"))
+
+                except Exception as e:
+                    print("[gdrive] upload failed:", e)
+
+            # (3) خزِّن المسار النسبي بصيغة URL (forward slashes) — مهم لو ويندوز
+            filename_rel = (Path("albums") / str(album.id) / "original" / filename).as_posix()
+
+            asset = models.Asset(
+                album_id=album.id,
+                filename=filename_rel,  # ← هنا الفرق
+                original_name=file.filename,
+                mime_type=file.content_type,
+                size=original_path.stat().st_size,
+                sha256=digest.hexdigest(),
+                gdrive_file_id=gfile_id,
+                gdrive_thumb_id=gthumb_id,
+            )
+
+            asset.sort_order = next_order
+            next_order += ordering.GAP
+            # إن كان لديك حقل JSON للمشتقات
+            try:
+                asset.set_variants(variants)  # يحتفظ بالمسارات المحلية
+            except Exception:
+                pass
+            if drive_ids:
+                manifest["drive"] = drive_ids
+            asset.update_manifest(manifest)
+            asset.lqip = lqip
+
+            db.add(asset)
+            saved_assets.append(asset)
+            if manifest.get("p") == previews.CLIENT_PROFILE:
+                from_client.append(asset)
+
+        with tracing.span("db.commit", assets=len(saved_assets)):
+            db.commit()
+
+    # AVIF بطيء: يُرمَّز في الخلفية بعد إرسال الرد
+    if settings.ENABLE_AVIF:
+        for a in saved_assets:
+            background_tasks.add_task(_encode_avif, a.id)
+    if upload_profile != album_profile:
+        for a in saved_assets:
+            if a not in from_client:
+                _upgrades.submit(_upgrade_variants, a.id)
+    for a in from_client:
+        _idle_rerenders.submit(_rerender_when_idle, a.id)
+    _queue_sprites(album_id)
 
     accept = (request.headers.get("accept") or "").lower()
     if "text/html" in accept:
         return RedirectResponse(url=f"/admin/albums/{album_id}", status_code=303)
 
-    return {"ok": True, "uploaded": [a.id for a in saved_assets]}
+    out = {"ok": True, "uploaded": [a.id for a in saved_assets],
+           "client_variants": [a.id for a in from_client]}
+    if root:
+        out["trace_id"] = root.trace_id
+    return out
 
 
 
 
 @router.get("/thumb/{asset_id}")
-def admin_thumb(asset_id: int, db: Session = Depends(get_db)):
+def admin_thumb(asset_id: int, db: Session = Depends(get_read_db)):
     asset = db.get(models.Asset, asset_id)
     if not asset:
         raise HTTPException(404)
@@ -360,16 +626,14 @@ def admin_thumb(asset_id: int, db: Session = Depends(get_db)):
         except Exception:
             pass
 
-    # محلي: اعرض من المشتقات الجاهزة
+    # محلي: اعرض من المشتقات الجاهزة (حسب الـ manifest)
     stem = Path(str(asset.filename).replace("\\", "/")).stem
-    thumb_dir = Path(settings.STORAGE_DIR) / "albums" / str(asset.album_id) / "thumb" / "400"
-    jpg = thumb_dir / f"{stem}.jpg"
-    webp = thumb_dir / f"{stem}.webp"
-
-    if jpg.exists():
-        return FileResponse(jpg, media_type="image/jpeg")
-    if webp.exists():
-        return FileResponse(webp, media_type="image/webp")
+    base = Path(settings.STORAGE_DIR)
+    items = asset.manifest.get("items")
+    for fmt, media_type in (("jpg", "image/jpeg"), ("webp", "image/webp")):
+        p = base / variant_rel(asset.album_id, stem, SIZES["thumb"], fmt)
+        if (manifest_key(SIZES["thumb"], fmt) in items) if items is not None else p.exists():
+            return FileResponse(p, media_type=media_type)
 
     # Fallback SVG
     svg = (
@@ -395,9 +659,19 @@ def admin_login_form(request: Request):
 
 @router.post("/login")
 def admin_login(request: Request, password: str = Form(...)):
-    if password == settings.ADMIN_PASSWORD:
+    key = ("admin", request.client.host if request.client else "")
+    try:
+        unlock_guard.check(key)
+    except TooManyAttempts as e:
+        raise HTTPException(429, "Too many attempts", headers={"Retry-After": str(e.retry_after)})
+    # مقارنة بزمن ثابت (لا تكشف طول التطابق)
+    if settings.ADMIN_PASSWORD and secrets.compare_digest(
+        password.encode("utf-8"), settings.ADMIN_PASSWORD.encode("utf-8")
+    ):
+        unlock_guard.record_success(key)
         request.session["admin"] = True
         return RedirectResponse(url="/admin/albums/new", status_code=302)
+    unlock_guard.record_failure(key)
     return RedirectResponse(url="/admin", status_code=302)
 
 
@@ -454,97 +728,247 @@ def move_asset(
     asset = db.get(models.Asset, asset_id)
     if not asset:
         raise HTTPException(404)
-    album = db.get(models.Album, asset.album_id)
+    if direction not in ("up", "down", "top", "bottom"):
+        raise HTTPException(400, "Invalid direction")
+
+    # تحديث صف واحد (منتصف الفجوة بين الجارين) بدل إعادة ترقيم الألبوم كله
+    if ordering.move(db, asset, direction):
+        db.commit()
+
+    return RedirectResponse(url=f"/admin/albums/{asset.album_id}", status_code=303)
+
+
+class ReorderPayload(BaseModel):
+    ids: list[int]
 
-    assets = sorted(album.assets, key=lambda a: ((a.sort_order or 0), a.id))
-    idx = next((i for i, x in enumerate(assets) if x.id == asset.id), None)
-    if idx is None:
+
+@router.post("/albums/{album_id}/order")
+def reorder_album(
+    request: Request,
+    album_id: int,
+    payload: ReorderPayload,
+    db: Session = Depends(get_db),
+):
+    """Apply a full drag-and-drop order in one UPDATE statement."""
+    require_admin(request)
+    if not db.get(models.Album, album_id):
         raise HTTPException(404)
+    try:
+        ordering.apply_order(db, album_id, payload.ids)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    db.commit()
+    return {"ok": True, "count": len(payload.ids)}
 
-    if direction == "up":
-        new_idx = max(0, idx - 1)
-    elif direction == "down":
-        new_idx = min(len(assets) - 1, idx + 1)
-    elif direction == "top":
-        new_idx = 0
-    elif direction == "bottom":
-        new_idx = len(assets) - 1
-    else:
-        raise HTTPException(400, "Invalid direction")
 
-    if new_idx != idx:
-        item = assets.pop(idx)
-        assets.insert(new_idx, item)
-        # أعد الترقيم بخطوة 10
-        for i, it in enumerate(assets):
-            it.sort_order = i * 10
-        db.commit()
+BULK_OPS = ("delete", "hide", "unhide", "rotate", "cover")
 
-    return RedirectResponse(url=f"/admin/albums/{album.id}", status_code=303)
 
+class BulkPayload(BaseModel):
+    op: str
+    ids: list[int]
+    dir: Optional[str] = None  # rotate: 'cw' أو 'ccw'
 
-@router.post("/assets/{asset_id}/rotate")
-def rotate_asset(
+
+@router.post("/albums/{album_id}/bulk")
+def bulk_assets(
     request: Request,
-    asset_id: int,
-    dir: str = Form(...),  # 'cw' أو 'ccw'
+    album_id: int,
+    payload: BulkPayload,
     db: Session = Depends(get_db),
 ):
+    """
+    Apply one operation to many assets of an album.
+
+    Every DB change happens in a single transaction; deleting files (GC
+    tombstones) and re-rendering rotated variants run in the background.
+    Ids that are not in the album are reported back in ``missing``.
+    """
     require_admin(request)
-    asset = db.get(models.Asset, asset_id)
-    if not asset:
+    album = db.get(models.Album, album_id)
+    if not album:
         raise HTTPException(404)
+    op = payload.op
+    if op not in BULK_OPS:
+        raise HTTPException(400, f"Unknown op (expected one of {', '.join(BULK_OPS)})")
+    if op == "rotate" and payload.dir not in ("cw", "ccw"):
+        raise HTTPException(400, "rotate needs dir=cw|ccw")
+    if op == "cover" and len(payload.ids) != 1:
+        raise HTTPException(400, "cover takes exactly one id")
+
+    ids = list(dict.fromkeys(payload.ids))
+    assets = db.scalars(
+        select(models.Asset).where(models.Asset.album_id == album_id, models.Asset.id.in_(ids))
+    ).all() if ids else []
+    found = {a.id for a in assets}
+    missing = [i for i in ids if i not in found]
+
+    queued = 0
+    if op == "delete":
+        # الملفات تُمسح في الخلفية عبر tombstones (services/gc.py)
+        for a in assets:
+            db.delete(a)
+        if album.cover_asset_id in found:
+            album.cover_asset_id = None
+        db.commit()
+        queued = len(assets)
+    elif op in ("hide", "unhide"):
+        if found:
+            db.execute(
+                update(models.Asset).where(models.Asset.id.in_(found))
+                .values(is_hidden=op == "hide")
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    elif op == "cover":
+        if found:
+            album.cover_asset_id = assets[0].id
+            db.commit()
+    elif op == "rotate":
+        # التدوير كله عمل ملفات: يصطف في خيط الترميز الخلفي واحدًا تلو الآخر
+        for a in assets:
+            _upgrades.submit(_rotate_job, a.id, payload.dir)
+        queued = len(assets)
+
+    return {"ok": True, "op": op, "affected": len(found), "missing": missing, "queued": queued}
 
+
+def _rotate_original(db: Session, asset: models.Asset, dir: str) -> bool:
+    """
+    دوّر أصلًا 90° (``cw``/``ccw``) مع مشتقاته وحقوله؛ بدون commit.
+
+    أصل JPEG يُدوَّر بلا فقد (وسم EXIF Orientation)، والمشتقات المسجلة في
+    الـ manifest تُحدَّث عبر rotate_variants (في مكانها إن بقي مقاسها صحيحًا،
+    وإلا من الأصل)؛ الأصول القديمة بلا manifest تُولَّد مشتقاتها من جديد.
+    يعيد True إن أُعيد توليد المشتقات من الأصل (فيلزم ترميز AVIF بعدها).
+
+    Raises:
+        FileNotFoundError: If the original is missing on disk.
+    """
     base = Path(settings.STORAGE_DIR)
     f_rel = Path(str(asset.filename).replace("\\", "/"))
     orig = base / f_rel
     if not orig.exists():
-        raise HTTPException(404, "Original file not found")
-
-    # امسح المشتقات القديمة
+        raise FileNotFoundError(orig)
     stem = f_rel.stem
-    for p in _variant_paths(asset.album_id, stem):
-        try:
-            if p.exists():
-                p.unlink()
-        except Exception:
-            pass
 
     # دوّر الأصل
-    with Image.open(orig) as im:
-        im = ImageOps.exif_transpose(im)
-        angle = -90 if dir == "cw" else 90
-        im = im.rotate(angle, expand=True)
-        ext = orig.suffix.lower()
-        if ext in [".jpg", ".jpeg", ".png", ".webp"]:
-            im.save(orig)
+    ext = orig.suffix.lower()
+    with tracing.span("original.rotate", fmt=ext.lstrip(".")):
+        if ext in orientation.JPEG_SUFFIXES:
+            orientation.rotate_jpeg(orig, dir)
         else:
-            im.convert("RGB").save(orig.with_suffix(".jpg"), format="JPEG", quality=90, optimize=True)
-            try:
-                orig.unlink()
-            except Exception:
-                pass
-            new_rel = (Path("albums") / str(asset.album_id) / "original" / f"{stem}.jpg").as_posix()
-            asset.filename = new_rel
-            orig = base / new_rel
-
-    # توليد المشتقات وتحديث الحقول
-    variants = make_variants(
-        original_path=orig,
-        out_root=base,
-        album_id=asset.album_id,
-        filename_stem=Path(asset.filename).stem,
-    )
-    try:
-        asset.set_variants(variants)
-    except Exception:
-        pass
+            with open_image(orig) as im:
+                im = ImageOps.exif_transpose(im)
+                angle = -90 if dir == "cw" else 90
+                im = im.rotate(angle, expand=True)
+                if ext in [".png", ".webp"]:
+                    im.save(orig)
+                else:
+                    im.convert("RGB").save(orig.with_suffix(".jpg"), format="JPEG", quality=90, optimize=True)
+                    try:
+                        orig.unlink()
+                    except Exception:
+                        pass
+                    new_rel = (Path("albums") / str(asset.album_id) / "original" / f"{stem}.jpg").as_posix()
+                    asset.filename = new_rel
+                    orig = base / new_rel
+
+    current = asset.manifest
+    items = current.get("items")
+    if items:
+        # حدّث المشتقات الموجودة بنفس ملف ترميزها (في مكانها حين يصح مقاسها)
+        size = previews.oriented_size(orig)
+        # "r" يغيّر variant_version فتتغير روابط المشتقات المخزنة immutable
+        manifest = {**current, "items": {}, "w": size[0], "h": size[1], "r": current.get("r", 0) + 1}
+        with tracing.span("variants.rotate"):
+            rotate_variants(orig, base, asset.album_id, stem, items, dir, size,
+                            manifest=manifest, profile=manifest_profile(current))
+        asset.update_manifest(manifest, replace=True)
+        regenerated = False
+    else:
+        # أصل قديم بلا manifest: امسح المشتقات وولّدها من الأصل
+        with tracing.span("variants.delete"):
+            for p in gc.variant_paths(asset):
+                try:
+                    p.unlink(missing_ok=True)
+                except Exception:
+                    pass
+        manifest = {}
+        with tracing.span("variants"):
+            variants = make_variants(
+                original_path=orig,
+                out_root=base,
+                album_id=asset.album_id,
+                filename_stem=Path(asset.filename).stem,
+                create=settings.EAGER_VARIANTS,
+                manifest=manifest,
+                profile=asset.album.encoding_profile,
+            )
+        try:
+            asset.set_variants(variants)
+        except Exception:
+            pass
+        asset.update_manifest(manifest, replace=True)
+        regenerated = True
+
+    asset.size = orig.stat().st_size
+    with tracing.span("sha256"):
+        asset.sha256 = file_sha256(orig)
+    # LQIP من المصغّرة المدوَّرة إن وُجدت (أسرع بكثير من فك الأصل)
+    lqip_src = next((p for p in (base / variant_rel(asset.album_id, stem, SIZES["thumb"], fmt)
+                                 for fmt in ("jpg", "webp")) if p.exists()), orig)
     try:
-        asset.lqip = thumbs.tiny_placeholder_base64(orig)
+        with tracing.span("lqip"):
+            asset.lqip = thumbs.tiny_placeholder_base64(lqip_src)
     except Exception:
         asset.lqip = None
+    return regenerated
 
-    db.commit()
+
+def _rotate_job(asset_id: int, dir: str) -> None:
+    """مهمة خلفية (العمليات الجماعية): تدوير أصل ثم ترميز AVIF له."""
+    db = SessionLocal()
+    try:
+        asset = db.get(models.Asset, asset_id)
+        if not asset:
+            return
+        with tracing.trace("rotate", asset_id=asset_id, dir=dir, bulk=True):
+            regenerated = _rotate_original(db, asset, dir)
+            with tracing.span("db.commit"):
+                db.commit()
+    except Exception as e:
+        print("[bulk] rotate failed:", asset_id, e)
+        return
+    finally:
+        db.close()
+    if regenerated and settings.ENABLE_AVIF:
+        _encode_avif(asset_id)
+
+
+@router.post("/assets/{asset_id}/rotate")
+def rotate_asset(
+    request: Request,
+    asset_id: int,
+    background_tasks: BackgroundTasks,
+    dir: str = Form(...),  # 'cw' أو 'ccw'
+    db: Session = Depends(get_db),
+):
+    require_admin(request)
+    asset = db.get(models.Asset, asset_id)
+    if not asset:
+        raise HTTPException(404)
+
+    start_ns = getattr(request.state, "start_ns", None)
+    with tracing.trace("rotate", start_ns=start_ns, asset_id=asset_id, dir=dir):
+        try:
+            regenerated = _rotate_original(db, asset, dir)
+        except FileNotFoundError:
+            raise HTTPException(404, "Original file not found")
+        if regenerated and settings.ENABLE_AVIF:
+            background_tasks.add_task(_encode_avif, asset.id)
+        with tracing.span("db.commit"):
+            db.commit()
     return RedirectResponse(url=f"/admin/albums/{asset.album_id}", status_code=303)
 
 
@@ -556,40 +980,13 @@ def delete_asset(request: Request, asset_id: int, db: Session = Depends(get_db))
         raise HTTPException(404)
     album = db.get(models.Album, asset.album_id)
 
-    base = Path(settings.STORAGE_DIR)
-    f_rel = Path(str(asset.filename).replace("\\", "/"))
-    orig = base / f_rel
-    stem = f_rel.stem
-
-    # امسح المشتقات
-    for p in _variant_paths(album.id, stem):
-        try:
-            if p.exists():
-                p.unlink()
-        except Exception:
-            pass
-
-    # امسح الأصل
-    try:
-        if orig.exists():
-            orig.unlink()
-    except Exception:
-        pass
+    # الملفات وكائنات Drive: tombstones في نفس المعاملة (gc._bury_asset)
+    # ويمسحها الجامع الخلفي مع إعادة المحاولة
 
     # لو هي صورة الغلاف
     if getattr(album, "cover_asset_id", None) == asset.id:
         album.cover_asset_id = None
 
-    # اختياري: احذف من Drive
-    if getattr(settings, "USE_GDRIVE", False):
-        try:
-            if getattr(asset, "gdrive_file_id", None):
-                gdrive.delete_file(asset.gdrive_file_id)
-            if getattr(asset, "gdrive_thumb_id", None):
-                gdrive.delete_file(asset.gdrive_thumb_id)
-        except Exception as e:
-            print("[gdrive] delete failed:", e)
-
     db.delete(asset)
     db.commit()
     return RedirectResponse(url=f"/admin/albums/{album.id}", status_code=303)
@@ -617,12 +1014,36 @@ def clear_cover(request: Request, album_id: int, db: Session = Depends(get_db)):
     return RedirectResponse(url=f"/admin/albums/{album_id}", status_code=303)
 
 
+@router.post("/albums/{album_id}/encoding")
+def set_encoding_profile(
+    request: Request,
+    album_id: int,
+    profile: str = Form(""),  # "" = الافتراضي (settings.ENCODING_PROFILE)
+    db: Session = Depends(get_db),
+):
+    require_admin(request)
+    album = db.get(models.Album, album_id)
+    if not album:
+        raise HTTPException(404)
+    if profile and profile not in settings.ENCODING_PROFILES:
+        raise HTTPException(400, "Unknown encoding profile")
+    album.encoding_profile = profile or None
+    db.commit()
+
+    # المشتقات الموجودة تُعاد بالملف الجديد في الخلفية (واحدًا تلو الآخر)
+    target = resolve_profile(album.encoding_profile)
+    for a in album.assets:
+        if manifest_profile(a.manifest) != target:
+            _upgrades.submit(_upgrade_variants, a.id)
+    return RedirectResponse(url=f"/admin/albums/{album_id}", status_code=303)
+
+
 
 
 
 
 @router.get("/albums/{album_id}/edit", response_class=HTMLResponse)
-def edit_album_page(request: Request, album_id: int, db: Session = Depends(get_db)):
+def edit_album_page(request: Request, album_id: int, db: Session = Depends(get_read_db)):
     require_admin(request)
     album = db.get(models.Album, album_id)
     if not album:
@@ -656,12 +1077,38 @@ def update_album(
 
 @router.get("/albums", response_class=HTMLResponse)
 @router.get("/albums/", response_class=HTMLResponse, include_in_schema=False)
-def list_albums(request: Request, db: Session = Depends(get_db)):
+def list_albums(
+    request: Request,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+):
     require_admin(request)
-    albums = db.query(models.Album).order_by(models.Album.created_at.desc()).all()
+    # صفحة واحدة + المجاميع باستعلام واحد (services/albums.py)
+    albums, total = album_list.list_page(db, page, per_page)
+    pages = max(1, -(-total // per_page))
     return templates.TemplateResponse(
         "admin_album_list.html",
-        {"request": request, "albums": albums, "site_title": settings.SITE_TITLE},
+        {"request": request, "albums": albums, "site_title": settings.SITE_TITLE,
+         "page": page, "pages": pages, "per_page": per_page, "total": total},
+    )
+
+@router.get("/stats", response_class=HTMLResponse)
+def share_stats(
+    request: Request,
+    days: int = Query(30, ge=1, le=366),
+    db: Session = Depends(get_read_db),
+):
+    """Share views/downloads over the last ``days`` days, from the daily counters only."""
+    require_admin(request)
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    return templates.TemplateResponse(
+        "admin_stats.html",
+        {"request": request, "site_title": settings.SITE_TITLE, "days": days,
+         "kinds": analytics.KINDS,
+         "shares": analytics.share_totals(db, since),
+         "assets": analytics.top_assets(db, since),
+         "daily": analytics.daily_totals(db, since)},
     )
 
 @router.head("/albums", include_in_schema=False)
@@ -0,0 +1,78 @@
+# app/routers/images.py
+from __future__ import annotations
+from datetime import datetime
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from ..dependencies import get_read_db
+from ..services import negotiation, ondemand
+from ..services.metrics import cache_hit
+from ..services.variants import manifest_key, manifest_profile, variant_rel, variant_version
+from .public import load_share, require_unlocked
+
+# تحت رابط المشاركة: نفس فحص الانتهاء وكلمة المرور كملفات /s/{slug}/file
+router = APIRouter(prefix="/s", tags=["images"])
+
+YEAR = 31536000
+
+
+def _cache_control(sl: models.ShareLink, versioned: bool) -> str:
+    # المحمية لا تُخزَّن في الكاش المشترك (CDN/وسيط)، وما له تاريخ انتهاء لا
+    # يبقى في أي كاش بعده. immutable فقط لرابط بنسخة المشتق الحالية (?v=)،
+    # لأن التدوير وإعادة الترميز يكتبان فوق نفس الملف
+    scope = "private" if sl.password_hash else "public"
+    if not versioned:
+        return f"{scope}, no-cache"
+    max_age = YEAR
+    if sl.expires_at:
+        max_age = max(0, min(YEAR, int((sl.expires_at - datetime.utcnow()).total_seconds())))
+    return f"{scope}, max-age={max_age}, immutable"
+
+
+@router.get("/{slug}/img/{asset_id}/{width}.{fmt}")
+def get_image(request: Request, slug: str, asset_id: int, width: int, fmt: str,
+              db: Session = Depends(get_read_db)):
+    """
+    Serve any whitelisted width/format of a shared asset, rendering it on
+    first request and caching the result under STORAGE_DIR for later hits.
+
+    Clients should pass ``?v=<variants.variant_version>``: only URLs carrying
+    the current version are cached as immutable; others revalidate by ETag.
+    """
+    if not ondemand.is_allowed(width, fmt):
+        raise HTTPException(404)
+
+    sl = load_share(db, slug)
+    require_unlocked(request, sl)
+    a = db.get(models.Asset, asset_id)
+    if not a or a.album_id != sl.album_id or a.is_hidden:
+        raise HTTPException(404)
+
+    if manifest_key(width, fmt) in (a.manifest.get("items") or {}):
+        cache_hit("variant")
+        path = Path(settings.STORAGE_DIR) / variant_rel(a.album_id, Path(a.filename).stem, width, fmt)
+    else:
+        entry: dict = {}
+        try:
+            path = ondemand.ensure_variant(a.album_id, a.filename, width, fmt, manifest=entry,
+                                           profile=manifest_profile(a.manifest))
+        except FileNotFoundError:
+            raise HTTPException(404)
+        # الأصول القديمة بلا manifest تُترك لـ reprocess_variants.py
+        if a.variants_manifest:
+            ondemand.save_manifest(db, a, entry)
+
+    version = variant_version(a.manifest, width)
+    headers = {"Cache-Control": _cache_control(sl, bool(version) and request.query_params.get("v") == version)}
+    if version:
+        headers["ETag"] = f'"{a.id}-{width}-{fmt}-{version}"'
+        inm = request.headers.get("if-none-match")
+        if inm is not None and headers["ETag"] in inm:
+            cache_hit("http")
+            return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=negotiation.MEDIA_TYPES[fmt], headers=headers)
@@ -1,25 +1,18 @@
 # app/routers/likes.py
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ..database import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..dependencies import get_async_db
 from .. import models
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/api/like")
-def toggle_like(data: dict, db: Session = Depends(get_db)):
+async def toggle_like(data: dict, db: AsyncSession = Depends(get_async_db)):
     url = data.get("url")
     liked = data.get("liked", True)
     if not url:
         raise HTTPException(status_code=400, detail="url is required")
     like = models.Like(url=url, liked=liked)
     db.add(like)
-    db.commit()
+    await db.commit()
     return {"ok": True}
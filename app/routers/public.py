@@ -1,35 +1,36 @@
 # app/routers/public.py
 from __future__ import annotations
-from typing import Generator
+from typing import Optional
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from urllib.parse import quote
 from pathlib import Path
 import unicodedata
 
 from fastapi import APIRouter, Depends, Form, HTTPException, Request, Response
 from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, StreamingResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
 
 from .. import models
 from ..config import settings
-from ..database import SessionLocal
-from ..services import gdrive, zips
-from ..utils import is_expired, verify_password
+from ..dependencies import get_async_db, get_read_db
+from ..services import analytics, gdrive, negotiation, ondemand, zips
+from ..services.metrics import cache_hit, cache_miss
+from ..services.auth_guard import TooManyAttempts, unlock_guard, verify_password_async
+from ..services.sendfile import RangeFileResponse
+from ..services.variants import SIZES, manifest_key, manifest_profile, variant_rel, variant_version
+from ..templating import templates
+from ..utils import is_expired
 
-templates = Jinja2Templates(directory="templates")
 router = APIRouter(prefix="/s", tags=["public"])
 
 def ascii_fallback(name: str) -> str:
     n = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii")
     return n or "file"
 
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def load_share(db: Session, slug: str) -> models.ShareLink:
     sl = db.query(models.ShareLink).filter(models.ShareLink.slug == slug).first()
     if not sl:
@@ -38,15 +39,59 @@ def load_share(db: Session, slug: str) -> models.ShareLink:
         raise HTTPException(403, "Link expired")
     return sl
 
+def require_unlocked(request: Request, sl: models.ShareLink) -> None:
+    """ملفات المشاركة المحمية لا تُخدم قبل فتحها بكلمة المرور في هذه الجلسة."""
+    if sl.password_hash and not request.session.get(f"unlocked:{sl.slug}"):
+        raise HTTPException(403, "Locked")
+
+def _load_asset(
+    request: Request, db: Session, slug: str, asset_id: int,
+) -> tuple[models.ShareLink, models.Asset]:
+    sl = load_share(db, slug)
+    require_unlocked(request, sl)
+    a = db.get(models.Asset, asset_id)
+    if not a or a.album_id != sl.album_id:
+        raise HTTPException(404)
+    return sl, a
+
+# نسخ async من نفس الدوال: لا تحميل كسول للعلاقات (غير مسموح في AsyncSession)،
+# لذلك تُحمَّل العلاقات المطلوبة صراحةً عبر options.
+async def load_share_async(db: AsyncSession, slug: str, *options) -> models.ShareLink:
+    stmt = select(models.ShareLink).where(models.ShareLink.slug == slug).options(*options)
+    sl = (await db.execute(stmt)).scalars().first()
+    if not sl:
+        raise HTTPException(404, "Not found")
+    if is_expired(sl.expires_at):
+        raise HTTPException(403, "Link expired")
+    return sl
+
+async def _load_asset_async(
+    request: Request, db: AsyncSession, slug: str, asset_id: int,
+) -> tuple[models.ShareLink, models.Asset]:
+    sl = await load_share_async(db, slug)
+    require_unlocked(request, sl)
+    a = await db.get(models.Asset, asset_id)
+    if not a or a.album_id != sl.album_id:
+        raise HTTPException(404)
+    return sl, a
+
 def _url(rel: str | None) -> str | None:
     return f"/media/{rel}" if rel else None
 
+def _versioned(url: str, manifest: dict, kind: str) -> str:
+    # التدوير وإعادة الترميز يكتبان فوق نفس الملف: رابط جديد بدل انتظار max-age
+    v = variant_version(manifest, SIZES[kind])
+    return f"{url}?v={v}" if v else url
+
 def _asset_to_dict(a: models.Asset, slug: str) -> dict:
+    manifest = a.manifest
     return {
         "id": a.id,
         "name": a.original_name,
         "url": f"/s/{slug}/file/{a.id}",       # الأصل عبر الراوتر (محمي/سجل)
-        "thumb": f"/s/{slug}/thumb/{a.id}",    # الثمبنيل統 واحد: لو محلي أو درايف
+        "thumb": _versioned(f"/s/{slug}/thumb/{a.id}", manifest, "thumb"),  # محلي أو درايف
+        "disp": _versioned(f"/s/{slug}/disp/{a.id}", manifest, "disp"),     # 1600 بالصيغة المناسبة
+        "big": _versioned(f"/s/{slug}/big/{a.id}", manifest, "big"),        # 2048 يُولَّد عند أول طلب
         "width": a.width, "height": a.height, "lqip": a.lqip,
         # مشتقات مباشرة من /media (مسارات نسبية مخزنة)
         "jpg_480": _url(a.jpg_480),   "jpg_960": _url(a.jpg_960),
@@ -58,8 +103,12 @@ def _asset_to_dict(a: models.Asset, slug: str) -> dict:
     }
 
 @router.get("/{slug}", response_class=HTMLResponse)
-def open_share(request: Request, slug: str, db: Session = Depends(get_db)):
-    sl = load_share(db, slug)
+async def open_share(request: Request, slug: str, db: AsyncSession = Depends(get_async_db)):
+    # الألبوم وصوره في استعلامين إضافيين بدل تحميل كسول
+    sl = await load_share_async(
+        db, slug,
+        selectinload(models.ShareLink.album).selectinload(models.Album.assets),
+    )
     album = sl.album
 
     # محمي؟
@@ -72,7 +121,7 @@ def open_share(request: Request, slug: str, db: Session = Depends(get_db)):
 
     assets_orm = [a for a in album.assets if not a.is_hidden]
     # ترتيب بالـ sort_order ثم id
-    assets_orm.sort(key=lambda a: ((a.sort_order or 0), a.id))
+    assets_orm.sort(key=lambda a: (a.sort_order, a.id))
 
     # اختَر الغلاف (إن وُجد) وإلا أول صورة
     hero_orm = None
@@ -81,6 +130,7 @@ def open_share(request: Request, slug: str, db: Session = Depends(get_db)):
     if not hero_orm and assets_orm:
         hero_orm = assets_orm[0]
 
+    analytics.record(analytics.VISIT, sl.id)
     hero = _asset_to_dict(hero_orm, slug) if hero_orm else None
     others = [_asset_to_dict(a, slug) for a in assets_orm if not hero_orm or a.id != hero_orm.id]
 
@@ -92,67 +142,226 @@ def open_share(request: Request, slug: str, db: Session = Depends(get_db)):
     })
 
 @router.post("/{slug}/unlock")
-def unlock(request: Request, slug: str, password: str = Form(...), db: Session = Depends(get_db)):
-    sl = load_share(db, slug)
+async def unlock(request: Request, slug: str, password: str = Form(...), db: AsyncSession = Depends(get_async_db)):
+    sl = await load_share_async(db, slug)
     if not sl.password_hash:
         return RedirectResponse(f"/s/{slug}", status_code=302)
-    if verify_password(password, sl.password_hash):
+
+    # حد المحاولات قبل أي عمل bcrypt مكلف
+    key = (slug, request.client.host if request.client else "")
+    try:
+        unlock_guard.check(key)
+        ok = await verify_password_async(password, sl.password_hash)
+    except TooManyAttempts as e:
+        raise HTTPException(429, "Too many attempts", headers={"Retry-After": str(e.retry_after)})
+
+    if ok:
+        unlock_guard.record_success(key)
         request.session[f"unlocked:{slug}"] = True
         return RedirectResponse(f"/s/{slug}", status_code=302)
+    unlock_guard.record_failure(key)
     raise HTTPException(403, "Wrong password")
 
+def _original_validators(a: models.Asset) -> dict[str, str]:
+    """
+    ETag / Last-Modified للأصل من بيانات السجل فقط (sha256 أو الحجم + updated_at)،
+    فإعادة التحقق (304) لا تلمس القرص ولا Drive.
+    """
+    stamp = a.updated_at or a.created_at
+    if a.sha256:
+        etag = f'"{a.sha256[:32]}"'
+    else:
+        ts = int(stamp.timestamp()) if stamp else 0
+        etag = f'"{a.id}-{(a.size or 0):x}-{ts:x}"'
+    headers = {"ETag": etag}
+    if stamp:
+        headers["Last-Modified"] = format_datetime(stamp.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+def _not_modified(request: Request, validators: dict[str, str]) -> bool:
+    inm = request.headers.get("if-none-match")
+    ims = request.headers.get("if-modified-since")
+    if inm is not None:
+        fresh = inm.strip() == "*" or validators["ETag"] in inm
+    elif ims and "Last-Modified" in validators:
+        try:
+            fresh = parsedate_to_datetime(validators["Last-Modified"]) <= parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            fresh = False
+    else:
+        return False
+    # طلب شرطي: 304 = إصابة في كاش المتصفح/الوسيط
+    (cache_hit if fresh else cache_miss)("http")
+    return fresh
+
 @router.get("/{slug}/file/{asset_id}")
-def get_file(slug: str, asset_id: int, db: Session = Depends(get_db)):
-    sl = load_share(db, slug)
-    a = db.get(models.Asset, asset_id)
-    if not a or a.album_id != sl.album_id:
-        raise HTTPException(404)
+async def get_file(request: Request, slug: str, asset_id: int, db: AsyncSession = Depends(get_async_db)):
+    sl, a = await _load_asset_async(request, db, slug, asset_id)
+
+    validators = _original_validators(a)
+    cache = {"Cache-Control": ("private" if sl.password_hash else "public") + ", max-age=3600"}
+    if _not_modified(request, validators):
+        return Response(status_code=304, headers={**validators, **cache})
+    # تنزيل واحد لكل بداية ملف، لا لكل طلب Range لاحق
+    if (request.headers.get("range") or "bytes=0-").replace(" ", "").startswith("bytes=0-"):
+        analytics.record(analytics.DOWNLOAD, sl.id, a.id)
+
+    original_name = a.original_name or "file"
 
     # Drive؟
     if getattr(settings, "USE_GDRIVE", False) and getattr(a, "gdrive_file_id", None):
-        meta = gdrive.get_meta(a.gdrive_file_id)
+        meta = await run_in_threadpool(gdrive.get_meta, a.gdrive_file_id)
         original_name = a.original_name or meta.get("name") or "file"
         safe_name = ascii_fallback(original_name)
         headers = {
             "Content-Disposition": (
                 f'inline; filename="{safe_name}"; '
                 f"filename*=UTF-8''{quote(original_name)}"
-            )
+            ),
+            **validators, **cache,
         }
         mime = meta.get("mimeType") or "application/octet-stream"
         gen = gdrive.stream_via_requests(a.gdrive_file_id, chunk_size=256 * 1024)
         return StreamingResponse(gen, media_type=mime, headers=headers)
 
     # محلي
-    fpath = Path(settings.STORAGE_DIR) / a.filename
-    if not fpath.exists():
+    rel = str(a.filename).replace("\\", "/")
+    headers = {
+        "Content-Disposition": (
+            f'attachment; filename="{ascii_fallback(original_name)}"; '
+            f"filename*=UTF-8''{quote(original_name)}"
+        ),
+        **validators, **cache,
+    }
+    media_type = a.mime_type or "application/octet-stream"
+
+    # nginx يخدم البايتات؛ التطبيق يتحقق من الصلاحية فقط
+    if settings.X_ACCEL_REDIRECT_PREFIX:
+        prefix = settings.X_ACCEL_REDIRECT_PREFIX.rstrip("/")
+        headers["X-Accel-Redirect"] = f"{prefix}/{quote(rel)}"
+        return Response(status_code=200, headers=headers, media_type=media_type)
+
+    fpath = Path(settings.STORAGE_DIR) / rel
+    try:
+        st = await run_in_threadpool(fpath.stat)
+    except FileNotFoundError:
         raise HTTPException(404)
-    return FileResponse(fpath, filename=a.original_name)
+
+    # If-Range: لا تُرسل جزءًا إن تغيّر الملف منذ أن بدأ العميل التحميل
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != validators["ETag"]:
+        range_header = None
+    return RangeFileResponse(fpath, st, range_header, headers=headers, media_type=media_type)
+
+_NO_PREVIEW_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="400" height="260">'
+    '<rect width="100%" height="100%" fill="#e2e8f0"/>'
+    '<text x="50%" y="50%" dominant-baseline="middle" text-anchor="middle" '
+    'font-family="Segoe UI, Roboto, sans-serif" font-size="16" fill="#64748b">No preview</text>'
+    '</svg>'
+)
+
+def _variant_response(
+    request: Request, sl: models.ShareLink, a: models.Asset, kind: str,
+) -> tuple[Response, Optional[dict]]:
+    """
+    يختار صيغة المشتق (AVIF/WebP/JPEG) حسب ترويسة Accept ويعيده مع
+    Vary: Accept و ETag خاص بكل صيغة. الصيغ المتوفرة تُقرأ من manifest
+    الأصل دون أي فحص للقرص.
+
+    لا يلمس الجلسة: يعيد (الرد، مدخل manifest جديد أو None) ويترك الحفظ
+    للمستدعي (sync أو async).
+    """
+    width = SIZES[kind]
+    base = Path(settings.STORAGE_DIR)
+    stem = Path(str(a.filename).replace("\\", "/")).stem
+
+    manifest = a.manifest
+    items = manifest.get("items")
+    if items is None:
+        # أصول قديمة بلا manifest: افحص القرص (reprocess_variants.py يملؤه)
+        items = {}
+        for fmt in negotiation.PREFERENCE:
+            p = base / variant_rel(a.album_id, stem, width, fmt)
+            if p.exists():
+                items[manifest_key(width, fmt)] = [None, None, p.stat().st_size]
+
+    found = {
+        fmt: items[manifest_key(width, fmt)]
+        for fmt in negotiation.PREFERENCE
+        if manifest_key(width, fmt) in items
+    }
+
+    # الصيغ التي يمكن توليدها عند الطلب (big لا يُولَّد عند الرفع)
+    lazy = {f for f in negotiation.PREFERENCE if ondemand.is_allowed(width, f)}
+    accept = request.headers.get("accept")
+    fmt = negotiation.pick_format(accept, found.keys() | lazy)
+    new_entry = None
+    if fmt in found:
+        cache_hit("variant")
+    elif fmt:
+        entry: dict = {}
+        try:
+            ondemand.ensure_variant(a.album_id, a.filename, width, fmt, manifest=entry,
+                                    profile=manifest_profile(manifest))
+            found[fmt] = entry["items"][manifest_key(width, fmt)]
+            if a.variants_manifest:
+                new_entry = entry
+        except FileNotFoundError:
+            fmt = negotiation.pick_format(accept, found.keys())
+    if not fmt:
+        return Response(content=_NO_PREVIEW_SVG, media_type="image/svg+xml"), None
+
+    # نفس رمز ?v= في روابط الصور: أبعاد وأحجام هذا العرض + البروفايل (p) وعدد
+    # التدويرات (r) — التدوير أو إعادة الترميز في مكانه يغيّر الـ ETag.
+    version = variant_version(
+        {**manifest, "items": {**items, **{manifest_key(width, f): v for f, v in found.items()}}},
+        width,
+    )
+    etag = f'"{a.id}-{kind}-{fmt}-{version}"'
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept",
+        "Cache-Control": ("private" if sl.password_hash else "public") + ", max-age=86400",
+    }
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        (cache_hit if etag in inm else cache_miss)("http")
+        if etag in inm:
+            return Response(status_code=304, headers=headers), new_entry
+    path = base / variant_rel(a.album_id, stem, width, fmt)
+    return FileResponse(path, media_type=negotiation.MEDIA_TYPES[fmt], headers=headers), new_entry
+
+def _variant_response_sync(request: Request, db: Session, sl, a, kind: str) -> Response:
+    resp, entry = _variant_response(request, sl, a, kind)
+    if entry:
+        ondemand.save_manifest(db, a, entry)
+    return resp
 
 @router.get("/{slug}/thumb/{asset_id}")
-def get_thumb(slug: str, asset_id: int, db: Session = Depends(get_db)):
-    sl = load_share(db, slug)
-    a = db.get(models.Asset, asset_id)
-    if not a or a.album_id != sl.album_id:
-        raise HTTPException(404)
+async def get_thumb(request: Request, slug: str, asset_id: int, db: AsyncSession = Depends(get_async_db)):
+    sl, a = await _load_asset_async(request, db, slug, asset_id)
+    analytics.record(analytics.THUMB, sl.id, a.id)
 
     if getattr(settings, "USE_GDRIVE", False) and getattr(a, "gdrive_thumb_id", None):
         gen = gdrive.stream_via_requests(a.gdrive_thumb_id, chunk_size=256 * 1024)
         return StreamingResponse(gen, media_type="image/jpeg")
 
-    # محلي من المشتقات الجاهزة
-    stem = Path(str(a.filename).replace("\\", "/")).stem
-    base = Path(settings.STORAGE_DIR) / "albums" / str(a.album_id) / "thumb" / "400"
-    jpg = base / f"{stem}.jpg"; webp = base / f"{stem}.webp"
-    if jpg.exists():  return FileResponse(jpg, media_type="image/jpeg")
-    if webp.exists(): return FileResponse(webp, media_type="image/webp")
-
-    # fallback
-    svg = ('<svg xmlns="http://www.w3.org/2000/svg" width="400" height="260">'
-           '<rect width="100%" height="100%" fill="#e2e8f0"/>'
-           '<text x="50%" y="50%" dominant-baseline="middle" text-anchor="middle" '
-           'font-family="Segoe UI, Roboto, sans-serif" font-size="16" fill="#64748b">No preview</text>'
-           '</svg>')
-    return Response(content=svg, media_type="image/svg+xml")
+    # محلي من المشتقات الجاهزة (فحص/توليد الملف في threadpool، الحفظ هنا)
+    resp, entry = await run_in_threadpool(_variant_response, request, sl, a, "thumb")
+    if entry:
+        await ondemand.save_manifest_async(db, a, entry)
+    return resp
 
+@router.get("/{slug}/disp/{asset_id}")
+def get_disp(request: Request, slug: str, asset_id: int, db: Session = Depends(get_read_db)):
+    sl, a = _load_asset(request, db, slug, asset_id)
+    analytics.record(analytics.VIEW, sl.id, a.id)
+    return _variant_response_sync(request, db, sl, a, "disp")
 
+@router.get("/{slug}/big/{asset_id}")
+def get_big(request: Request, slug: str, asset_id: int, db: Session = Depends(get_read_db)):
+    sl, a = _load_asset(request, db, slug, asset_id)
+    analytics.record(analytics.VIEW, sl.id, a.id)
+    return _variant_response_sync(request, db, sl, a, "big")
@@ -0,0 +1,158 @@
+# app/services/albums.py
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session, aliased
+
+from .. import models
+from ..config import settings
+from .ordering import SORT_KEY
+from .variants import SIZES, manifest_key, variant_rel, variant_version
+
+# ======================================================
+# Admin album list
+# ======================================================
+# صفحة واحدة من الألبومات باستعلام واحد: الألبومات مرتبة بـ created_at (فهرس
+# ix_albums_created_at) مع LIMIT/OFFSET، وعدد الأصول وحجمها وعدد روابط
+# المشاركة كاستعلامات فرعية مترابطة تُحسب لصفوف الصفحة فقط (فهرس album_id)،
+# والمجموع الكلي عبر COUNT(*) OVER (). لا تحميل لعلاقات ORM في القالب.
+
+
+def thumb_url(album_id: int, asset_id: Optional[int], filename: Optional[str],
+              manifest: Optional[str]) -> Optional[str]:
+    """
+    URL of an asset's 400px thumbnail: the variant file under ``/media`` when
+    the manifest records one, else ``/admin/thumb/{id}`` (legacy assets).
+    Works from raw column values so callers can select just those columns.
+
+    ``/media`` is cached as immutable while rotation and re-encoding rewrite
+    the file in place, so the URL carries ``?v=<variants.variant_version>``.
+    """
+    if not asset_id:
+        return None
+    try:
+        data = json.loads(manifest) if manifest else {}
+    except ValueError:
+        data = {}
+    items = data.get("items") or {}
+    for fmt in ("jpg", "webp"):
+        if filename and manifest_key(SIZES["thumb"], fmt) in items:
+            stem = Path(str(filename).replace("\\", "/")).stem
+            url = "/media/" + variant_rel(album_id, stem, SIZES["thumb"], fmt).as_posix()
+            return f"{url}?v={variant_version(data, SIZES['thumb'])}"
+    return f"/admin/thumb/{asset_id}"
+
+
+def thumb_file(album_id: int, filename: Optional[str], manifest: Optional[str]) -> Optional[Path]:
+    """Local path of an asset's 400px thumbnail if its manifest records one."""
+    try:
+        items = (json.loads(manifest).get("items") or {}) if manifest else {}
+    except ValueError:
+        items = {}
+    stem = Path(str(filename).replace("\\", "/")).stem
+    for fmt in ("jpg", "webp"):
+        if filename and manifest_key(SIZES["thumb"], fmt) in items:
+            return Path(settings.STORAGE_DIR) / variant_rel(album_id, stem, SIZES["thumb"], fmt)
+    return None
+
+
+def list_page(db: Session, page: int = 1, per_page: int = 50) -> tuple[list[dict], int]:
+    """
+    Return one page of albums (newest first) with their aggregates, plus the
+    total number of albums — all from a single SELECT.
+
+    Each row is a dict with ``id``, ``title``, ``photographer``,
+    ``event_date``, ``created_at``, ``assets``, ``bytes``, ``shares``,
+    ``cover_asset_id`` and ``cover_url``.
+
+    Args:
+        page: 1-based page number.
+        per_page: Albums per page.
+    """
+    Al, A, S = models.Album, models.Asset, models.ShareLink
+    cover = aliased(A)
+    n_assets = select(func.count(A.id)).where(A.album_id == Al.id).scalar_subquery()
+    n_bytes = select(func.coalesce(func.sum(A.size), 0)).where(A.album_id == Al.id).scalar_subquery()
+    n_shares = select(func.count(S.id)).where(S.album_id == Al.id).scalar_subquery()
+
+    q = (
+        select(
+            Al.id, Al.title, Al.photographer, Al.event_date, Al.created_at, Al.cover_asset_id,
+            n_assets.label("assets"), n_bytes.label("bytes"), n_shares.label("shares"),
+            cover.filename.label("cover_filename"),
+            cover.variants_manifest.label("cover_manifest"),
+            func.count().over().label("total"),
+        )
+        .outerjoin(cover, cover.id == Al.cover_asset_id)
+        .order_by(Al.created_at.desc(), Al.id.desc())
+        .limit(per_page)
+        .offset((max(page, 1) - 1) * per_page)
+    )
+    rows = db.execute(q).all()
+    if not rows and page > 1:
+        # صفحة بعد النهاية: المجموع ما زال مطلوبًا لروابط التنقل
+        return [], db.scalar(select(func.count(Al.id))) or 0
+    total = rows[0].total if rows else 0
+    return [
+        {
+            "id": r.id, "title": r.title, "photographer": r.photographer,
+            "event_date": r.event_date, "created_at": r.created_at,
+            "assets": r.assets or 0, "bytes": r.bytes or 0, "shares": r.shares or 0,
+            "cover_asset_id": r.cover_asset_id,
+            "cover_url": thumb_url(r.id, r.cover_asset_id, r.cover_filename, r.cover_manifest),
+        }
+        for r in rows
+    ], total
+
+
+# ======================================================
+# Admin album view: assets by keyset
+# ======================================================
+# الشبكة في صفحة الألبوم تطلب الأصول صفحة بعد صفحة بمؤشر (sort key, id) بدل
+# OFFSET: SORT_KEY هو العمود sort_order نفسه (NOT NULL)، فكل صفحة قراءة نطاق من
+# الفهرس (album_id, sort_order) مهما كان عمقها.
+
+def parse_cursor(cursor: Optional[str]) -> Optional[tuple[int, int]]:
+    """``"<key>:<id>"`` → ``(key, id)``; ``None``/empty → ``None``.
+
+    Raises:
+        ValueError: On a malformed cursor.
+    """
+    if not cursor:
+        return None
+    key, _, asset_id = cursor.partition(":")
+    return int(key), int(asset_id)
+
+
+def assets_page(db: Session, album_id: int, after: Optional[tuple[int, int]] = None,
+                limit: int = 200) -> tuple[list[dict], Optional[str]]:
+    """
+    One page of an album's assets in display order, after the ``after``
+    cursor. Returns the items and the cursor of the next page (``None`` at
+    the end). Only the columns the grid needs are selected.
+    """
+    A = models.Asset
+    q = (
+        select(A.id, A.original_name, A.width, A.height, A.size, A.is_hidden,
+               A.filename, A.variants_manifest, SORT_KEY.label("key"))
+        .where(A.album_id == album_id)
+        .order_by(SORT_KEY, A.id)
+        .limit(limit)
+    )
+    if after is not None:
+        q = q.where(tuple_(SORT_KEY, A.id) > tuple_(*after))
+    rows = db.execute(q).all()
+    items = [
+        {
+            "id": r.id, "name": r.original_name, "w": r.width, "h": r.height,
+            "size": r.size or 0, "hidden": bool(r.is_hidden),
+            "thumb": thumb_url(album_id, r.id, r.filename, r.variants_manifest),
+        }
+        for r in rows
+    ]
+    nxt = f"{rows[-1].key}:{rows[-1].id}" if len(rows) == limit else None
+    return items, nxt
@@ -0,0 +1,223 @@
+# app/services/analytics.py
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import Counter, deque
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from .metrics import ANALYTICS_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Share analytics
+# ======================================================
+# المسارات العامة لا تكتب في القاعدة: record() يضيف حدثًا إلى حلقة في الذاكرة
+# (deque بحد أقصى، O(1) بلا قفل) ويعود فورًا. خيط لكل عامل يفرغها على دفعات:
+# إدراج واحد في analytics_events (سجل إلحاقي) وزيادة العدادات اليومية في
+# analytics_daily في نفس المعاملة. صفحة الإحصاءات تقرأ العدادات فقط.
+# إن امتلأت الحلقة (القاعدة متوقفة) يسقط الأقدم ويُعدّ في
+# analytics_events_total{result="dropped"}.
+
+VISIT = "visit"        # صفحة الألبوم
+THUMB = "thumb"        # مصغّرة في الشبكة
+VIEW = "view"          # disp/big (فتح الصورة)
+DOWNLOAD = "download"  # الأصل
+
+KINDS = (VISIT, THUMB, VIEW, DOWNLOAD)
+
+_buffer: deque = deque(maxlen=settings.ANALYTICS_BUFFER_SIZE)
+
+
+def record(kind: str, share_id: int, asset_id: Optional[int] = None) -> None:
+    """Queue one event; never blocks and never touches the database."""
+    if not settings.ANALYTICS_ENABLED:
+        return
+    if len(_buffer) == _buffer.maxlen:
+        ANALYTICS_EVENTS.labels(result="dropped").inc()
+    _buffer.append((time.time(), kind, share_id, asset_id))
+    if len(_buffer) >= settings.ANALYTICS_BATCH_SIZE:
+        _wake.set()
+
+
+def _take(limit: int) -> list[tuple]:
+    batch = []
+    while len(batch) < limit:
+        try:
+            batch.append(_buffer.popleft())
+        except IndexError:
+            break
+    return batch
+
+
+def _bump(db: Session, counts: Counter) -> None:
+    # زيادة ذرّية (upsert) حتى لا تتسابق العمال على نفس الصف
+    D = models.AnalyticsDaily
+    rows = [{"day": d, "share_id": s, "asset_id": a, "kind": k, "count": n}
+            for (d, s, a, k), n in counts.items()]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        ins = (pg_insert if dialect == "postgresql" else sqlite_insert)(D).values(rows)
+        db.execute(ins.on_conflict_do_update(
+            index_elements=[D.day, D.share_id, D.asset_id, D.kind],
+            set_={"count": D.count + ins.excluded["count"]},
+        ))
+        return
+    for r in rows:
+        res = db.execute(update(D).where(
+            D.day == r["day"], D.share_id == r["share_id"],
+            D.asset_id == r["asset_id"], D.kind == r["kind"],
+        ).values(count=D.count + r["count"]))
+        if not res.rowcount:
+            db.execute(insert(D), [r])
+
+
+def flush(db: Session) -> int:
+    """
+    Write one batch (up to ``ANALYTICS_BATCH_SIZE``) of buffered events and
+    their daily counts in a single transaction. Returns the events written.
+    A failed batch is dropped (and counted) rather than retried.
+    """
+    batch = _take(settings.ANALYTICS_BATCH_SIZE)
+    if not batch:
+        return 0
+    events = []
+    counts: Counter = Counter()
+    for ts, kind, share_id, asset_id in batch:
+        at = datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+        events.append({"ts": at, "kind": kind, "share_id": share_id, "asset_id": asset_id})
+        counts[(at.date(), share_id, asset_id or 0, kind)] += 1
+    try:
+        db.execute(insert(models.AnalyticsEvent), events)
+        _bump(db, counts)
+        db.commit()
+    except Exception:
+        db.rollback()
+        ANALYTICS_EVENTS.labels(result="failed").inc(len(batch))
+        raise
+    ANALYTICS_EVENTS.labels(result="flushed").inc(len(batch))
+    return len(batch)
+
+
+def drain(db: Session) -> int:
+    """Flush until the buffer is empty; returns the events written."""
+    total = 0
+    while n := flush(db):
+        total += n
+    return total
+
+
+def prune(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete raw events older than ``ANALYTICS_RETENTION_DAYS`` (the counters stay)."""
+    now = now or datetime.utcnow()
+    E = models.AnalyticsEvent
+    res = db.execute(delete(E).where(E.ts < now - timedelta(days=settings.ANALYTICS_RETENTION_DAYS)))
+    db.commit()
+    return res.rowcount or 0
+
+
+# ======================================================
+# Flusher thread
+# ======================================================
+
+_wake = threading.Event()
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def _loop() -> None:
+    from ..database import SessionLocal
+
+    pruned_at = 0.0
+    while True:
+        stopping = _stop.is_set()
+        db = SessionLocal()
+        try:
+            drain(db)
+            if time.monotonic() - pruned_at > 3600:
+                prune(db)
+                pruned_at = time.monotonic()
+        except Exception as e:
+            logger.warning("analytics: flush failed: %s", e)
+        finally:
+            db.close()
+        if stopping:
+            return
+        _wake.wait(settings.ANALYTICS_FLUSH_SECONDS)
+        _wake.clear()
+
+
+def start() -> None:
+    """Start the per-worker flusher thread (no-op if analytics are disabled)."""
+    global _thread
+    if not settings.ANALYTICS_ENABLED or (_thread and _thread.is_alive()):
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="analytics-flush", daemon=True)
+    _thread.start()
+
+
+def stop(timeout: float = 5.0) -> None:
+    """Flush what is buffered and stop the thread."""
+    global _thread
+    _stop.set()
+    _wake.set()
+    if _thread:
+        _thread.join(timeout)
+        _thread = None
+
+
+# ======================================================
+# Stats (aggregates only)
+# ======================================================
+
+def _sums(D):
+    return [func.coalesce(func.sum(D.count).filter(D.kind == k), 0).label(k) for k in KINDS]
+
+
+def share_totals(db: Session, since: date) -> list[dict]:
+    """Per-share counts since ``since``, busiest first, with slug and album title."""
+    D, S, Al = models.AnalyticsDaily, models.ShareLink, models.Album
+    rows = db.execute(
+        select(D.share_id, S.slug, Al.id.label("album_id"), Al.title, *_sums(D))
+        .outerjoin(S, S.id == D.share_id)
+        .outerjoin(Al, Al.id == S.album_id)
+        .where(D.day >= since)
+        .group_by(D.share_id, S.slug, Al.id, Al.title)
+        .order_by(func.sum(D.count).desc())
+    ).all()
+    return [dict(r._mapping) for r in rows]
+
+
+def top_assets(db: Session, since: date, limit: int = 20) -> list[dict]:
+    """Most viewed/downloaded assets since ``since`` with name and album."""
+    D, A = models.AnalyticsDaily, models.Asset
+    sums = _sums(D)
+    rows = db.execute(
+        select(D.asset_id, A.original_name, A.album_id, *sums)
+        .outerjoin(A, A.id == D.asset_id)
+        .where(D.day >= since, D.asset_id != 0)
+        .group_by(D.asset_id, A.original_name, A.album_id)
+        .order_by((sums[KINDS.index(VIEW)] + sums[KINDS.index(DOWNLOAD)]).desc())
+        .limit(limit)
+    ).all()
+    return [dict(r._mapping) for r in rows]
+
+
+def daily_totals(db: Session, since: date) -> list[dict]:
+    """All shares together, one row per day since ``since`` (oldest first)."""
+    D = models.AnalyticsDaily
+    rows = db.execute(
+        select(D.day, *_sums(D)).where(D.day >= since).group_by(D.day).order_by(D.day)
+    ).all()
+    return [dict(r._mapping) for r in rows]
@@ -0,0 +1,146 @@
+# app/services/auth_guard.py
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from ..config import settings
+from ..utils import verify_password
+
+
+class TooManyAttempts(Exception):
+    """Raised when a key is rate limited, locked out or the hash pool is saturated."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+# ======================================================
+# Bounded bcrypt pool
+# ======================================================
+# bcrypt يستهلك ~250ms من CPU لكل تحقق؛ نعزله في مجمّع صغير مستقل حتى لا
+# تستهلك محاولات التخمين threadpool الخاص بـ Starlette الذي يخدم المعرض.
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pending = 0
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_WORKERS,
+                thread_name_prefix="pwverify",
+            )
+        return _executor
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    """
+    Verify a password on the dedicated pool without blocking the event loop.
+
+    Raises:
+        TooManyAttempts: If ``PASSWORD_QUEUE_MAX`` verifications are already
+            running or queued (the request is rejected instead of waiting).
+    """
+    global _pending
+    with _executor_lock:
+        if _pending >= settings.PASSWORD_QUEUE_MAX:
+            raise TooManyAttempts(retry_after=1)
+        _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_pool(), verify_password, plain, hashed)
+    finally:
+        with _executor_lock:
+            _pending -= 1
+
+
+# ======================================================
+# Rate limiting + lockout (in-memory, per worker process)
+# ======================================================
+
+class AttemptGuard:
+    """
+    Token-bucket rate limiter with a failure lockout table.
+
+    Each key (for example ``(slug, client_ip)``) may make ``burst`` attempts
+    immediately and then ``rate_per_minute`` per minute. After
+    ``max_failures`` consecutive failures the key is locked for
+    ``lockout_seconds``. State lives in process memory, so limits apply per
+    gunicorn worker.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        burst: int,
+        max_failures: int,
+        lockout_seconds: int,
+        max_keys: int = 10_000,
+    ):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_failures = max_failures
+        self.lockout_seconds = lockout_seconds
+        self.max_keys = max_keys
+        self._buckets: dict[tuple, list[float]] = {}  # key -> [tokens, last_ts]
+        self._failures: dict[tuple, int] = {}
+        self._locked_until: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        # امنع تضخم الذاكرة عند هجوم من عناوين كثيرة
+        if len(self._buckets) <= self.max_keys:
+            return
+        full = [k for k, (tokens, ts) in self._buckets.items()
+                if tokens + (now - ts) * self.rate >= self.burst]
+        for k in full:
+            self._buckets.pop(k, None)
+        for k, until in list(self._locked_until.items()):
+            if until <= now:
+                self._locked_until.pop(k, None)
+                self._failures.pop(k, None)
+
+    def check(self, key: tuple) -> None:
+        """Consume one attempt for ``key`` or raise ``TooManyAttempts``."""
+        now = time.monotonic()
+        with self._lock:
+            until = self._locked_until.get(key)
+            if until and until > now:
+                raise TooManyAttempts(retry_after=int(until - now) + 1)
+
+            self._prune(now)
+            tokens, ts = self._buckets.get(key, [float(self.burst), now])
+            tokens = min(float(self.burst), tokens + (now - ts) * self.rate)
+            if tokens < 1.0:
+                self._buckets[key] = [tokens, now]
+                raise TooManyAttempts(retry_after=int((1.0 - tokens) / self.rate) + 1)
+            self._buckets[key] = [tokens - 1.0, now]
+
+    def record_failure(self, key: tuple) -> None:
+        with self._lock:
+            n = self._failures.get(key, 0) + 1
+            self._failures[key] = n
+            if n >= self.max_failures:
+                self._locked_until[key] = time.monotonic() + self.lockout_seconds
+                self._failures[key] = 0
+
+    def record_success(self, key: tuple) -> None:
+        with self._lock:
+            self._failures.pop(key, None)
+            self._locked_until.pop(key, None)
+
+
+unlock_guard = AttemptGuard(
+    rate_per_minute=settings.UNLOCK_RATE_PER_MINUTE,
+    burst=settings.UNLOCK_BURST,
+    max_failures=settings.UNLOCK_MAX_FAILURES,
+    lockout_seconds=settings.UNLOCK_LOCKOUT_SECONDS,
+)
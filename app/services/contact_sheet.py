@@ -0,0 +1,283 @@
+# app/services/contact_sheet.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Optional
+
+from PIL import Image, ImageDraw, ImageFont
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from .albums import thumb_file
+from .ordering import SORT_KEY
+from .variants import open_image
+
+# ======================================================
+# Contact sheet (proof) PDF
+# ======================================================
+# صفحات A4 من المصغّرات 400 الموجودة (لا يُفك أي أصل)، بترتيب العرض ودون
+# الأصول المخفية. كل صفحة تُرسم صورةً واحدة (JPEG) وتُكتب إلى الملف فورًا،
+# فالذاكرة صفحة واحدة مهما كبر الألبوم. التوليد في عملية منفصلة (spawn) حتى
+# لا يأخذ الـ GIL من العامل، والطلب يبث الملف الجزئي أثناء كتابته. الناتج
+# يُحفظ في albums/<id>/exports/contact-<نسخة>.pdf ويُعاد استخدامه حتى يتغير
+# الألبوم (الأصول، ترتيبها، إخفاؤها، مشتقاتها، العنوان).
+
+EXPORTS_DIR = "exports"
+
+# A4 بالنقاط (1/72 بوصة)
+PAGE_PT = (595.28, 841.89)
+
+logger = logging.getLogger(__name__)
+
+
+def _rows(db: Session, album_id: int) -> list:
+    A = models.Asset
+    return db.execute(
+        select(A.id, A.original_name, A.filename, A.variants_manifest)
+        .where(A.album_id == album_id, A.is_hidden.is_not(True))
+        .order_by(SORT_KEY, A.id)
+    ).all()
+
+
+def plan(db: Session, album: models.Album) -> tuple[str, list[tuple[Optional[str], str]]]:
+    """
+    Version and page entries of an album's contact sheet.
+
+    Returns:
+        ``(version, entries)``; each entry is ``(thumb path or None, caption)``.
+    """
+    rows = _rows(db, album.id)
+    h = hashlib.sha1()
+    h.update(f"{album.title}|{settings.CONTACT_SHEET_COLUMNS}x{settings.CONTACT_SHEET_ROWS}"
+             f"@{settings.CONTACT_SHEET_DPI}\n".encode())
+    entries = []
+    for r in rows:
+        h.update(f"{r.id}:{r.filename}:{r.variants_manifest or ''}\n".encode())
+        src = thumb_file(album.id, r.filename, r.variants_manifest)
+        entries.append((str(src) if src else None, r.original_name))
+    return h.hexdigest()[:16], entries
+
+
+def export_path(album_id: int, version: str) -> Path:
+    return Path(settings.STORAGE_DIR) / "albums" / str(album_id) / EXPORTS_DIR / f"contact-{version}.pdf"
+
+
+# ================
+# PDF writer
+# ================
+
+class _PdfWriter:
+    """Minimal PDF writer: one full-page JPEG per page, written as it comes."""
+
+    def __init__(self, fp: BinaryIO):
+        self.fp = fp
+        self.offsets: dict[int, int] = {}
+        self.kids: list[int] = []
+        self.next = 3  # 1 = Catalog، 2 = Pages (يُكتب في النهاية)
+        fp.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    def _obj(self, num: int, body: bytes, stream: Optional[bytes] = None) -> None:
+        self.offsets[num] = self.fp.tell()
+        self.fp.write(b"%d 0 obj\n" % num + body)
+        if stream is not None:
+            self.fp.write(b"\nstream\n" + stream + b"\nendstream")
+        self.fp.write(b"\nendobj\n")
+
+    def page(self, jpeg: bytes, size: tuple[int, int]) -> None:
+        img, content, page = self.next, self.next + 1, self.next + 2
+        self.next += 3
+        pw, ph = PAGE_PT
+        self._obj(img, b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB"
+                       b" /BitsPerComponent 8 /Filter /DCTDecode /Length %d >>" % (*size, len(jpeg)), jpeg)
+        ops = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (pw, ph)
+        self._obj(content, b"<< /Length %d >>" % len(ops), ops)
+        self._obj(page, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f]"
+                        b" /Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+                        % (pw, ph, img, content))
+        self.kids.append(page)
+        self.fp.flush()
+
+    def close(self) -> None:
+        kids = b" ".join(b"%d 0 R" % k for k in self.kids)
+        self._obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.kids)))
+        xref = self.fp.tell()
+        self.fp.write(b"xref\n0 %d\n0000000000 65535 f \n" % self.next)
+        for num in range(1, self.next):
+            self.fp.write(b"%010d 00000 n \n" % self.offsets[num])
+        self.fp.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (self.next, xref))
+        self.fp.flush()
+
+
+# ================
+# Rendering (worker process)
+# ================
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+def _fit_text(draw: ImageDraw.ImageDraw, text: str, font, width: int) -> str:
+    ellipsis = "…"
+    if not isinstance(font, ImageFont.FreeTypeFont):
+        # الخط النقطي الاحتياطي لا يعرف إلا latin-1
+        text, ellipsis = text.encode("latin-1", "replace").decode("latin-1"), "..."
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + ellipsis, font=font) > width:
+        text = text[:-1]
+    return text + ellipsis
+
+
+def render_pdf(title: str, entries: list[tuple[Optional[str], str]], out: str,
+               cols: int, rows: int, dpi: int) -> int:
+    """
+    Write the contact sheet PDF to ``out`` page by page; returns the page count.
+
+    Runs in the export process, so it only takes plain data.
+    """
+    pw, ph = round(PAGE_PT[0] / 72 * dpi), round(PAGE_PT[1] / 72 * dpi)
+    margin, header, caption, pad = dpi * 2 // 5, dpi // 2, dpi // 5, dpi // 15
+    cell_w = (pw - 2 * margin) // cols
+    cell_h = (ph - 2 * margin - header) // rows
+    box = (cell_w - 2 * pad, cell_h - caption - 2 * pad)
+    title_font, text_font = _font(dpi // 6), _font(dpi // 12)
+    per_page = cols * rows
+    pages = max(1, -(-len(entries) // per_page))
+
+    with open(out, "wb") as fp:
+        pdf = _PdfWriter(fp)
+        for n in range(pages):
+            page = Image.new("RGB", (pw, ph), "white")
+            draw = ImageDraw.Draw(page)
+            draw.text((margin, margin), _fit_text(draw, title, title_font, pw - 2 * margin - dpi),
+                      font=title_font, fill="black")
+            draw.text((pw - margin, margin), f"{n + 1} / {pages}", font=text_font, fill="#555",
+                      anchor="ra")
+            for i, (src, name) in enumerate(entries[n * per_page:(n + 1) * per_page]):
+                x = margin + (i % cols) * cell_w + pad
+                y = margin + header + (i // cols) * cell_h + pad
+                im = None
+                if src:
+                    try:
+                        with open_image(Path(src)) as im0:
+                            im0.draft("RGB", box)
+                            im = im0.convert("RGB")
+                            im.thumbnail(box, Image.LANCZOS)
+                    except Exception as e:
+                        logger.warning("contact sheet: %s: %s", src, e)
+                        im = None
+                if im is not None:
+                    page.paste(im, (x + (box[0] - im.width) // 2, y + (box[1] - im.height) // 2))
+                else:
+                    draw.rectangle((x, y, x + box[0], y + box[1]), fill="#e2e8f0")
+                label = _fit_text(draw, f"{n * per_page + i + 1}. {name}", text_font, box[0])
+                draw.text((x, y + box[1] + pad), label, font=text_font, fill="#333")
+            buf = io.BytesIO()
+            page.save(buf, format="JPEG", quality=85, dpi=(dpi, dpi))
+            pdf.page(buf.getvalue(), page.size)
+        pdf.close()
+    return pages
+
+
+# ================
+# Build registry (web worker)
+# ================
+
+_pool: Optional[ProcessPoolExecutor] = None
+_builds: dict[Path, tuple[Future, Path]] = {}
+_lock = threading.Lock()
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _finish(final: Path, part: Path, fut: Future) -> None:
+    with _lock:
+        _builds.pop(final, None)
+    if fut.cancelled() or fut.exception() is not None:
+        logger.warning("contact sheet failed: %s: %s", final, None if fut.cancelled() else fut.exception())
+        part.unlink(missing_ok=True)
+        return
+    os.replace(part, final)
+    for old in final.parent.glob("contact-*.pdf"):
+        if old != final:
+            old.unlink(missing_ok=True)
+
+
+def build(album: models.Album, version: str,
+          entries: list[tuple[Optional[str], str]]) -> tuple[Future, Path]:
+    """
+    Start (or join) the export of one album version.
+
+    Returns:
+        The build's future and the partial file it is writing, which callers
+        may stream while the future runs. When the future is done the file
+        has been moved to ``export_path``.
+    """
+    final = export_path(album.id, version)
+    with _lock:
+        if final in _builds:
+            return _builds[final]
+        final.parent.mkdir(parents=True, exist_ok=True)
+        part = final.with_name(f".{final.stem}.{uuid.uuid4().hex[:8]}.part")
+        part.touch()
+        fut = _executor().submit(render_pdf, album.title, entries, str(part),
+                                 settings.CONTACT_SHEET_COLUMNS, settings.CONTACT_SHEET_ROWS,
+                                 settings.CONTACT_SHEET_DPI)
+        _builds[final] = (fut, part)
+    fut.add_done_callback(lambda f: _finish(final, part, f))
+    return fut, part
+
+
+async def stream(fut: Future, part: Path, final: Path,
+                 chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+    """
+    Yield a build's PDF while it is being written, until the build is done.
+
+    Raises:
+        RuntimeError: If the build fails midway (the response is cut short).
+    """
+    try:
+        fp = open(part, "rb")
+    except FileNotFoundError:
+        fp = open(final, "rb")  # انتهى البناء ونُقل الملف قبل أن نفتحه
+    with fp:
+        while True:
+            # done قبل القراءة: إن كان منتهيًا فالقراءة الفارغة تعني نهاية الملف
+            done = fut.done()
+            data = fp.read(chunk_size)
+            if data:
+                yield data
+                continue
+            if done:
+                if fut.cancelled() or fut.exception() is not None:
+                    raise RuntimeError(f"contact sheet export failed: {final.name}")
+                return
+            await asyncio.sleep(0.2)
+
+
+def shutdown() -> None:
+    """Stop the export process (pending builds are cancelled)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
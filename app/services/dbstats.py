@@ -0,0 +1,93 @@
+# app/services/dbstats.py
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import DB_QUERIES, DB_QUERY_TIME
+
+
+class RequestStats:
+    """Per-request DB counters (sessions opened, statements, time in the driver)."""
+
+    __slots__ = ("sessions", "queries", "seconds")
+
+    def __init__(self) -> None:
+        self.sessions = 0
+        self.queries = 0
+        self.seconds = 0.0
+
+    def header(self) -> str:
+        return f"sessions={self.sessions}; queries={self.queries}; time={self.seconds * 1000:.1f}ms"
+
+
+# الكائن نفسه مشترك بين نسخ السياق (threadpool/المهام الفرعية)، لذا تكفي الزيادة عليه
+_current: ContextVar[Optional[RequestStats]] = ContextVar("db_request_stats", default=None)
+
+
+def current() -> Optional[RequestStats]:
+    """Return the stats of the request being served, or None outside a request."""
+    return _current.get()
+
+
+def count_session() -> None:
+    st = _current.get()
+    if st is not None:
+        st.sessions += 1
+
+
+# أحداث على مستوى الصنف Engine: تشمل المحرك المتزامن و async_engine.sync_engine
+# (وتغذي أيضًا عدّادات Prometheus: db_queries_total / db_query_duration_seconds)
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("dbstats_t0", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("dbstats_t0")
+    elapsed = time.perf_counter() - stack.pop() if stack else 0.0
+    DB_QUERIES.inc()
+    DB_QUERY_TIME.observe(elapsed)
+    st = _current.get()
+    if st is not None:
+        st.seconds += elapsed
+        st.queries += 1
+
+
+class DBStatsMiddleware:
+    """
+    Pure ASGI middleware that collects ``RequestStats`` for each HTTP request
+    and reports them in an ``X-DB-Stats`` response header.
+
+    Statements executed after the response headers are sent (e.g. inside a
+    streaming body) are not included.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+
+        async def send_with_stats(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-stats", stats.header().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
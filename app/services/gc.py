@@ -0,0 +1,416 @@
+# app/services/gc.py
+from __future__ import annotations
+
+import logging
+import shutil
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.orm import Session, object_session
+
+from .. import models
+from ..config import settings
+from . import gdrive, thumbs
+from .metrics import GC_OBJECTS
+from .variants import SIZES, parse_manifest_key, variant_rel
+
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Tombstones
+# ======================================================
+# حذف أصل/ألبوم لا يلمس الملفات: يكتب tombstone لكل ملف/مجلد محلي ولكل كائن
+# Drive في نفس معاملة الحذف (خطافات before_delete أدناه)، ثم يمسحها الجامع
+# الخلفي على دفعات مع إعادة المحاولة بتأخير متضاعف. لا يضيع شيء إن فشل
+# الحذف أو توقف العامل؛ وما سبق هذا النظام يجده reconcile().
+
+PATH = "path"    # ملف أو مجلد، نسبي إلى STORAGE_DIR (أو مطلق إن كان خارجه)
+DRIVE = "drive"  # معرّف ملف/مجلد في Google Drive
+DRIVE_DIR = "drivedir"  # مسار مجلد تحت GDRIVE_ROOT_FOLDER_ID (يُحلّ عند الحذف)
+
+_FOLDER = "application/vnd.google-apps.folder"
+
+_MAX_DELAY = timedelta(hours=6)
+
+
+def _storage() -> Path:
+    return Path(settings.STORAGE_DIR)
+
+
+def _target(path: Path) -> str:
+    try:
+        return Path(path).relative_to(_storage()).as_posix()
+    except ValueError:
+        return Path(path).as_posix()
+
+
+def _resolve(target: str) -> Path:
+    p = Path(target)
+    return p if p.is_absolute() else _storage() / p
+
+
+def variant_paths(asset: models.Asset) -> list[Path]:
+    """
+    مسارات كل مشتقات الأصل: من الـ manifest إن وُجد، وإلا كل المسارات
+    الممكنة حسب الاصطلاح (للأصول القديمة).
+    """
+    stem = Path(str(asset.filename).replace("\\", "/")).stem
+    items = asset.manifest.get("items")
+    if items is not None:
+        keys = [parse_manifest_key(k) for k in items]
+    else:
+        widths = set(SIZES.values()) | set(settings.LAZY_VARIANT_WIDTHS)
+        keys = [(w, fmt) for w in widths for fmt in ("jpg", "webp", "avif")]
+    return [_storage() / variant_rel(asset.album_id, stem, w, fmt) for w, fmt in keys]
+
+
+def asset_paths(asset: models.Asset) -> list[Path]:
+    """Every local file that belongs to ``asset``: original, variants, admin thumb."""
+    original = _storage() / Path(str(asset.filename).replace("\\", "/"))
+    return [original, *variant_paths(asset), thumbs.thumb_path(original)]
+
+
+def drive_ids(asset: models.Asset) -> list[str]:
+    """Drive ids of the asset: original, thumb and the derivatives in its manifest."""
+    ids = [asset.gdrive_file_id, asset.gdrive_thumb_id, *(asset.manifest.get("drive") or {}).values()]
+    return [i for i in dict.fromkeys(ids) if i]
+
+
+def asset_targets(asset: models.Asset) -> list[tuple[str, str]]:
+    targets = [(PATH, _target(p)) for p in asset_paths(asset)]
+    targets += [(DRIVE, i) for i in drive_ids(asset)]
+    return targets
+
+
+def album_drive_dir(album_id: int) -> str:
+    """Path of the album's Drive folder under ``GDRIVE_ROOT_FOLDER_ID`` (upload layout)."""
+    return f"albums/{album_id}"
+
+
+# مجلدات داخل مجلد الألبوم يديرها بانيها (يحذف ما لم يعد مستخدمًا بنفسه)
+MANAGED_DIRS = ("sprites", "exports")
+
+
+def album_dirs(album_id: int) -> list[Path]:
+    """Local directories that only hold files of one album."""
+    return [_storage() / "albums" / str(album_id), Path(settings.THUMBS_DIR) / "albums" / str(album_id)]
+
+
+def bury(conn, targets: Iterable[tuple[str, str]], now: Optional[datetime] = None) -> int:
+    """
+    Queue ``(kind, target)`` objects for deletion on ``conn`` (a Connection
+    or Session), i.e. inside the caller's transaction.
+    """
+    now = now or datetime.utcnow()
+    rows = [{"kind": k, "target": t, "attempts": 0, "next_attempt_at": now}
+            for k, t in dict.fromkeys(targets)]
+    if rows:
+        conn.execute(insert(models.Tombstone), rows)
+    return len(rows)
+
+
+def _mark_wake(target) -> None:
+    sess = object_session(target)
+    if sess is not None:
+        sess.info["gc_wake"] = True
+
+
+@event.listens_for(models.Asset, "before_delete")
+def _bury_asset(mapper, connection, asset: models.Asset) -> None:
+    bury(connection, asset_targets(asset))
+    _mark_wake(asset)
+
+
+@event.listens_for(models.Album, "before_delete")
+def _bury_album(mapper, connection, album: models.Album) -> None:
+    # الأصول تُحذف بـ ON DELETE CASCADE (passive_deletes) فلا تمر بخطافها:
+    # مجلدات الألبوم تغطي كل ملفاته المحلية، ومجلد Drive للألبوم يغطي نسخه
+    # (الأصول والمشتقات)؛ لا استدعاء شبكة هنا، فالمجلد يُحلّ باسمه عند الحذف
+    bury(connection, [(PATH, _target(d)) for d in album_dirs(album.id)]
+         + [(DRIVE_DIR, album_drive_dir(album.id))])
+    _mark_wake(album)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session: Session) -> None:
+    if session.info.pop("gc_wake", False):
+        wake()
+
+
+# ======================================================
+# Collector
+# ======================================================
+
+def _drive_folder(path: str) -> Optional[str]:
+    # مجلد Drive بمساره تحت الجذر، أو None إن لم يوجد (لم يُرفع شيء أو حُذف)
+    if not settings.GDRIVE_ROOT_FOLDER_ID:
+        return None
+    folder = settings.GDRIVE_ROOT_FOLDER_ID
+    for name in path.strip("/").split("/"):
+        folder = next((c["id"] for c in gdrive.list_children(folder)
+                       if c["name"] == name and c.get("mimeType") == _FOLDER), None)
+        if folder is None:
+            return None
+    return folder
+
+
+def _remove(kind: str, target: str) -> None:
+    if kind == PATH:
+        p = _resolve(target)
+        if p.is_dir():
+            shutil.rmtree(p)
+        else:
+            p.unlink(missing_ok=True)
+    elif kind == DRIVE:
+        gdrive.delete_file(target)
+    elif kind == DRIVE_DIR:
+        folder = _drive_folder(target)
+        if folder:
+            gdrive.delete_file(folder)
+    else:
+        raise ValueError(f"unknown tombstone kind: {kind}")
+
+
+def _album_of(kind: str, target: str) -> Optional[int]:
+    # معرّف الألبوم إن كان الهدف مجلد ألبوم كاملًا (محليًا أو في Drive)
+    if kind == DRIVE_DIR:
+        name = target.strip("/").split("/")[-1]
+        return int(name) if name.isdigit() else None
+    if kind == PATH:
+        p = _resolve(target)
+        if p.name.isdigit() and p in album_dirs(int(p.name)):
+            return int(p.name)
+    return None
+
+
+def _reused_album_dir(db: Session, kind: str, target: str) -> bool:
+    # معرّف ألبوم محذوف قد يُعاد استخدامه (SQLite بلا AUTOINCREMENT) قبل أن
+    # يصل الجامع إلى مجلده، وإعادة المحاولة تتأخر ساعات: لا تحذف مجلدًا (محليًا
+    # أو في Drive) صار لألبوم حي. ما بقي فيه من الألبوم القديم يجده reconcile()
+    album_id = _album_of(kind, target)
+    return album_id is not None and db.get(models.Album, album_id) is not None
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Back-off before retry number ``attempts`` (1-based), capped at 6 hours."""
+    return min(timedelta(seconds=settings.GC_RETRY_BASE_SECONDS * 2 ** (attempts - 1)), _MAX_DELAY)
+
+
+def collect(db: Session, batch: Optional[int] = None, now: Optional[datetime] = None) -> dict:
+    """
+    Delete one batch of due tombstoned objects.
+
+    A removed object drops its tombstone; a failure bumps ``attempts`` and
+    reschedules it with exponential back-off. Drive tombstones wait while
+    ``USE_GDRIVE`` is off. Safe to run from several workers at once: removal
+    is idempotent and rows are deleted/updated by id.
+
+    Returns:
+        ``{"deleted": n, "failed": n, "batch": n}``.
+    """
+    now = now or datetime.utcnow()
+    T = models.Tombstone
+    kinds = [PATH, DRIVE, DRIVE_DIR] if settings.USE_GDRIVE else [PATH]
+    rows = db.execute(
+        select(T.id, T.kind, T.target, T.attempts)
+        .where(T.next_attempt_at <= now, T.attempts < settings.GC_MAX_ATTEMPTS, T.kind.in_(kinds))
+        .order_by(T.next_attempt_at, T.id)
+        .limit(batch or settings.GC_BATCH_SIZE)
+    ).all()
+
+    done: list[int] = []
+    failed = 0
+    for row in rows:
+        if _reused_album_dir(db, row.kind, row.target):
+            done.append(row.id)
+            continue
+        try:
+            _remove(row.kind, row.target)
+        except Exception as e:
+            failed += 1
+            attempts = row.attempts + 1
+            GC_OBJECTS.labels(kind=row.kind, result="error").inc()
+            log = logger.error if attempts >= settings.GC_MAX_ATTEMPTS else logger.warning
+            log("gc: %s %s failed (attempt %d): %s", row.kind, row.target, attempts, e)
+            db.execute(update(T).where(T.id == row.id).values(
+                attempts=attempts, last_error=repr(e)[:1000],
+                next_attempt_at=now + retry_delay(attempts),
+            ))
+        else:
+            GC_OBJECTS.labels(kind=row.kind, result="deleted").inc()
+            done.append(row.id)
+    if done:
+        db.execute(delete(T).where(T.id.in_(done)))
+    db.commit()
+    return {"deleted": len(done), "failed": failed, "batch": len(rows)}
+
+
+def drain(db: Session, now: Optional[datetime] = None) -> dict:
+    """Run ``collect`` until no due tombstones are left; returns the totals."""
+    total = {"deleted": 0, "failed": 0}
+    batch = settings.GC_BATCH_SIZE
+    while True:
+        res = collect(db, batch, now)
+        total["deleted"] += res["deleted"]
+        total["failed"] += res["failed"]
+        if res["batch"] < batch or res["deleted"] == 0:
+            return total
+
+
+_wake = threading.Event()
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def wake() -> None:
+    """Ask the collector thread (if running in this process) to run now."""
+    _wake.set()
+
+
+def _loop() -> None:
+    from ..database import SessionLocal
+
+    while not _stop.is_set():
+        db = SessionLocal()
+        try:
+            drain(db)
+        except Exception as e:
+            logger.warning("gc: collector run failed: %s", e)
+        finally:
+            db.close()
+        _wake.wait(settings.GC_INTERVAL_SECONDS)
+        _wake.clear()
+
+
+def start() -> None:
+    """Start the per-worker collector thread (no-op if GC_INTERVAL_SECONDS <= 0)."""
+    global _thread
+    if settings.GC_INTERVAL_SECONDS <= 0 or (_thread and _thread.is_alive()):
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="storage-gc", daemon=True)
+    _thread.start()
+
+
+def stop(timeout: float = 5.0) -> None:
+    global _thread
+    _stop.set()
+    _wake.set()
+    if _thread:
+        _thread.join(timeout)
+        _thread = None
+
+
+# ======================================================
+# Reconciliation
+# ======================================================
+# ما تُرك قبل وجود الـ tombstones (أو حُذف بـ SQL مباشرة): ملفات تحت
+# STORAGE_DIR/albums و THUMBS_DIR/albums لا يعرفها أي أصل، ومجلدات ألبومات
+# محذوفة، وملفات Drive تحت GDRIVE_ROOT_FOLDER_ID/albums بلا أصل مطابق.
+# ملفات أحدث من min_age تُترك (رفع جارٍ يكتب الأصل قبل commit).
+
+def _pending(db: Session) -> set[tuple[str, str]]:
+    T = models.Tombstone
+    return {(k, t) for k, t in db.execute(select(T.kind, T.target))}
+
+
+def scan_local(db: Session, min_age: timedelta = timedelta(hours=1)) -> list[Path]:
+    """Local orphans: whole directories of deleted albums, else single files."""
+    A = models.Asset
+    album_ids = set(db.scalars(select(models.Album.id)))
+    known: set[Path] = set()
+    for asset in db.scalars(select(A)).yield_per(500):
+        known.update(asset_paths(asset))
+    cutoff = (datetime.now() - min_age).timestamp()
+
+    orphans: list[Path] = []
+    for root in (_storage() / "albums", Path(settings.THUMBS_DIR) / "albums"):
+        if not root.is_dir():
+            continue
+        for album_dir in sorted(root.iterdir()):
+            if not (album_dir.name.isdigit() and int(album_dir.name) in album_ids):
+                if album_dir.stat().st_mtime <= cutoff:
+                    orphans.append(album_dir)
+                continue
+            for p in sorted(album_dir.rglob("*")):
+                if p.relative_to(album_dir).parts[0] in MANAGED_DIRS:
+                    continue
+                if p.is_file() and p not in known and p.stat().st_mtime <= cutoff:
+                    orphans.append(p)
+    return orphans
+
+
+def _walk_drive(folder_id: str, prefix: str = "") -> Iterator[tuple[str, dict]]:
+    for item in gdrive.list_children(folder_id):
+        path = f"{prefix}{item['name']}"
+        if item.get("mimeType") == "application/vnd.google-apps.folder":
+            yield from _walk_drive(item["id"], path + "/")
+        else:
+            yield path, item
+
+
+def _drive_time(item: dict) -> float:
+    try:
+        return datetime.fromisoformat(item["modifiedTime"].replace("Z", "+00:00")).timestamp()
+    except (KeyError, ValueError):
+        return 0.0
+
+
+def scan_drive(db: Session, min_age: timedelta = timedelta(hours=1)) -> list[tuple[str, str]]:
+    """
+    Drive orphans as ``(file_id, path)``. Drive keeps the album layout of the
+    upload (``albums/<id>/<kind>/<size>/<name>``); older uploads only stored
+    the original and thumb ids, so files are matched by album and file stem.
+    """
+    if not (settings.USE_GDRIVE and settings.GDRIVE_ROOT_FOLDER_ID):
+        return []
+    A = models.Asset
+    stems: dict[int, set[str]] = {}
+    known_ids: set[str] = set()
+    for album_id, filename, fid, tid in db.execute(
+        select(A.album_id, A.filename, A.gdrive_file_id, A.gdrive_thumb_id)
+    ):
+        stems.setdefault(album_id, set()).add(Path(str(filename).replace("\\", "/")).stem)
+        known_ids.update(i for i in (fid, tid) if i)
+    album_ids = set(db.scalars(select(models.Album.id)))
+    cutoff = (datetime.now() - min_age).timestamp()
+
+    albums_root = next((c for c in gdrive.list_children(settings.GDRIVE_ROOT_FOLDER_ID)
+                        if c["name"] == "albums"), None)
+    if albums_root is None:
+        return []
+    orphans: list[tuple[str, str]] = []
+    for folder in gdrive.list_children(albums_root["id"]):
+        name = folder["name"]
+        if not (name.isdigit() and int(name) in album_ids):
+            if _drive_time(folder) <= cutoff:
+                orphans.append((folder["id"], f"albums/{name}/"))
+            continue
+        for path, item in _walk_drive(folder["id"], f"albums/{name}/"):
+            if item["id"] in known_ids or Path(item["name"]).stem in stems.get(int(name), ()):
+                continue
+            if _drive_time(item) <= cutoff:
+                orphans.append((item["id"], path))
+    return orphans
+
+
+def reconcile(db: Session, drive: bool = False, apply: bool = False,
+              min_age: timedelta = timedelta(hours=1)) -> dict:
+    """
+    Find orphaned storage objects; with ``apply`` tombstone them so the
+    collector deletes them (with the usual retries).
+
+    Returns:
+        ``{"local": [paths], "drive": [(id, path)], "queued": n}``.
+    """
+    pending = _pending(db)
+    local = [p for p in scan_local(db, min_age) if (PATH, _target(p)) not in pending]
+    remote = [o for o in (scan_drive(db, min_age) if drive else []) if (DRIVE, o[0]) not in pending]
+    queued = 0
+    if apply:
+        queued = bury(db, [(PATH, _target(p)) for p in local] + [(DRIVE, i) for i, _ in remote])
+        db.commit()
+    return {"local": local, "drive": remote, "queued": queued}
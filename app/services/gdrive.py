@@ -6,6 +6,7 @@ import time
 from typing import Any, Dict, Iterator, Optional
 
 from app.config import settings
+from app.services.metrics import GDRIVE_BYTES, GDRIVE_CALLS, GDRIVE_RETRIES
 
 # ======================================================
 # Google Drive client bootstrap (lazy init)
@@ -47,6 +48,18 @@ def _init_gdrive() -> None:
     _sess = AuthorizedSession(_creds)
 
 
+def preload() -> None:
+    """
+    Import the Google client libraries without touching credentials or the
+    network. Called from the gunicorn master so forked workers inherit the
+    loaded modules instead of paying the import on their first Drive call.
+    """
+    import google.auth.transport.requests  # noqa: F401
+    import google.oauth2.service_account  # noqa: F401
+    import googleapiclient.discovery  # noqa: F401
+    import googleapiclient.http  # noqa: F401
+
+
 def _service():
     """احصل على كائن الخدمة بعد التأكد من تهيئته."""
     _init_gdrive()
@@ -68,6 +81,7 @@ def ensure_subfolder(service, parent_id: str, name: str) -> str:
         f"'{parent_id}' in parents and name='{name}' and "
         "mimeType='application/vnd.google-apps.folder' and trashed=false"
     )
+    GDRIVE_CALLS.labels(op="list").inc()
     result = service.files().list(
         q=query,
         fields="files(id,name)",
@@ -84,6 +98,7 @@ def ensure_subfolder(service, parent_id: str, name: str) -> str:
         "mimeType": "application/vnd.google-apps.folder",
         "parents": [parent_id],
     }
+    GDRIVE_CALLS.labels(op="create_folder").inc()
     folder = service.files().create(
         body=meta,
         fields="id",
@@ -114,6 +129,8 @@ def upload_bytes(
         mimetype=mime or "application/octet-stream",
         resumable=False,
     )
+    GDRIVE_CALLS.labels(op="upload").inc()
+    GDRIVE_BYTES.labels(direction="up").inc(len(data))
     file = service.files().create(
         body=meta,
         media_body=media,
@@ -128,6 +145,7 @@ def get_meta(file_id: str) -> Dict[str, Any]:
     جلب ميتاداتا باستخدام الخدمة العالمية.
     """
     service = _service()
+    GDRIVE_CALLS.labels(op="get_meta").inc()
     return service.files().get(
         fileId=file_id,
         fields="id,name,mimeType,size,md5Checksum,modifiedTime",
@@ -141,6 +159,7 @@ def get_metadata(service, file_id: str, fields: str = "id,name,mimeType,size") -
     """
     if service is None:
         service = _service()
+    GDRIVE_CALLS.labels(op="get_meta").inc()
     return service.files().get(
         fileId=file_id,
         fields=fields,
@@ -148,6 +167,43 @@ def get_metadata(service, file_id: str, fields: str = "id,name,mimeType,size") -
     ).execute()
 
 
+def list_children(folder_id: str) -> Iterator[Dict[str, Any]]:
+    """
+    كل العناصر المباشرة (ملفات ومجلدات) داخل مجلد، صفحة بعد صفحة.
+    """
+    service = _service()
+    token = None
+    while True:
+        GDRIVE_CALLS.labels(op="list").inc()
+        result = service.files().list(
+            q=f"'{folder_id}' in parents and trashed=false",
+            fields="nextPageToken,files(id,name,mimeType,modifiedTime)",
+            pageSize=1000,
+            pageToken=token,
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True,
+            corpora="allDrives",
+        ).execute()
+        yield from result.get("files", [])
+        token = result.get("nextPageToken")
+        if not token:
+            return
+
+
+def delete_file(file_id: str) -> None:
+    """
+    حذف نهائي لملف (أو مجلد بكل محتواه). ملف غير موجود (404) يُعد محذوفًا.
+    """
+    service = _service()
+    GDRIVE_CALLS.labels(op="delete").inc()
+    try:
+        service.files().delete(fileId=file_id, supportsAllDrives=True).execute()
+    except Exception as e:
+        if getattr(getattr(e, "resp", None), "status", None) == 404:
+            return
+        raise
+
+
 # ======================================================
 # Download / Streaming (MediaIoBaseDownload)
 # ======================================================
@@ -168,14 +224,17 @@ def download_to_generator(file_id: str, chunk_size: int = 1 * 1024 * 1024) -> It
     backoff = 1.0
     while not done:
         try:
+            GDRIVE_CALLS.labels(op="download").inc()
             _, done = downloader.next_chunk(num_retries=3)
             if buffer.tell():
+                GDRIVE_BYTES.labels(direction="down").inc(buffer.tell())
                 buffer.seek(0)
                 yield buffer.read()
                 buffer.seek(0)
                 buffer.truncate(0)
             backoff = 1.0
         except Exception:
+            GDRIVE_RETRIES.labels(op="download").inc()
             time.sleep(backoff)
             backoff = min(backoff * 2, 10.0)
 
@@ -199,14 +258,17 @@ def download_to_generator_with_service(
 
     while not done:
         try:
+            GDRIVE_CALLS.labels(op="download").inc()
             _, done = downloader.next_chunk(num_retries=3)
             if buffer.tell():
+                GDRIVE_BYTES.labels(direction="down").inc(buffer.tell())
                 buffer.seek(0)
                 yield buffer.read()
                 buffer.seek(0)
                 buffer.truncate(0)
             backoff = 1.0
         except Exception:
+            GDRIVE_RETRIES.labels(op="download").inc()
             time.sleep(backoff)
             backoff = min(backoff * 2, 10.0)
 
@@ -237,18 +299,21 @@ def stream_via_requests(file_id: str, chunk_size: int = 256 * 1024) -> Iterator[
     backoff = 1.0
     while True:
         headers = {"Range": f"bytes={start}-{start + chunk_size - 1}"}
+        GDRIVE_CALLS.labels(op="stream").inc()
         r = _sess.get(url, params=params, headers=headers, timeout=30)
 
         if r.status_code in (200, 206):
             data = r.content
             if not data:
                 break
+            GDRIVE_BYTES.labels(direction="down").inc(len(data))
             yield data
             start += len(data)
             backoff = 1.0
             if r.status_code == 200:
                 break
         elif r.status_code in (429, 500, 502, 503, 504):
+            GDRIVE_RETRIES.labels(op="stream").inc()
             time.sleep(backoff)
             backoff = min(backoff * 2, 10.0)
             continue
@@ -266,6 +331,7 @@ def make_public(file_id: str) -> None:
     """
     service = _service()
     try:
+        GDRIVE_CALLS.labels(op="make_public").inc()
         service.permissions().create(
             fileId=file_id,
             body={"role": "reader", "type": "anyone"},
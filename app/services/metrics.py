@@ -0,0 +1,135 @@
+# app/services/metrics.py
+from __future__ import annotations
+
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client import multiprocess
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# ======================================================
+# Metric definitions
+# ======================================================
+# تحت gunicorn يُضبط PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py) قبل استيراد
+# prometheus_client، فيكتب كل عامل قيمه في ملفات mmap ويجمعها /metrics كلها.
+
+_LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status",
+    ["method", "route", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to the end of the response body",
+    ["method", "route"], buckets=_LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_progress", "Requests currently being served",
+    ["method", "route"], multiprocess_mode="livesum",
+)
+
+VARIANT_ENCODE = Histogram(
+    "variant_encode_seconds", "Time to encode and write one image variant",
+    ["fmt"], buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60),
+)
+
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Cache lookups (variant files on disk, HTTP revalidation)",
+    ["cache", "result"],
+)
+
+GDRIVE_CALLS = Counter("gdrive_calls_total", "Google Drive API calls", ["op"])
+GDRIVE_RETRIES = Counter("gdrive_retries_total", "Google Drive calls retried after an error", ["op"])
+GDRIVE_BYTES = Counter("gdrive_bytes_total", "Bytes sent to / received from Drive", ["direction"])
+
+GC_OBJECTS = Counter("gc_objects_total", "Tombstoned storage objects processed by the collector",
+                     ["kind", "result"])
+
+ANALYTICS_EVENTS = Counter("analytics_events_total",
+                           "Share analytics events by outcome (flushed, dropped, failed)", ["result"])
+
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed")
+DB_QUERY_TIME = Histogram(
+    "db_query_duration_seconds", "Driver time per SQL statement",
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1),
+)
+
+
+def cache_hit(cache: str) -> None:
+    CACHE_LOOKUPS.labels(cache=cache, result="hit").inc()
+
+
+def cache_miss(cache: str) -> None:
+    CACHE_LOOKUPS.labels(cache=cache, result="miss").inc()
+
+
+# ======================================================
+# Exposition
+# ======================================================
+
+def render_latest(multiproc_dir: str | None) -> tuple[bytes, str]:
+    """
+    Return ``(body, content_type)`` for ``/metrics``.
+
+    With ``multiproc_dir`` the values of every worker (live and dead) are
+    merged from the shared directory; otherwise the in-process registry is
+    used (single uvicorn process, tests).
+    """
+    if multiproc_dir:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=multiproc_dir)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# ======================================================
+# ASGI middleware
+# ======================================================
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, status and in-flight count per
+    route template (``/s/{slug}/thumb/{asset_id}``, never the raw path, so
+    label cardinality stays bounded). Unmatched paths share one label.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._routes = None
+
+    def _route_label(self, scope: Scope) -> str:
+        if self._routes is None:
+            self._routes = scope["app"].router.routes
+        for route in self._routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "<unnamed>")
+        return "<unmatched>"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_label(scope)
+        status = 500
+        in_flight = HTTP_IN_FLIGHT.labels(method=method, route=route)
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_LATENCY.labels(method=method, route=route).observe(time.perf_counter() - t0)
+            HTTP_REQUESTS.labels(method=method, route=route, status=str(status)).inc()
+            in_flight.dec()
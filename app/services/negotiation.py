@@ -0,0 +1,68 @@
+# app/services/negotiation.py
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+# الصيغ مرتبة من الأصغر حجمًا إلى الأكبر
+PREFERENCE = ("avif", "webp", "jpg")
+
+MEDIA_TYPES = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+    "jpg": "image/jpeg",
+}
+
+
+def parse_accept(header: Optional[str]) -> dict[str, float]:
+    """
+    Parse an ``Accept`` header into a ``{media_type: q}`` mapping.
+
+    Args:
+        header (Optional[str]): Raw header value.
+
+    Returns:
+        dict[str, float]: Media types (lower-cased) with their quality value.
+        Malformed ``q`` parameters default to 1.0.
+    """
+    out: dict[str, float] = {}
+    for part in (header or "").split(","):
+        fields = [f.strip() for f in part.split(";")]
+        mtype = fields[0].lower()
+        if not mtype:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 1.0
+        out[mtype] = max(q, out.get(mtype, 0.0))
+    return out
+
+
+def pick_format(accept: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """
+    Choose the smallest encoding the client explicitly accepts.
+
+    AVIF and WebP are only served when the client names them in ``Accept``
+    (wildcards like ``image/*`` are sent by browsers that cannot decode
+    them), so JPEG stays the universal fallback.
+
+    Args:
+        accept (Optional[str]): Raw ``Accept`` header.
+        available (Iterable[str]): Extensions present for the asset
+            (``avif`` / ``webp`` / ``jpg``).
+
+    Returns:
+        Optional[str]: Chosen extension, or None if nothing is available.
+    """
+    avail = set(available)
+    prefs = parse_accept(accept)
+    for fmt in PREFERENCE:
+        if fmt not in avail:
+            continue
+        if fmt == "jpg" or prefs.get(MEDIA_TYPES[fmt], 0.0) > 0:
+            return fmt
+    # لا JPEG ولا صيغة مقبولة صراحةً: أعد أي صيغة متوفرة
+    return next((f for f in PREFERENCE if f in avail), None)
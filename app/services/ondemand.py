@@ -0,0 +1,186 @@
+# app/services/ondemand.py
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .. import models
+from ..config import settings
+from .metrics import cache_hit, cache_miss
+from .variants import describe_variant, render_variant, variant_rel
+
+# مفتاح لكل مشتق قيد التوليد: [lock, عدد المنتظرين]
+_flights: dict[str, list] = {}
+_flights_guard = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def is_allowed(width: int, fmt: str) -> bool:
+    """Return True if the width/format pair is whitelisted for lazy rendering."""
+    return width in settings.LAZY_VARIANT_WIDTHS and fmt in settings.LAZY_VARIANT_FORMATS
+
+
+def _acquire(key: str) -> threading.Lock:
+    with _flights_guard:
+        entry = _flights.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    entry[0].acquire()
+    return entry[0]
+
+
+def _release(key: str) -> None:
+    with _flights_guard:
+        entry = _flights[key]
+        entry[0].release()
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _flights[key]
+
+
+def ensure_variant(
+    album_id: int,
+    filename: str,
+    width: int,
+    fmt: str,
+    manifest: Optional[dict] = None,
+    profile: Optional[str] = None,
+) -> Path:
+    """
+    Return the on-disk path of a variant, rendering it on first request.
+
+    Concurrent callers asking for the same variant share a single render
+    (single-flight): the first one renders while the others wait on the
+    same lock and then find the file already in place. Across gunicorn
+    workers the atomic write in ``render_variant`` keeps the result
+    consistent even if two processes race.
+
+    Args:
+        album_id (int): Album the asset belongs to.
+        filename (str): Stored relative path of the original (``Asset.filename``).
+        width (int): Target width (must pass ``is_allowed``).
+        fmt (str): Target format extension (``jpg`` / ``webp``).
+        manifest (Optional[dict]): If given, the variant's dimensions and
+            byte length are recorded into it (see ``variants.manifest_key``).
+        profile (Optional[str]): Encoding profile; pass the one recorded in
+            the asset's manifest (``"p"``) so every variant of an asset is
+            encoded alike. ``None`` uses ``settings.ENCODING_PROFILE``.
+
+    Returns:
+        Path: Absolute path of the rendered variant.
+
+    Raises:
+        FileNotFoundError: If the original is missing on disk.
+    """
+    base = Path(settings.STORAGE_DIR)
+    stem = Path(str(filename).replace("\\", "/")).stem
+    rel = variant_rel(album_id, stem, width, fmt)
+    out = base / rel
+    if out.exists():
+        cache_hit("variant")
+        if manifest is not None:
+            describe_variant(out, width, fmt, manifest)
+        return out
+
+    key = rel.as_posix()
+    _acquire(key)
+    try:
+        # ربما أنهى طلب آخر التوليد بينما كنا ننتظر
+        if out.exists():
+            cache_hit("variant")
+            if manifest is not None:
+                describe_variant(out, width, fmt, manifest)
+            return out
+        cache_miss("variant")
+        orig = base / Path(str(filename).replace("\\", "/"))
+        if not orig.exists():
+            raise FileNotFoundError(orig)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        render_variant(orig, out, width, fmt, manifest=manifest, profile=profile)
+        return out
+    finally:
+        _release(key)
+
+
+# ================
+# Manifest writes
+# ================
+# دمج مدخل في Asset.variants_manifest بمقارنة-ثم-تبديل: UPDATE ... WHERE
+# variants_manifest = <ما قرأناه>. إن سبقنا طلب آخر (عرض آخر لنفس الأصل) لا
+# يتأثر أي صف، فنعيد قراءة الـ manifest وندمج فيه من جديد. يعمل على كل قاعدة
+# (لا SELECT ... FOR UPDATE في SQLite) ولا يمسح مدخل الطلب المتزامن.
+
+MANIFEST_ATTEMPTS = 5
+
+
+def _swap(asset: models.Asset, entry: dict):
+    A = models.Asset
+    merged = asset.merged_manifest(entry)
+    values = {"variants_manifest": json.dumps(merged, separators=(",", ":"))}
+    if merged.get("w") and merged.get("h"):
+        values.update(width=merged["w"], height=merged["h"])
+    current = asset.variants_manifest
+    stmt = (
+        update(A)
+        .where(A.id == asset.id,
+               A.variants_manifest.is_(None) if current is None else A.variants_manifest == current)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return stmt, values
+
+
+def _applied(asset: models.Asset, values: dict) -> None:
+    for k, v in values.items():
+        set_committed_value(asset, k, v)
+
+
+def save_manifest(db: Session, asset: models.Asset, entry: dict) -> bool:
+    """
+    Merge ``entry`` into the asset's stored manifest and commit, without
+    losing entries written concurrently by other requests or workers.
+
+    Returns:
+        bool: False if the asset is gone or its row kept changing after
+        ``MANIFEST_ATTEMPTS`` tries; the variant is then re-described from
+        disk on its next request.
+    """
+    for _ in range(MANIFEST_ATTEMPTS):
+        stmt, values = _swap(asset, entry)
+        res = db.execute(stmt)
+        db.commit()
+        if res.rowcount:
+            _applied(asset, values)
+            return True
+        try:
+            db.refresh(asset, ["variants_manifest"])
+        except InvalidRequestError:  # حُذف الأصل
+            return False
+    logger.warning("manifest of asset %s not saved: concurrent updates", asset.id)
+    return False
+
+
+async def save_manifest_async(db: AsyncSession, asset: models.Asset, entry: dict) -> bool:
+    """Async version of ``save_manifest``."""
+    for _ in range(MANIFEST_ATTEMPTS):
+        stmt, values = _swap(asset, entry)
+        res = await db.execute(stmt)
+        await db.commit()
+        if res.rowcount:
+            _applied(asset, values)
+            return True
+        try:
+            await db.refresh(asset, ["variants_manifest"])
+        except InvalidRequestError:
+            return False
+    logger.warning("manifest of asset %s not saved: concurrent updates", asset.id)
+    return False
@@ -0,0 +1,143 @@
+# app/services/ordering.py
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+from sqlalchemy import case, func, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# ======================================================
+# Gap-based ordering keys
+# ======================================================
+# Asset.sort_order مفتاح ترتيب صحيح بفجوات (GAP) بين العناصر المتجاورة:
+# نقل عنصر = وضعه في منتصف الفجوة بين جاريه الجديدين → تحديث صف واحد.
+# حين تنفد الفجوة (جاران متتاليان) يُعاد ترقيم الألبوم كله بجملة UPDATE واحدة.
+# الترتيب الفعلي دائمًا (sort_order, id)؛ العمود NOT NULL (migration 0007) فيُقرأ
+# مباشرة من الفهرس (album_id, sort_order) — لا COALESCE يعطّله.
+
+GAP = 1024
+
+SORT_KEY = models.Asset.sort_order  # + Asset.id = ترتيب العرض
+
+
+def key_between(lo: Optional[int], hi: Optional[int]) -> Optional[int]:
+    """
+    Return a key strictly between ``lo`` and ``hi`` (``None`` = open end).
+
+    Returns ``None`` when there is no free integer in between, i.e. the
+    album needs ``rebalance`` first.
+    """
+    if lo is None and hi is None:
+        return 0
+    if lo is None:
+        return hi - GAP
+    if hi is None:
+        return lo + GAP
+    if hi - lo < 2:
+        return None
+    return (lo + hi) // 2
+
+
+def last_key(db: Session, album_id: int) -> Optional[int]:
+    """Largest key in the album (None if it is empty) — one ``MAX()`` query."""
+    return db.scalar(select(func.max(SORT_KEY)).where(models.Asset.album_id == album_id))
+
+
+def next_key(db: Session, album_id: int) -> int:
+    """Key that places a new asset after every existing one."""
+    return key_between(last_key(db, album_id), None)
+
+
+def _neighbours(db: Session, asset: models.Asset, after: bool, limit: int = 2) -> list[int]:
+    # أقرب جارين قبل/بعد الأصل حسب (key, id) — مقروءة بالفهرس (album_id, sort_order)
+    A = models.Asset
+    here = tuple_(SORT_KEY, A.id)
+    pos = tuple_(asset.sort_order, asset.id)
+    q = select(SORT_KEY).where(A.album_id == asset.album_id)
+    if after:
+        q = q.where(here > pos).order_by(SORT_KEY, A.id)
+    else:
+        q = q.where(here < pos).order_by(SORT_KEY.desc(), A.id.desc())
+    return list(db.scalars(q.limit(limit)))
+
+
+def _edge(db: Session, album_id: int, first: bool) -> Optional[int]:
+    agg = func.min(SORT_KEY) if first else func.max(SORT_KEY)
+    return db.scalar(select(agg).where(models.Asset.album_id == album_id))
+
+
+def _target_key(db: Session, asset: models.Asset, direction: str) -> tuple[bool, Optional[int]]:
+    """``(moves, key)``; ``key`` is None when the gap is exhausted."""
+    if direction in ("up", "down"):
+        near = _neighbours(db, asset, after=direction == "down")
+        if not near:
+            return False, None  # أول/آخر عنصر بالفعل
+        far = near[1] if len(near) > 1 else None
+        lo, hi = (far, near[0]) if direction == "up" else (near[0], far)
+        return True, key_between(lo, hi)
+    if direction == "top":
+        if not _neighbours(db, asset, after=False, limit=1):
+            return False, None
+        return True, key_between(None, _edge(db, asset.album_id, first=True))
+    if direction == "bottom":
+        if not _neighbours(db, asset, after=True, limit=1):
+            return False, None
+        return True, key_between(_edge(db, asset.album_id, first=False), None)
+    raise ValueError(f"invalid direction: {direction}")
+
+
+def move(db: Session, asset: models.Asset, direction: str) -> bool:
+    """
+    Move ``asset`` one step ``up``/``down`` or to the ``top``/``bottom``.
+
+    Normally a single row is updated; when there is no free key between the
+    new neighbours the album is rebalanced once and the move retried.
+    Returns False if the asset is already at that end. The caller commits.
+
+    Raises:
+        ValueError: On an unknown ``direction``.
+    """
+    moves, key = _target_key(db, asset, direction)
+    if not moves:
+        return False
+    if key is None:
+        rebalance(db, asset.album_id)
+        db.refresh(asset)
+        _, key = _target_key(db, asset, direction)
+    asset.sort_order = key
+    return True
+
+
+def album_order(db: Session, album_id: int) -> list[int]:
+    """Asset ids of the album in display order."""
+    A = models.Asset
+    return list(db.scalars(select(A.id).where(A.album_id == album_id).order_by(SORT_KEY, A.id)))
+
+
+def apply_order(db: Session, album_id: int, ids: Sequence[int]) -> None:
+    """
+    Give the album's assets the keys ``GAP, 2*GAP, ...`` in the order of
+    ``ids`` with one ``UPDATE ... SET sort_order = CASE id WHEN ...``.
+
+    ``ids`` must list every asset of the album exactly once.
+
+    Raises:
+        ValueError: If ``ids`` is not a permutation of the album's assets.
+    """
+    if len(set(ids)) != len(ids) or set(ids) != set(album_order(db, album_id)):
+        raise ValueError("ids must list every asset of the album exactly once")
+    if not ids:
+        return
+    A = models.Asset
+    keys = case({asset_id: (i + 1) * GAP for i, asset_id in enumerate(ids)}, value=A.id)
+    db.execute(
+        update(A).where(A.album_id == album_id).values(sort_order=keys)
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def rebalance(db: Session, album_id: int) -> None:
+    """Re-space the album's keys evenly, keeping the current order."""
+    apply_order(db, album_id, album_order(db, album_id))
@@ -0,0 +1,136 @@
+# app/services/orientation.py
+from __future__ import annotations
+
+import os
+import struct
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+# ======================================================
+# Lossless rotation via EXIF Orientation
+# ======================================================
+# تدوير أصل JPEG بتعديل وسم Orientation (0x0112) فقط: بيانات الصورة المضغوطة
+# لا تُفك ولا يُعاد ترميزها (لا فقد جودة، ميلي ثوانٍ بدل ثوانٍ لصورة 40MP).
+# كل خط المعالجة يقرأ الأصول عبر ImageOps.exif_transpose، والمتصفحات تحترم
+# الوسم عند عرض الأصل مباشرة.
+
+ORIENTATION = 0x0112
+
+# الاتجاه الجديد بعد تدوير ما يُعرض 90° مع/عكس عقارب الساعة
+_ROTATE = {
+    "cw":  {1: 6, 2: 7, 3: 8, 4: 5, 5: 2, 6: 3, 7: 4, 8: 1},
+    "ccw": {1: 8, 2: 5, 3: 6, 4: 7, 5: 4, 6: 1, 7: 2, 8: 3},
+}
+
+JPEG_SUFFIXES = (".jpg", ".jpeg", ".jpe", ".jfif")
+
+
+def compose(orientation: Optional[int], dir: str) -> int:
+    """
+    EXIF orientation that shows the image rotated 90° further.
+
+    Args:
+        orientation: Current tag value (1–8; anything else counts as 1).
+        dir: ``"cw"`` or ``"ccw"``.
+    """
+    if orientation not in _ROTATE["cw"]:
+        orientation = 1
+    return _ROTATE[dir][orientation]
+
+
+def read_orientation(path: Path) -> int:
+    """Orientation tag of an image (1 if absent); reads the header only."""
+    with Image.open(path) as im:
+        value = im.getexif().get(ORIENTATION, 1)
+    return value if value in _ROTATE["cw"] else 1
+
+
+def _segments(data: bytes):
+    # (offset, marker, payload) لكل مقطع قبل بداية المسح SOS
+    pos = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker in (0xD9, 0xDA):
+            return
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        yield pos, marker, data[pos + 4:pos + 2 + length]
+        pos += 2 + length
+
+
+def _patch_in_place(data: bytearray, seg_pos: int, payload: bytes, value: int) -> bool:
+    # وسم Orientation موجود في IFD0: عدّل قيمته (SHORT) مكانها
+    tiff = payload[6:]
+    if tiff[:2] not in (b"II", b"MM"):
+        return False
+    end = "<" if tiff[:2] == b"II" else ">"
+    (ifd0,) = struct.unpack(end + "I", tiff[4:8])
+    if ifd0 + 2 > len(tiff):
+        return False
+    (count,) = struct.unpack(end + "H", tiff[ifd0:ifd0 + 2])
+    for i in range(count):
+        e = ifd0 + 2 + 12 * i
+        if e + 12 > len(tiff):
+            return False
+        tag, typ = struct.unpack(end + "HH", tiff[e:e + 4])
+        if tag == ORIENTATION and typ == 3:
+            at = seg_pos + 4 + 6 + e + 8
+            data[at:at + 2] = struct.pack(end + "H", value)
+            return True
+    return False
+
+
+def set_jpeg_orientation(path: Path, value: int) -> None:
+    """
+    Write ``value`` into the Orientation tag of a JPEG without touching the
+    compressed image data.
+
+    The tag is patched in place when present; otherwise the APP1 (Exif)
+    segment is rebuilt — or inserted — with Pillow's Exif writer. The file
+    is replaced atomically.
+
+    Raises:
+        ValueError: If ``path`` is not a JPEG or the Exif block gets too big.
+    """
+    path = Path(path)
+    data = bytearray(path.read_bytes())
+    if data[:2] != b"\xff\xd8":
+        raise ValueError(f"not a JPEG: {path}")
+
+    app1 = None
+    insert_at = 2
+    for pos, marker, payload in _segments(bytes(data)):
+        if marker == 0xE1 and payload.startswith(b"Exif\x00\x00"):
+            app1 = (pos, payload)
+            break
+        if marker == 0xE0:  # JFIF يجب أن يبقى أول مقطع
+            insert_at = pos + 4 + len(payload)
+
+    if app1 is None or not _patch_in_place(data, app1[0], app1[1], value):
+        with Image.open(path) as im:
+            exif = im.getexif()
+        exif[ORIENTATION] = value
+        blob = exif.tobytes()
+        if not blob.startswith(b"Exif\x00\x00"):
+            blob = b"Exif\x00\x00" + blob
+        if len(blob) + 2 > 0xFFFF:
+            raise ValueError("Exif block too large")
+        segment = b"\xff\xe1" + struct.pack(">H", len(blob) + 2) + blob
+        if app1 is not None:
+            start = app1[0]
+            data[start:start + 4 + len(app1[1])] = segment
+        else:
+            data[insert_at:insert_at] = segment
+
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def rotate_jpeg(path: Path, dir: str) -> int:
+    """Rotate a JPEG 90° ``dir`` losslessly; returns the new orientation."""
+    value = compose(read_orientation(path), dir)
+    set_jpeg_orientation(path, value)
+    return value
@@ -0,0 +1,165 @@
+# app/services/previews.py
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+from ..config import settings
+from .orientation import ORIENTATION
+from .variants import PIPELINE_VERSION, SIZES, fit_size, manifest_key, open_image, variant_rel
+
+# ======================================================
+# Client-generated previews
+# ======================================================
+# المتصفح يصغّر الأصل (createImageBitmap/OffscreenCanvas) ويرسل معاينات 400/1600
+# مع الأصل في نفس الطلب. الخادم لا يفك ترميز الأصل: يقرأ أبعاده من الترويسة،
+# يتحقق من أبعاد كل معاينة وصيغتها وبصمتها ثم يخزّنها كمشتق كما هي. الـ manifest
+# يُسجَّل بملف "client" (ليس ملفًا مُعرَّفًا) فتُعاد كل المشتقات بملف الألبوم لاحقًا
+# في وقت الخمول (_upgrade_variants).
+#
+# البروتوكول (multipart، اختياري بالكامل):
+#   files         الأصول كما في الرفع العادي
+#   previews      ملفات باسم "<index>-<width>.<fmt>"، index = ترتيب الأصل في files
+#   preview_meta  JSON: قائمة بطول files، لكل أصل null أو
+#                 {"sha256": "<بصمة الأصل>", "previews": {"400.jpg": "<بصمة المعاينة>"}}
+
+CLIENT_PROFILE = "client"
+
+# صيغة الاسم → صيغة Pillow الفعلية
+FORMATS = {"jpg": "JPEG", "webp": "WEBP"}
+
+logger = logging.getLogger(__name__)
+
+
+def parse_name(name: str) -> tuple[int, str]:
+    """``"3-400.jpg"`` → ``(3, "400.jpg")``.
+
+    Raises:
+        ValueError: On a malformed name.
+    """
+    index, _, key = (name or "").partition("-")
+    width, _, fmt = key.partition(".")
+    return int(index), manifest_key(int(width), fmt)
+
+
+def oriented_size(path: Path) -> tuple[int, int]:
+    """Displayed size of an image (EXIF orientation applied); reads the header only."""
+    with open_image(path) as im:
+        w, h = im.size
+        if im.getexif().get(ORIENTATION, 1) in (5, 6, 7, 8):
+            w, h = h, w
+    return w, h
+
+
+def expected_size(orig: tuple[int, int], width: int) -> tuple[int, int]:
+    """Size the server would render for ``width`` (never upscales)."""
+    return fit_size(orig, width)
+
+
+def check_preview(data: bytes, sha256: Optional[str], width: int, fmt: str,
+                  orig: tuple[int, int]) -> tuple[int, int]:
+    """
+    Validate one client preview against the original it claims to show.
+
+    Args:
+        data: The preview file.
+        sha256: Hex digest the client computed for ``data``.
+        width: Variant width it stands for (one of ``SIZES``).
+        fmt: ``"jpg"`` or ``"webp"``.
+        orig: Displayed size of the original (see ``oriented_size``).
+
+    Returns:
+        The preview's ``(width, height)``.
+
+    Raises:
+        ValueError: If any check fails.
+    """
+    if fmt not in FORMATS or width not in SIZES.values():
+        raise ValueError(f"unsupported preview {width}.{fmt}")
+    if len(data) > settings.CLIENT_PREVIEW_MAX_BYTES:
+        raise ValueError("preview too large")
+    if hashlib.sha256(data).hexdigest() != (sha256 or "").lower():
+        raise ValueError("sha256 mismatch")
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            real, size = im.format, im.size
+    except Exception as e:
+        raise ValueError("not an image") from e
+    if real != FORMATS[fmt]:
+        raise ValueError(f"expected {FORMATS[fmt]}, got {real}")
+    w, h = expected_size(orig, width)
+    # تقريب الارتفاع قد يختلف بين المتصفح والخادم بمقدار بكسل
+    if size[0] != w or abs(size[1] - h) > 1:
+        raise ValueError(f"expected {w}x{h}, got {size[0]}x{size[1]}")
+    return size
+
+
+def _write(out: Path, data: bytes) -> None:
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(f".{out.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, out)
+
+
+def accept(
+    previews: dict[str, bytes],
+    meta: Optional[dict],
+    original_path: Path,
+    original_sha256: str,
+    out_root: Path,
+    album_id: int,
+    filename_stem: str,
+    manifest: dict,
+) -> dict[str, str]:
+    """
+    Store the valid client previews of one original as its variants.
+
+    Previews are checked one by one; a rejected preview is logged and left
+    for the server to render. When anything is accepted the manifest gets the
+    original's size and the ``"client"`` profile.
+
+    Args:
+        previews: Manifest key (``"400.jpg"``) → file bytes.
+        meta: The original's ``preview_meta`` entry.
+        original_sha256: Digest of the original as received.
+
+    Returns:
+        ``{"thumb_jpg": rel_path, ...}`` like ``make_variants``.
+    """
+    if not previews or not meta:
+        return {}
+    if (meta.get("sha256") or "").lower() != original_sha256:
+        logger.warning("client previews for %s ignored: original sha256 mismatch", original_path.name)
+        return {}
+    try:
+        orig = oriented_size(original_path)
+    except Exception as e:
+        logger.warning("client previews for %s ignored: %s", original_path.name, e)
+        return {}
+
+    hashes = meta.get("previews") or {}
+    results: dict[str, str] = {}
+    for key, data in previews.items():
+        width, _, fmt = key.partition(".")
+        try:
+            width = int(width)
+            size = check_preview(data, hashes.get(key), width, fmt, orig)
+        except ValueError as e:
+            logger.warning("client preview %s/%s rejected: %s", original_path.name, key, e)
+            continue
+        rel = variant_rel(album_id, filename_stem, width, fmt)
+        _write(out_root / rel, data)
+        manifest.setdefault("items", {})[key] = [size[0], size[1], len(data)]
+        kind = next(k for k, w in SIZES.items() if w == width)
+        results[f"{kind}_{fmt}"] = rel.as_posix()
+
+    if results:
+        manifest.update(v=PIPELINE_VERSION, w=orig[0], h=orig[1], p=CLIENT_PROFILE)
+    return results
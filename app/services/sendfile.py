@@ -0,0 +1,128 @@
+# app/services/sendfile.py
+from __future__ import annotations
+
+import os
+from typing import Mapping, Optional
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Parse a single ``Range: bytes=...`` header into an inclusive byte span.
+
+    Args:
+        header (Optional[str]): Raw ``Range`` header value.
+        size (int): Total size of the file in bytes.
+
+    Returns:
+        Optional[tuple[int, int]]: ``(start, end)`` inclusive, or None when the
+        header is absent, malformed or asks for several ranges (the caller
+        then sends the whole file with 200).
+
+    Raises:
+        ValueError: If the range is well-formed but unsatisfiable (416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, sep, last = header[6:].strip().partition("-")
+    if not sep or not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+        return None
+    if first == "":
+        # لاحقة: آخر N بايت
+        if last == "":
+            return None
+        n = int(last)
+        if n == 0 or size == 0:
+            raise ValueError("range not satisfiable")
+        return max(0, size - n), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class RangeFileResponse(Response):
+    """
+    File response with single-range support and zero-copy sending.
+
+    When the ASGI server advertises the ``http.response.zerocopysend``
+    extension the kernel copies the bytes (``sendfile``); otherwise the file
+    is streamed in chunks from a worker thread like ``FileResponse`` does.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        st: os.stat_result,
+        range_header: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+    ) -> None:
+        self.path = path
+        self.media_type = media_type or "application/octet-stream"
+        self.background = None
+        size = st.st_size
+        self.start, self.end = 0, size - 1
+        status_code = 200
+        extra = {"accept-ranges": "bytes"}
+        try:
+            span = parse_range(range_header, size)
+        except ValueError:
+            span = None
+            status_code = 416
+            extra["content-range"] = f"bytes */{size}"
+            self.start, self.end = 0, -1
+        if span:
+            self.start, self.end = span
+            status_code = 206
+            extra["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+        self.status_code = status_code
+        self.init_headers({**(headers or {}), **extra})
+        self.headers["content-length"] = str(self.end - self.start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        count = self.end - self.start + 1
+        if scope.get("method", "GET").upper() == "HEAD" or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.start,
+                    "count": count,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0,
+                })
+        if remaining > 0:
+            # الملف قُصّ أثناء الإرسال: أغلق الرد بدل تعليق العميل
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
@@ -0,0 +1,185 @@
+# app/services/sprites.py
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: عامل uvicorn واحد، وقفل _sprites_lock في admin يكفي
+    fcntl = None
+
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from .albums import thumb_file
+from .variants import open_image
+
+# ======================================================
+# Admin sprite sheets
+# ======================================================
+# بدل طلب مصغّرة لكل أصل في شبكة الإدارة: الأصول (بترتيب id) تُجمع في أطالس
+# WebP من SPRITE_PER_SHEET خلية بعرض SPRITE_CELL، مع خريطة JSON بإحداثيات كل
+# أصل. كل أطلس مسمّى ببصمة محتواه (id + manifest لأعضائه) فيُخزَّن بلا انتهاء
+# (/media immutable)، ولا يُعاد بناء إلا ما تغيّر: رفع جديد يمس الأطلس الأخير
+# فقط، وتدوير أصل يمس أطلسه. البناء في الخلفية (admin._build_sprites).
+#
+#   albums/<id>/sprites/map.json
+#     {"v": "<نسخة>", "cell": 200,
+#      "sheets": [["/media/albums/<id>/sprites/<hash>.webp", w, h], ...],
+#      "items": {"<asset id>": [sheet, x, y, w, h]}}
+#
+# عمال gunicorn يبنون نفس الألبوم أحيانًا معًا: البناء والحذف تحت قفل ملف
+# (flock) لكل ألبوم، وإلا حذف أحدهم أطالس كتبها الآخر لخريطته.
+
+SPRITES_DIR = "sprites"
+
+logger = logging.getLogger(__name__)
+
+
+def sprite_dir(album_id: int) -> Path:
+    return Path(settings.STORAGE_DIR) / "albums" / str(album_id) / SPRITES_DIR
+
+
+@contextmanager
+def _album_lock(album_id: int) -> Iterator[None]:
+    # sprites/.lock — يبدأ بنقطة فلا يحذفه التنظيف في build
+    out_dir = sprite_dir(album_id)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / ".lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield  # يُحرَّر القفل بإغلاق الملف
+
+
+def _rows(db: Session, album_id: int) -> list:
+    A = models.Asset
+    return db.execute(
+        select(A.id, A.filename, A.variants_manifest)
+        .where(A.album_id == album_id)
+        .order_by(A.id)
+    ).all()
+
+
+def _digest(rows) -> str:
+    h = hashlib.sha1()
+    for r in rows:
+        h.update(f"{r.id}:{r.filename}:{r.variants_manifest or ''}\n".encode())
+    return h.hexdigest()[:16]
+
+
+def version(db: Session, album_id: int) -> str:
+    """Fingerprint of everything the album's sheets show (assets and their variants)."""
+    return _digest(_rows(db, album_id))
+
+
+def load_map(album_id: int) -> Optional[dict]:
+    """The album's current sprite map, or ``None`` if it was never built."""
+    try:
+        return json.loads((sprite_dir(album_id) / "map.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def is_complete(data: dict) -> bool:
+    """True if every sheet the map points to exists on disk."""
+    root = Path(settings.STORAGE_DIR)
+    return all((root / s[0].removeprefix("/media/")).is_file() for s in data.get("sheets") or [])
+
+
+def _render(album_id: int, rows, out: Path) -> tuple[tuple[int, int], dict[int, list[int]]]:
+    # أطلس واحد: خلايا cell×cell، كل مصغّرة بنسبتها في زاوية خليتها
+    cell = settings.SPRITE_CELL
+    cols = math.ceil(math.sqrt(settings.SPRITE_PER_SHEET))
+    width = cell * min(cols, len(rows))
+    height = cell * math.ceil(len(rows) / cols)
+    sheet = Image.new("RGB", (width, height), (243, 244, 246))
+    rects: dict[int, list[int]] = {}
+    for i, r in enumerate(rows):
+        # المصغّرة 400 الموجودة فقط؛ الأصول بلا مصغّرة تبقى خارج الخريطة
+        src = thumb_file(album_id, r.filename, r.variants_manifest)
+        if src is None:
+            continue
+        try:
+            with open_image(src) as im:
+                im.draft("RGB", (cell, cell))
+                im = im.convert("RGB")
+                im.thumbnail((cell, cell), Image.LANCZOS)
+        except Exception as e:
+            logger.warning("sprite: skipping asset %s: %s", r.id, e)
+            continue
+        x, y = (i % cols) * cell, (i // cols) * cell
+        sheet.paste(im, (x, y))
+        rects[r.id] = [x, y, im.width, im.height]
+    tmp = out.with_name(f".{out.name}.{uuid.uuid4().hex[:8]}.tmp")
+    sheet.save(tmp, format="WEBP", quality=settings.SPRITE_QUALITY, method=4)
+    os.replace(tmp, out)
+    return sheet.size, rects
+
+
+def build(db: Session, album_id: int) -> dict:
+    """
+    Bring the album's sprite sheets and map up to date.
+
+    Sheets whose members did not change are reused as they are; sheets no
+    longer referenced are deleted after the new map is written. Builds of
+    the same album are serialised across worker processes by a file lock.
+
+    Returns:
+        The (new or already current) map.
+    """
+    with _album_lock(album_id):
+        return _build(db, album_id)
+
+
+def _build(db: Session, album_id: int) -> dict:
+    rows = _rows(db, album_id)
+    ver = _digest(rows)
+    current = load_map(album_id)
+    if current and current.get("v") == ver and is_complete(current):
+        return current
+
+    out_dir = sprite_dir(album_id)
+    per = settings.SPRITE_PER_SHEET
+    sheets: list[list] = []
+    items: dict[str, list[int]] = {}
+    keep = {"map.json"}
+    # أبعاد وإحداثيات الأطالس المعاد استخدامها من الخريطة السابقة
+    known = {Path(s[0]).name: (s, i) for i, s in enumerate((current or {}).get("sheets") or [])}
+    old_items = (current or {}).get("items") or {}
+
+    for start in range(0, len(rows), per):
+        chunk = rows[start:start + per]
+        name = f"{_digest(chunk)}.webp"
+        out = out_dir / name
+        if name in known and out.exists():
+            old, old_idx = known[name]
+            size = (old[1], old[2])
+            rects = {r.id: old_items[str(r.id)][1:] for r in chunk
+                     if old_items.get(str(r.id), [None])[0] == old_idx}
+        else:
+            size, rects = _render(album_id, chunk, out)
+        idx = len(sheets)
+        sheets.append(["/media/" + out.relative_to(Path(settings.STORAGE_DIR)).as_posix(), *size])
+        items.update({str(i): [idx, *rect] for i, rect in rects.items()})
+        keep.add(name)
+
+    data = {"v": ver, "cell": settings.SPRITE_CELL, "sheets": sheets, "items": items}
+    tmp = out_dir / f".map.{uuid.uuid4().hex[:8]}.tmp"
+    tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, out_dir / "map.json")
+
+    for p in out_dir.iterdir():
+        if p.name not in keep and not p.name.startswith("."):
+            p.unlink(missing_ok=True)
+    return data
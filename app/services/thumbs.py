@@ -5,12 +5,9 @@ from typing import Dict
 from PIL import Image, ImageOps
 import base64
 from ..config import settings
+from .variants import load_avif_plugin, open_image
 
-# ✅ فعّل كوديك AVIF إذا كانت الحزمة موجودة
-try:
-    import pillow_avif  # noqa: F401
-except Exception as e:
-    print("[avif] pillow-avif-plugin not available:", e)
+# كوديك AVIF يُسجَّل عند الحاجة فقط (load_avif_plugin) وليس عند الاستيراد
 
 # ✅ فلاغات من .env
 ENABLE_WEBP = getattr(settings, "ENABLE_WEBP", True)
@@ -52,7 +49,7 @@ def ensure_thumb(original: Path) -> Path | None:
     if tpath.exists():
         return tpath
 
-    with Image.open(original) as img:
+    with open_image(original) as img:
         img = _normalize(img)
         w, h = img.size
         max_w = int(getattr(settings, "THUMB_MAX_WIDTH", 800))
@@ -90,7 +87,9 @@ def make_thumb_bytes(original_bytes: bytes, max_w: int) -> bytes:
 
 def ensure_variants(original: Path) -> Dict:
     out: Dict[str, Dict[int, str] | int] = {"jpg": {}, "webp": {}, "avif": {}}
-    with Image.open(original) as im0:
+    if ENABLE_AVIF:
+        load_avif_plugin()
+    with open_image(original) as im0:
         im0 = _normalize(im0)
         w0, h0 = im0.size
         out["width"], out["height"] = w0, h0
@@ -129,7 +128,7 @@ def ensure_variants(original: Path) -> Dict:
     return out
 
 def tiny_placeholder_base64(original: Path, size: int = 24) -> str:
-    with Image.open(original) as im:
+    with open_image(original) as im:
         im = _normalize(im)
         w, h = im.size
         ratio = h / w if w else 1.0
@@ -0,0 +1,254 @@
+# app/services/tracing.py
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# ======================================================
+# Spans
+# ======================================================
+# تتبّع خفيف لمسار الرفع/التدوير: كل مرحلة span (اسم، بداية، مدة، خصائص)
+# داخل trace واحد. عند انتهاء الجذر تُصدَّر كل الـ spans مع ملخص يبيّن أين
+# ذهب الوقت. بدون TRACE_FILE أو TRACE_OTLP_ENDPOINT تصبح span() بلا أثر.
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "spans")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attrs: dict,
+                 start_ns: Optional[int] = None, spans: Optional[list] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attrs = attrs
+        self.spans = spans if spans is not None else []  # كل spans الـ trace (مشتركة)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "type": "span", "trace_id": self.trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "name": self.name,
+            "start_ns": self.start_ns, "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+        }
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+def enabled() -> bool:
+    return bool(settings.TRACE_FILE or settings.TRACE_OTLP_ENDPOINT)
+
+
+def current_trace_id() -> Optional[str]:
+    sp = _current.get()
+    return sp.trace_id if sp else None
+
+
+@contextmanager
+def trace(name: str, start_ns: Optional[int] = None, **attrs: Any) -> Iterator[Optional[Span]]:
+    """
+    Start a new trace (root span) and export it when the block exits.
+
+    Args:
+        name: Root span name, e.g. ``"upload"``.
+        start_ns: Backdate the root start (epoch ns), e.g. to the moment the
+            request arrived so multipart spooling is included.
+        **attrs: Attributes recorded on the root span.
+    """
+    if not enabled():
+        yield None
+        return
+    root = Span(name, os.urandom(16).hex(), None, dict(attrs), start_ns=start_ns)
+    root.spans.append(root)
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.set(error=repr(e))
+        raise
+    finally:
+        root.end_ns = time.time_ns()
+        _current.reset(token)
+        _export(root)
+
+
+@contextmanager
+def span(name: str, start_ns: Optional[int] = None, **attrs: Any) -> Iterator[Optional[Span]]:
+    """Record a child span of the active trace (no-op outside a trace)."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    sp = Span(name, parent.trace_id, parent.span_id, dict(attrs), start_ns=start_ns,
+              spans=parent.spans)
+    parent.spans.append(sp)
+    token = _current.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.set(error=repr(e))
+        raise
+    finally:
+        sp.end_ns = time.time_ns()
+        _current.reset(token)
+
+
+# ======================================================
+# Summary
+# ======================================================
+
+def _label(sp: Span) -> str:
+    keys = [str(sp.attrs[k]) for k in ("kind", "width", "fmt") if k in sp.attrs]
+    return f"{sp.name}[{'/'.join(keys)}]" if keys else sp.name
+
+
+def summarize(root: Span) -> dict:
+    """
+    Where did the wall time of ``root`` go?
+
+    ``stages`` groups the direct children of the root by name (their times
+    add up to the wall time minus ``unaccounted_ms``); ``breakdown`` groups
+    every deeper span by name plus its ``kind``/``width``/``fmt``
+    attributes, e.g. ``variant.encode[1600/webp]``.
+    """
+    wall = root.duration_ms
+    stages: dict[str, dict] = {}
+    breakdown: dict[str, dict] = {}
+    for sp in root.spans:
+        if sp is root:
+            continue
+        bucket = stages if sp.parent_id == root.span_id else breakdown
+        key = sp.name if bucket is stages else _label(sp)
+        row = bucket.setdefault(key, {"ms": 0.0, "count": 0})
+        row["ms"] += sp.duration_ms
+        row["count"] += 1
+    accounted = sum(r["ms"] for r in stages.values())
+    for rows in (stages, breakdown):
+        for r in rows.values():
+            r["ms"] = round(r["ms"], 3)
+            r["pct"] = round(100.0 * r["ms"] / wall, 1) if wall else 0.0
+    order = lambda d: dict(sorted(d.items(), key=lambda kv: kv[1]["ms"], reverse=True))  # noqa: E731
+    return {
+        "type": "summary", "trace_id": root.trace_id, "name": root.name,
+        "attrs": root.attrs, "wall_ms": round(wall, 3),
+        "unaccounted_ms": round(max(0.0, wall - accounted), 3),
+        "stages": order(stages), "breakdown": order(breakdown),
+    }
+
+
+# ======================================================
+# Export
+# ======================================================
+
+_file_lock = threading.Lock()
+
+
+def _export(root: Span) -> None:
+    summary = summarize(root)
+    top = ", ".join(f"{k} {v['ms']:.0f}ms ({v['pct']:.0f}%)" for k, v in list(summary["stages"].items())[:5])
+    logger.info("trace %s %s: %.0fms | %s", root.name, root.trace_id, summary["wall_ms"], top)
+    try:
+        if settings.TRACE_FILE:
+            _write_jsonl(Path(settings.TRACE_FILE), root, summary)
+        if settings.TRACE_OTLP_ENDPOINT:
+            # لا تؤخر الرد بانتظار الـ collector
+            threading.Thread(target=_post_otlp, args=(settings.TRACE_OTLP_ENDPOINT, root),
+                             daemon=True).start()
+    except Exception as e:  # التتبع لا يُفشل الطلب أبدًا
+        logger.warning("trace export failed: %s", e)
+
+
+def _write_jsonl(path: Path, root: Span, summary: dict) -> None:
+    lines = [json.dumps(sp.to_dict(), ensure_ascii=False, default=str) for sp in root.spans]
+    lines.append(json.dumps(summary, ensure_ascii=False, default=str))
+    with _file_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def _otlp_value(v: Any) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def to_otlp(root: Span) -> dict:
+    """Encode a finished trace as an OTLP/HTTP JSON ``ExportTraceServiceRequest``."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [
+            {"key": "service.name", "value": {"stringValue": "dichfoto"}},
+        ]},
+        "scopeSpans": [{
+            "scope": {"name": "app.services.tracing"},
+            "spans": [{
+                "traceId": sp.trace_id,
+                "spanId": sp.span_id,
+                **({"parentSpanId": sp.parent_id} if sp.parent_id else {}),
+                "name": sp.name,
+                "kind": 1,
+                "startTimeUnixNano": str(sp.start_ns),
+                "endTimeUnixNano": str(sp.end_ns or sp.start_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in sp.attrs.items()],
+            } for sp in root.spans],
+        }],
+    }]}
+
+
+def _post_otlp(endpoint: str, root: Span) -> None:
+    body = json.dumps(to_otlp(root)).encode()
+    req = urllib.request.Request(endpoint, data=body, method="POST",
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            resp.read()
+    except Exception as e:
+        logger.warning("OTLP export to %s failed: %s", endpoint, e)
+
+
+# ======================================================
+# Request start stamp
+# ======================================================
+
+class RequestStartMiddleware:
+    """
+    Stamp ``request.state.start_ns`` on arrival. Starlette parses multipart
+    bodies before the endpoint runs, so this is the only way for the upload
+    trace to include the spooling time.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["start_ns"] = time.time_ns()
+        await self.app(scope, receive, send)
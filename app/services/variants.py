@@ -1,8 +1,19 @@
 from __future__ import annotations
+import functools
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
 from pathlib import Path
-from typing import Iterable, Literal
+from typing import Iterable, Literal, Optional
 from PIL import Image, ImageOps
 
+from ..config import settings
+from .metrics import VARIANT_ENCODE
+from .tracing import span
+
 VariantName = Literal["thumb", "disp", "big"]
 
 # أحجامنا القياسية
@@ -12,23 +23,183 @@ SIZES: dict[VariantName, int] = {
     "big":  2048,   # اختيارية للشاشات الكبيرة
 }
 
+# المجلدات الفرعية لكل حجم قياسي (أي عرض آخر يذهب إلى w/<width>)
+SUBDIRS: dict[VariantName, str] = {
+    "thumb": "thumb/400",
+    "disp": "disp/1600",
+    "big": "big/2048",
+}
+
+# ارفع الرقم عند تغيير SIZES أو الجودة أو الترميز؛ reprocess_variants.py --stale
+# يعيد توليد كل أصل سُجّل manifest الخاص به بنسخة أقدم.
+PIPELINE_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+@functools.cache
+def load_avif_plugin() -> bool:
+    """
+    يسجّل كوديك AVIF (pillow-avif-plugin) عند أول حاجة إليه بدل الاستيراد
+    عند تحميل التطبيق في كل عامل. يعيد False إن لم تكن الحزمة مثبّتة.
+    """
+    try:
+        import pillow_avif  # noqa: F401
+    except Exception as e:
+        logger.warning("pillow-avif-plugin not available: %s", e)
+        return False
+    return True
+
+def open_image(path: Path) -> Image.Image:
+    """Image.open مع تسجيل كوديك AVIF فقط عندما يكون الأصل نفسه AVIF."""
+    if Path(path).suffix.lower() in (".avif", ".avifs"):
+        load_avif_plugin()
+    return Image.open(path)
+
 def _ensure_dir(p: Path) -> None:
     p.parent.mkdir(parents=True, exist_ok=True)
 
-def _save_jpeg(im: Image.Image, path: Path) -> None:
+# ================
+# Encoding profiles
+# ================
+# settings.ENCODING_PROFILES: اسم → صيغة → وسائط Pillow. الاسم المستخدم يُسجَّل
+# في الـ manifest ("p") حتى تُرمَّز المشتقات اللاحقة (عند الطلب) بنفس الملف
+# ويُعرف ما يحتاج إلى ترقية.
+
+# ما رُمِّز قبل أن يُسجَّل "p" في الـ manifest استخدم إعدادات "max" الحالية
+LEGACY_PROFILE = "max"
+
+def manifest_profile(manifest: dict) -> str:
+    """Profile the asset's variants were encoded with (from its manifest)."""
+    return manifest.get("p") or LEGACY_PROFILE
+
+def resolve_profile(profile: Optional[str] = None) -> str:
+    """Return ``profile`` if it is a configured profile name, else the default one."""
+    if profile and profile in settings.ENCODING_PROFILES:
+        return profile
+    return settings.ENCODING_PROFILE
+
+def encoder_params(fmt: str, profile: Optional[str] = None) -> dict:
+    return dict(settings.ENCODING_PROFILES[resolve_profile(profile)].get(fmt) or {})
+
+def _save_jpeg(im: Image.Image, path: Path, params: dict) -> None:
+    _ensure_dir(path)
+    im.save(path, format="JPEG", **params)
+
+def _save_webp(im: Image.Image, path: Path, params: dict) -> None:
     _ensure_dir(path)
-    im.save(path, format="JPEG", quality=80, optimize=True, progressive=True)
+    im.save(path, format="WEBP", **params)
 
-def _save_webp(im: Image.Image, path: Path) -> None:
+def _save_avif(im: Image.Image, path: Path, params: dict) -> None:
+    # كوديك AVIF يأتي من pillow-avif-plugin (يُسجَّل عند أول استخدام)
+    load_avif_plugin()
     _ensure_dir(path)
-    im.save(path, format="WEBP", quality=80, method=6)
+    im.save(path, format="AVIF", **params)
+
+def _timed(fmt: str, saver):
+    # زمن الترميز + الكتابة لكل مشتق (variant_encode_seconds{fmt} + span في التتبع)
+    def save(im: Image.Image, path: Path, profile: Optional[str] = None) -> None:
+        name = resolve_profile(profile)
+        t0 = time.perf_counter()
+        with span("variant.encode", width=im.width, fmt=fmt, profile=name):
+            saver(im, path, encoder_params(fmt, name))
+        VARIANT_ENCODE.labels(fmt=fmt).observe(time.perf_counter() - t0)
+    return save
+
+_SAVERS = {
+    "jpg": _timed("jpg", _save_jpeg),
+    "webp": _timed("webp", _save_webp),
+    "avif": _timed("avif", _save_avif),
+}
+
+def fit_size(size: tuple[int, int], width: int) -> tuple[int, int]:
+    """Size of the ``width`` variant of an image of ``size`` (never upscales)."""
+    w, h = size
+    if w <= width:
+        return w, h
+    return width, max(1, round(h * (width / w)))
 
 def _resize_fit(im: Image.Image, target_w: int) -> Image.Image:
-    w, h = im.size
-    if w <= target_w:
+    if im.width <= target_w:
         return im
-    new_h = round(h * (target_w / w))
-    return im.resize((target_w, new_h), Image.LANCZOS)
+    return im.resize(fit_size(im.size, target_w), Image.LANCZOS)
+
+def variant_rel(album_id: int, stem: str, width: int, fmt: str) -> Path:
+    """
+    المسار النسبي (داخل STORAGE_DIR) لمشتق بعرض وصيغة معيّنين.
+    الأحجام القياسية تبقى في thumb/400 و disp/1600 و big/2048 كما كانت.
+    """
+    kind = next((k for k, w in SIZES.items() if w == width), None)
+    subdir = SUBDIRS[kind] if kind else f"w/{width}"
+    return Path(f"albums/{album_id}/{subdir}/{stem}.{fmt}")
+
+# ================
+# Manifest
+# ================
+# شكل الـ manifest المخزَّن في Asset.variants_manifest:
+#   {"v": PIPELINE_VERSION, "w": 6000, "h": 4000,
+#    "items": {"400.jpg": [400, 267, 31415], "1600.webp": [1600, 1067, 271828]}}
+# كل عنصر: [عرض, ارتفاع, حجم بالبايت]. المسار يُشتق دائمًا عبر variant_rel.
+# "p" ملف الترميز و"r" عدد مرات التدوير (يدخلان في variant_version)، و"drive"
+# معرّفات نسخ Drive للمشتقات المرفوعة {"400.jpg": "<file id>"} (يحذفها gc).
+
+def manifest_key(width: int, fmt: str) -> str:
+    return f"{width}.{fmt}"
+
+def parse_manifest_key(key: str) -> tuple[int, str]:
+    width, fmt = key.split(".", 1)
+    return int(width), fmt
+
+def variant_version(manifest: dict, width: int) -> Optional[str]:
+    """
+    Short token of the ``width`` variant in every format (dimensions, bytes,
+    profile, rotations). Variant files are rewritten in place by rotation and
+    re-encoding, so URLs cached as immutable carry it as ``?v=``.
+    ``None`` if the manifest records no variant of that width.
+    """
+    found = sorted((k, v) for k, v in (manifest.get("items") or {}).items()
+                   if parse_manifest_key(k)[0] == width)
+    if not found:
+        return None
+    raw = json.dumps([found, manifest.get("p"), manifest.get("r", 0)], separators=(",", ":"))
+    return hashlib.sha1(raw.encode()).hexdigest()[:10]
+
+def _record(manifest: Optional[dict], width: int, fmt: str, im: Image.Image, path: Path) -> None:
+    if manifest is None:
+        return
+    manifest.setdefault("items", {})[manifest_key(width, fmt)] = [
+        im.width, im.height, path.stat().st_size,
+    ]
+
+def describe_variant(path: Path, width: int, fmt: str, manifest: dict) -> None:
+    """يسجّل مشتقًا موجودًا مسبقًا على القرص (قراءة الترويسة فقط دون فك الترميز)."""
+    with open_image(path) as im:
+        _record(manifest, width, fmt, im, path)
+
+def render_variant(
+    original_path: Path,
+    out_path: Path,
+    width: int,
+    fmt: str,
+    manifest: Optional[dict] = None,
+    profile: Optional[str] = None,
+) -> Path:
+    """
+    يولّد مشتقًا واحدًا (عرض + صيغة) ويكتبه ذرّيًا: ملف مؤقت ثم os.replace،
+    حتى لا يرى أي طلب متزامن ملفًا نصف مكتوب. profile: ملف الترميز (الافتراضي إن None).
+    """
+    saver = _SAVERS[fmt]
+    tmp = out_path.with_name(f".{out_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    with open_image(original_path) as im0:
+        im0 = ImageOps.exif_transpose(im0).convert("RGB")
+        im = _resize_fit(im0, width)
+        saver(im, tmp, profile)
+    try:
+        os.replace(tmp, out_path)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+    _record(manifest, width, fmt, im, out_path)
+    return out_path
 
 def make_variants(
     original_path: Path,
@@ -36,29 +207,191 @@ def make_variants(
     album_id: int,
     filename_stem: str,
     create: Iterable[VariantName] = ("thumb", "disp", "big"),
+    manifest: Optional[dict] = None,
+    profile: Optional[str] = None,
 ) -> dict[str, str]:
     """
     ينشئ JPG + WebP لكل حجم ويعيد مسارات نسبية يمكن استعمالها لاحقًا في القوالب.
     out_root = settings.STORAGE_DIR
+    إن مُرِّر manifest (قاموس) تُسجَّل فيه أبعاد وأحجام ما وُلِّد واسم ملف الترميز.
     """
     results: dict[str, str] = {}
 
-    with Image.open(original_path) as im0:
+    with open_image(original_path) as im0:
         # احترام اتجاه EXIF وتوحيد القناة
-        im0 = ImageOps.exif_transpose(im0).convert("RGB")
+        with span("variant.decode"):
+            im0 = ImageOps.exif_transpose(im0).convert("RGB")
+        if manifest is not None:
+            manifest.update(v=PIPELINE_VERSION, w=im0.width, h=im0.height,
+                            p=resolve_profile(profile))
 
         for kind in create:
             width = SIZES[kind]
-            im = _resize_fit(im0, width)
+            with span("variant.resize", kind=kind):
+                im = _resize_fit(im0, width)
 
-            subdir = {"thumb": "thumb/400", "disp": "disp/1600", "big": "big/2048"}[kind]
-            jpg_rel  = Path(f"albums/{album_id}/{subdir}/{filename_stem}.jpg")
-            webp_rel = Path(f"albums/{album_id}/{subdir}/{filename_stem}.webp")
+            jpg_rel  = variant_rel(album_id, filename_stem, width, "jpg")
+            webp_rel = variant_rel(album_id, filename_stem, width, "webp")
 
-            _save_jpeg(im, out_root / jpg_rel)
-            _save_webp(im, out_root / webp_rel)
+            _SAVERS["jpg"](im, out_root / jpg_rel, profile)
+            _SAVERS["webp"](im, out_root / webp_rel, profile)
+            _record(manifest, width, "jpg", im, out_root / jpg_rel)
+            _record(manifest, width, "webp", im, out_root / webp_rel)
 
             results[f"{kind}_jpg"]  = jpg_rel.as_posix()
             results[f"{kind}_webp"] = webp_rel.as_posix()
 
     return results
+
+def make_avif_variants(
+    original_path: Path,
+    out_root: Path,
+    album_id: int,
+    filename_stem: str,
+    create: Iterable[VariantName] = ("thumb", "disp", "big"),
+    manifest: Optional[dict] = None,
+    profile: Optional[str] = None,
+) -> dict[str, str]:
+    """
+    ترميز AVIF بطيء جدًا مقارنة بـ JPG/WebP، لذلك لا يُستدعى أثناء الرفع
+    بل كمهمة خلفية بعد الرد. الأخطاء (غياب الكوديك مثلًا) لا توقف شيئًا.
+    """
+    results: dict[str, str] = {}
+    try:
+        with open_image(original_path) as im0:
+            im0 = ImageOps.exif_transpose(im0).convert("RGB")
+            for kind in create:
+                rel = variant_rel(album_id, filename_stem, SIZES[kind], "avif")
+                im = _resize_fit(im0, SIZES[kind])
+                _SAVERS["avif"](im, out_root / rel, profile)
+                _record(manifest, SIZES[kind], "avif", im, out_root / rel)
+                results[f"{kind}_avif"] = rel.as_posix()
+    except Exception as e:
+        print("[avif] encode failed:", original_path, e)
+    return results
+
+def expected_variants(
+    album_id: int,
+    filename_stem: str,
+    kinds: Iterable[VariantName],
+    formats: Iterable[str],
+) -> dict[tuple[str, str], Path]:
+    """
+    خريطة (kind, fmt) → المسار النسبي المتوقع لكل مشتق.
+    """
+    return {
+        (kind, fmt): variant_rel(album_id, filename_stem, SIZES[kind], fmt)
+        for kind in kinds
+        for fmt in formats
+    }
+
+def _render_many(
+    original_path: Path,
+    out_root: Path,
+    jobs: Iterable[tuple[int, str, Path]],
+    manifest: Optional[dict],
+    profile: Optional[str],
+) -> int:
+    # فتح واحد للأصل، تصغير واحد لكل عرض، كتابة ذرّية لكل (عرض، صيغة)
+    written = 0
+    with open_image(original_path) as im0:
+        im0 = ImageOps.exif_transpose(im0).convert("RGB")
+        if manifest is not None:
+            manifest.update(w=im0.width, h=im0.height, p=resolve_profile(profile))
+        resized: dict[int, Image.Image] = {}
+        for width, fmt, rel in jobs:
+            if width not in resized:
+                resized[width] = _resize_fit(im0, width)
+            out = out_root / rel
+            out.parent.mkdir(parents=True, exist_ok=True)
+            tmp = out.with_name(f".{out.name}.{uuid.uuid4().hex[:8]}.tmp")
+            _SAVERS[fmt](resized[width], tmp, profile)
+            os.replace(tmp, out)
+            _record(manifest, width, fmt, resized[width], out)
+            written += out.stat().st_size
+    return written
+
+def render_variants(
+    original_path: Path,
+    out_root: Path,
+    targets: dict[tuple[str, str], Path],
+    manifest: Optional[dict] = None,
+    profile: Optional[str] = None,
+) -> int:
+    """
+    يولّد مجموعة مشتقات من فتح واحد للأصل (يُستخدم في إعادة المعالجة الجماعية).
+    يعيد مجموع البايتات المكتوبة.
+    """
+    jobs = [(SIZES[kind], fmt, rel) for (kind, fmt), rel in targets.items()]
+    return _render_many(original_path, out_root, jobs, manifest, profile)
+
+def reencode_variants(
+    original_path: Path,
+    out_root: Path,
+    album_id: int,
+    filename_stem: str,
+    keys: Iterable[tuple[int, str]],
+    manifest: Optional[dict] = None,
+    profile: Optional[str] = None,
+) -> int:
+    """
+    يعيد ترميز مشتقات موجودة (عرض، صيغة) بملف ترميز آخر، بما فيها المولَّدة
+    عند الطلب (w/<width>). يُستخدم لترقية ما رُفع بملف "fast". يعيد البايتات المكتوبة.
+    """
+    jobs = [(w, fmt, variant_rel(album_id, filename_stem, w, fmt)) for w, fmt in keys]
+    return _render_many(original_path, out_root, jobs, manifest, profile)
+
+def rotate_variants(
+    original_path: Path,
+    out_root: Path,
+    album_id: int,
+    filename_stem: str,
+    items: dict[str, list],
+    dir: str,
+    size: tuple[int, int],
+    manifest: Optional[dict] = None,
+    profile: Optional[str] = None,
+) -> int:
+    """
+    يحدّث مشتقات أصلٍ بعد تدويره 90° (``cw``/``ccw``)؛ ``size`` مقاس الأصل
+    المعروض بعد التدوير. يُفك أكبر مشتق موجود مرة واحدة ويُدوَّر، ومنه تُشتق
+    كل العروض التي يغطيها (المقاس الذي يولّده الأصل المدوَّر لا يتجاوزه) بدل
+    فك أصل بعشرات الميغابكسل لكل عرض. ما لا يغطيه (عروض كبيرة لصورة أفقية
+    صارت عمودية) يُولَّد من الأصل المدوَّر بفتح واحد. يعيد عدد ما كُتب.
+    """
+    op = Image.Transpose.ROTATE_270 if dir == "cw" else Image.Transpose.ROTATE_90
+    jobs: list[tuple[int, str, Path, list]] = []
+    for key, item in items.items():
+        width, fmt = parse_manifest_key(key)
+        rel = variant_rel(album_id, filename_stem, width, fmt)
+        if (out_root / rel).exists():
+            jobs.append((width, fmt, rel, item))
+
+    # المصدر: أكبر مشتق بأبعاد معروفة؛ عند التساوي غير AVIF (فكّه أبطأ)
+    known = [j for j in jobs if j[3] and j[3][0] is not None]
+    turned: Optional[Image.Image] = None
+    if known:
+        width, fmt, rel, _ = max(known, key=lambda j: (j[3][0] * j[3][1], j[1] != "avif"))
+        with open_image(out_root / rel) as im:
+            with span("variant.rotate", width=width, fmt=fmt):
+                turned = im.convert("RGB").transpose(op)
+
+    redo: list[tuple[int, str, Path]] = []
+    resized: dict[int, Image.Image] = {}
+    done = 0
+    for width, fmt, rel, _ in jobs:
+        want = fit_size(size, width)
+        if turned is None or want[0] > turned.width or want[1] > turned.height:
+            redo.append((width, fmt, rel))
+            continue
+        if width not in resized:
+            resized[width] = turned if want == turned.size else turned.resize(want, Image.LANCZOS)
+        out = out_root / rel
+        tmp = out.with_name(f".{out.name}.{uuid.uuid4().hex[:8]}.tmp")
+        _SAVERS[fmt](resized[width], tmp, profile)
+        os.replace(tmp, out)
+        _record(manifest, width, fmt, resized[width], out)
+        done += 1
+    if redo:
+        _render_many(original_path, out_root, redo, manifest, profile)
+    return done + len(redo)
@@ -0,0 +1,8 @@
+# app/templating.py
+from fastapi.templating import Jinja2Templates
+
+from .config import settings
+
+# نسخة واحدة مشتركة بين كل الراوترات (بيئة Jinja وذاكرة القوالب المترجمة واحدة)
+templates = Jinja2Templates(directory="templates")
+templates.env.globals["settings"] = settings
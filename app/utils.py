@@ -1,3 +1,4 @@
+import hashlib
 import re
 import secrets
 import unicodedata
@@ -103,6 +104,24 @@ def unique_name(clean: str) -> str:
 
 
 
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 hex digest of a file without loading it in memory.
+
+    Args:
+        path (Path): File to hash.
+        chunk_size (int, optional): Read size in bytes. Defaults to 1 MiB.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def _parse_dt(value: str):
     """حاول تحويل النص إلى datetime"""
     try:
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: cost of each image-pipeline step and encoder setting.
+
+Runs every case over a locally generated corpus of photo-like images
+(landscape/portrait, smooth/noisy, several resolutions) and reports, per
+case:
+
+* ``ms``       wall time per image: best of ``--repeat`` passes, averaged
+  over the corpus
+* ``peak_mb``  peak RSS growth while the case runs. Pillow allocates image
+  buffers in C, which ``tracemalloc`` does not see, so every case runs in
+  its own process and ``ru_maxrss`` is sampled before and after.
+* ``bytes``    mean output size per image (encoders only)
+
+``app.*`` cases call the functions the app really uses
+(``variants._SAVERS``, ``variants._resize_fit``, ``thumbs.tiny_placeholder_base64``,
+``variants.make_variants``), so they follow any change to qualities or
+flags. ``alt.*`` cases are the same step with other settings, to choose
+new defaults with data:
+
+    python benchmarks/image_pipeline.py
+    python benchmarks/image_pipeline.py --only app.encode.webp alt.webp.m4 --repeat 5
+
+As a regression gate (exit status 1 when ``ms`` or ``bytes`` grow beyond
+``--tolerance`` against the stored run; ``ms`` is compared relative to a
+calibration workload timed around every case, so runner speed and load
+cancel out):
+
+    python benchmarks/image_pipeline.py --write-baseline benchmarks/image_baseline.json
+    python benchmarks/image_pipeline.py --baseline benchmarks/image_baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import multiprocessing as mp
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+# app/ من جذر المستودع (العمليات الفرعية تعيد استيراد هذا الملف)
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+# (name, WxH, noise): noise عالٍ = تفاصيل دقيقة (أوراق شجر، قماش) يصعب ضغطها
+CORPUS = (
+    ("landscape-24mp", (6000, 4000), 24),
+    ("landscape-12mp", (4240, 2832), 24),
+    ("portrait-12mp", (2832, 4240), 24),
+    ("detail-12mp", (4240, 2832), 64),
+    ("smooth-6mp", (3000, 2000), 4),
+)
+
+
+def build_corpus(out_dir: Path, scale: float) -> list[Path]:
+    """Generate the corpus JPEGs (q90, like a camera export) into ``out_dir``."""
+    from load_suite import synthetic_photo
+
+    paths = []
+    for i, (name, (w, h), noise) in enumerate(CORPUS):
+        size = (max(64, int(w * scale)), max(64, int(h * scale)))
+        path = out_dir / f"{name}.jpg"
+        synthetic_photo(path, seed=i, size=size, noise=noise)
+        paths.append(path)
+    return paths
+
+
+# ======================================================
+# Cases
+# ======================================================
+# كل حالة: (input, fn). input يحدد ما يُحضَّر قبل التوقيت:
+#   "file"  مسار الأصل على القرص
+#   "full"  الصورة مفكوكة بالحجم الكامل (RGB)
+#   "w1600" / "w400" الصورة مصغّرة إلى ذلك العرض
+# fn(input, out_dir) -> عدد البايتات المكتوبة (0 إن لم يكن ترميزًا)
+
+
+def _file_size(path: Path) -> int:
+    return path.stat().st_size
+
+
+def _pil_save(**params) -> Callable:
+    def fn(im, out: Path) -> int:
+        if params["format"] == "AVIF":
+            from app.services.variants import load_avif_plugin
+
+            load_avif_plugin()
+        buf = io.BytesIO()
+        im.save(buf, **params)
+        return buf.tell()
+    return fn
+
+
+def _app_saver(fmt: str) -> Callable:
+    def fn(im, out: Path) -> int:
+        from app.services.variants import _SAVERS
+
+        path = out / f"x.{fmt}"
+        _SAVERS[fmt](im, path)
+        return _file_size(path)
+    return fn
+
+
+def _decode(path: Path, draft_width: int | None = None) -> int:
+    from PIL import ImageOps
+
+    from app.services.variants import open_image
+
+    with open_image(path) as im:
+        if draft_width:
+            # فك ترميز JPEG بمقياس 1/2..1/8 مباشرة (DCT scaling) إن كان أكبر من المطلوب
+            im.draft("RGB", (draft_width, draft_width * im.height // im.width))
+        ImageOps.exif_transpose(im).convert("RGB").load()
+    return 0
+
+
+def _resize(method_name: str, width: int) -> Callable:
+    def fn(im, out: Path) -> int:
+        from PIL import Image
+
+        method = getattr(Image.Resampling, method_name)
+        im.resize((width, round(im.height * width / im.width)), method).load()
+        return 0
+    return fn
+
+
+def _app_resize(width: int) -> Callable:
+    def fn(im, out: Path) -> int:
+        from app.services.variants import _resize_fit
+
+        _resize_fit(im, width).load()
+        return 0
+    return fn
+
+
+def _app_lqip(path: Path, out: Path) -> int:
+    from app.services import thumbs
+
+    return len(thumbs.tiny_placeholder_base64(path))
+
+
+def _app_make_variants(path: Path, out: Path) -> int:
+    from app.config import settings
+    from app.services.variants import make_variants
+
+    manifest: dict = {}
+    make_variants(path, out, 1, path.stem, create=settings.EAGER_VARIANTS, manifest=manifest)
+    return sum(item[2] for item in manifest.get("items", {}).values())
+
+
+CASES: dict[str, tuple[str, Callable]] = {
+    # --- ما يستخدمه التطبيق فعليًا ---
+    "app.decode": ("file", lambda p, out: _decode(p)),
+    "app.resize.1600": ("full", _app_resize(1600)),
+    "app.resize.400": ("full", _app_resize(400)),
+    "app.encode.jpg.1600": ("w1600", _app_saver("jpg")),
+    "app.encode.webp.1600": ("w1600", _app_saver("webp")),
+    "app.encode.jpg.400": ("w400", _app_saver("jpg")),
+    "app.encode.webp.400": ("w400", _app_saver("webp")),
+    "app.encode.avif.1600": ("w1600", _app_saver("avif")),
+    "app.lqip": ("file", _app_lqip),
+    "app.make_variants": ("file", _app_make_variants),
+    # --- بدائل للمقارنة ---
+    "alt.decode.draft1600": ("file", lambda p, out: _decode(p, draft_width=1600)),
+    "alt.resize.bicubic.1600": ("full", _resize("BICUBIC", 1600)),
+    "alt.resize.reduce.1600": ("full", lambda im, out: _reduce_then_lanczos(im, 1600)),
+    "alt.jpg.q80.plain": ("w1600", _pil_save(format="JPEG", quality=80)),
+    "alt.jpg.q80.progressive": ("w1600", _pil_save(format="JPEG", quality=80, progressive=True)),
+    "alt.jpg.q80.optimize": ("w1600", _pil_save(format="JPEG", quality=80, optimize=True)),
+    "alt.jpg.q85.optimize.progressive": (
+        "w1600", _pil_save(format="JPEG", quality=85, optimize=True, progressive=True)),
+    "alt.webp.m4": ("w1600", _pil_save(format="WEBP", quality=80, method=4)),
+    "alt.webp.m2": ("w1600", _pil_save(format="WEBP", quality=80, method=2)),
+    "alt.webp.m0": ("w1600", _pil_save(format="WEBP", quality=80, method=0)),
+    "alt.avif.speed8": ("w1600", _pil_save(format="AVIF", quality=60, speed=8)),
+}
+
+
+def _reduce_then_lanczos(im, width: int) -> int:
+    from PIL import Image
+
+    # reducing_gap: تصغير صحيح سريع (box) حتى ضعفي الهدف ثم LANCZOS
+    im.resize((width, round(im.height * width / im.width)), Image.Resampling.LANCZOS,
+              reducing_gap=2.0).load()
+    return 0
+
+
+# ======================================================
+# Runner (one process per case)
+# ======================================================
+
+def _proc_status_mb(field: str) -> float | None:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> float:
+    """
+    Start a fresh peak-RSS window; returns the current RSS (MB).
+
+    ``ru_maxrss`` survives ``exec`` (a spawned child starts with the parent's
+    peak), so on Linux the high-water mark is reset through ``clear_refs``
+    and read back from ``VmHWM``.
+    """
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+        return _proc_status_mb("VmRSS") or 0.0
+    except OSError:
+        return _max_rss_mb()
+
+
+def _peak_rss() -> float:
+    return _proc_status_mb("VmHWM") or _max_rss_mb()
+
+
+def _max_rss_mb() -> float:
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _prepare(kind: str, path: Path):
+    if kind == "file":
+        return path
+    from PIL import ImageOps
+
+    from app.services.variants import _resize_fit, open_image
+
+    with open_image(path) as im:
+        im = ImageOps.exif_transpose(im).convert("RGB")
+    if kind == "full":
+        return im
+    return _resize_fit(im, int(kind[1:]))
+
+
+def _calibrate(runs: int = 5) -> float:
+    """
+    Best-of-``runs`` ms of a fixed Pillow workload (resize + JPEG encode).
+
+    Measured in the same process right around each case, so the gate can
+    compare ``ms / calib_ms`` and tolerate a faster/slower or busier runner.
+    """
+    from PIL import Image
+
+    im = Image.effect_noise((1600, 1067), 32).convert("RGB")
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        im.resize((800, 533), Image.Resampling.LANCZOS).save(io.BytesIO(), format="JPEG", quality=80)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return min(times)
+
+
+def _run_case(name: str, corpus: list[str], repeat: int, queue) -> None:
+    from PIL import Image
+
+    try:
+        kind, fn = CASES[name]
+        inputs = [_prepare(kind, Path(p)) for p in corpus]
+        with tempfile.TemporaryDirectory(prefix="imgbench-") as tmp:
+            out = Path(tmp)
+            # إحماء على صورة صغيرة: تحميل الكوديك/الإضافات خارج القياس دون رفع ذروة الذاكرة
+            tiny = out / "warmup.jpg"
+            Image.new("RGB", (64, 48), (120, 90, 60)).save(tiny, format="JPEG")
+            fn(_prepare(kind, tiny), out)
+            calib = [_calibrate()]
+            rss0 = _reset_peak_rss()
+            # لكل صورة أسرع تمرير (الأبطأ = ضجيج الجهاز لا كلفة الكود)، ثم المتوسط على العينة
+            best = [float("inf")] * len(inputs)
+            sizes, worst = [], 0.0
+            for _ in range(repeat):
+                for i, inp in enumerate(inputs):
+                    t0 = time.perf_counter()
+                    sizes.append(fn(inp, out))
+                    ms = (time.perf_counter() - t0) * 1000.0
+                    best[i], worst = min(best[i], ms), max(worst, ms)
+            peak = _peak_rss()
+            calib.append(_calibrate())
+            queue.put({
+                "ms": statistics.fmean(best),
+                "ms_max": worst,
+                "peak_mb": max(0.0, peak - rss0),
+                "bytes": int(statistics.fmean(sizes)) if any(sizes) else 0,
+                "calib_ms": statistics.fmean(calib),
+            })
+    except Exception as e:  # كوديك غير متاح (AVIF مثلًا) لا يوقف البقية
+        queue.put({"skipped": f"{type(e).__name__}: {e}"})
+
+
+def run_case(name: str, corpus: list[Path], repeat: int) -> dict:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(name, [str(p) for p in corpus], repeat, queue))
+    proc.start()
+    try:
+        result = queue.get(timeout=900)
+    finally:
+        proc.join()
+    return result
+
+
+# ======================================================
+# Gate
+# ======================================================
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Cases whose ``ms`` or ``bytes`` grew beyond ``tolerance`` (empty = pass).
+
+    The baseline ``ms`` is first rescaled by the ratio of the calibration
+    workloads, i.e. timings are compared relative to machine speed.
+    """
+    failures = []
+    for name, r in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if not base or "skipped" in r or "skipped" in base:
+            continue
+        speed = r["calib_ms"] / base["calib_ms"] if base.get("calib_ms") else 1.0
+        for metric in ("ms", "bytes"):
+            old, new = base[metric] * (speed if metric == "ms" else 1.0), r[metric]
+            if old and (new - old) / old > tolerance:
+                failures.append(f"{name}: {metric} {old:,.1f} -> {new:,.1f} ({(new - old) / old:+.0%})")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Image pipeline micro-benchmarks")
+    ap.add_argument("--only", nargs="*", help="case names or prefixes (e.g. app. alt.webp)")
+    ap.add_argument("--repeat", type=int, default=3, help="passes over the corpus per case")
+    ap.add_argument("--scale", type=float, default=1.0, help="scale corpus resolutions (CI: 0.5)")
+    ap.add_argument("--list", action="store_true", help="list cases and exit")
+    ap.add_argument("--baseline", type=Path, help="fail if results regress against this file")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth")
+    ap.add_argument("--write-baseline", type=Path, help="store the results as the new baseline")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    if args.list:
+        print("\n".join(CASES))
+        return
+    names = [n for n in CASES if not args.only or any(n.startswith(o) for o in args.only)]
+
+    results: dict = {}
+    with tempfile.TemporaryDirectory(prefix="imgcorpus-") as tmp:
+        corpus = build_corpus(Path(tmp), args.scale)
+        print(f"[i] corpus: {len(corpus)} images (scale {args.scale}), {args.repeat} passes per case")
+        for name in names:
+            results[name] = run_case(name, corpus, args.repeat)
+            r = results[name]
+            if "skipped" in r:
+                print(f"  {name:<34} skipped ({r['skipped']})")
+            else:
+                print(f"  {name:<34} {r['ms']:9.1f} ms  {r['peak_mb']:7.1f} MB  {r['bytes']:>10,} B")
+
+    report = {"config": {"repeat": args.repeat, "scale": args.scale,
+                         "corpus": [c[0] for c in CORPUS]},
+              "cases": results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    if args.write_baseline:
+        args.write_baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"[i] baseline written to {args.write_baseline}")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("config") != report["config"]:
+            print(f"[!] baseline config {baseline.get('config')} differs from this run")
+        failures = compare(results, baseline, args.tolerance)
+        if failures:
+            print(f"\n[FAIL] regressions beyond {args.tolerance:.0%}:")
+            for f in failures:
+                print("  - " + f)
+            sys.exit(1)
+        print(f"\n[OK] within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""Load suite: reproducible public-share benchmark with a regression gate.
+
+Seeds a synthetic album (``--assets`` generated photos, variants rendered
+like an upload, one open share link) in a scratch directory, starts
+``uvicorn app.main:app`` on it and drives concurrent clients at:
+
+* ``open_share``  ``GET /s/{slug}``
+* ``get_thumb``   ``GET /s/{slug}/thumb/{id}``  (random asset per request)
+* ``get_file``    ``GET /s/{slug}/file/{id}``   (random asset per request)
+* ``toggle_like`` ``POST /api/like``
+* ``zip``         ``GET /s/{slug}/zip`` (skipped while the route 404s)
+
+Each scenario reports requests/s and p50/p95/p99 latency. With
+``--baseline`` the results are compared against a stored run and the
+process exits with status 1 when a scenario regresses beyond
+``--tolerance`` (RPS lower or p95 higher) or returns errors. Short runs
+are noisy; ``--repeat`` runs each scenario several times and keeps the
+median-RPS run:
+
+    python benchmarks/load_suite.py --assets 200 --concurrency 50 --seconds 10 \\
+        --repeat 3 --baseline benchmarks/baseline.json
+    python benchmarks/load_suite.py ... --write-baseline benchmarks/baseline.json
+
+``--base-url/--slug`` run the same scenarios against an already running
+server instead (nothing is seeded). Absolute numbers depend on the machine:
+record the baseline on the same kind of runner that enforces it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from public_rps import run
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# (metric, direction): +1 = أعلى أفضل، -1 = أقل أفضل
+GATED = (("rps", +1), ("p95", -1))
+
+
+# ======================================================
+# Seeding
+# ======================================================
+
+def synthetic_photo(path: Path, seed: int, size: tuple[int, int] = (3000, 2000),
+                    noise: int = 24) -> None:
+    """A photo-like JPEG: smooth gradient + shapes + noise (compresses like a real photo)."""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rnd = random.Random(seed)
+    w, h = size
+    small = Image.new("RGB", (64, 48))
+    c0 = [rnd.randrange(256) for _ in range(3)]
+    c1 = [rnd.randrange(256) for _ in range(3)]
+    for y in range(48):
+        t = y / 47
+        small.paste(tuple(int(a + (b - a) * t) for a, b in zip(c0, c1)), (0, y, 64, y + 1))
+    im = small.resize(size, Image.BICUBIC)
+    draw = ImageDraw.Draw(im)
+    for _ in range(12):
+        x0, y0 = rnd.randrange(w), rnd.randrange(h)
+        r = rnd.randrange(h // 20, h // 4)
+        draw.ellipse((x0 - r, y0 - r, x0 + r, y0 + r),
+                     fill=tuple(rnd.randrange(256) for _ in range(3)))
+    im = im.filter(ImageFilter.GaussianBlur(3))
+    noise = Image.effect_noise(size, noise).convert("RGB")
+    im = Image.blend(im, noise, 0.12)
+    im.save(path, format="JPEG", quality=90)
+
+
+def seed(n_assets: int, size: tuple[int, int]) -> tuple[str, list[int]]:
+    """
+    Create one album with ``n_assets`` generated photos and an open share.
+
+    Runs in this process against ``DATABASE_URL``/``STORAGE_DIR`` (set by
+    the caller before ``app`` is imported). Returns ``(slug, asset_ids)``.
+    """
+    sys.path.insert(0, str(ROOT))
+    from app import models
+    from app.config import ensure_storage_dirs, settings
+    from app.database import SessionLocal
+    from app.migrate import upgrade_to_head
+    from app.services import thumbs
+    from app.services.variants import make_variants
+    from app.utils import file_sha256
+
+    ensure_storage_dirs()
+    upgrade_to_head()
+    storage = Path(settings.STORAGE_DIR)
+    with SessionLocal() as db:
+        album = models.Album(title="Load suite", photographer="bench")
+        db.add(album)
+        db.flush()
+        orig_dir = storage / "albums" / str(album.id) / "original"
+        orig_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(n_assets):
+            path = orig_dir / f"bench-{i:05d}.jpg"
+            synthetic_photo(path, seed=i, size=size)
+            manifest: dict = {}
+            variants = make_variants(path, storage, album.id, path.stem,
+                                     create=settings.EAGER_VARIANTS, manifest=manifest)
+            asset = models.Asset(
+                album_id=album.id,
+                filename=(Path("albums") / str(album.id) / "original" / path.name).as_posix(),
+                original_name=path.name, mime_type="image/jpeg",
+                size=path.stat().st_size, sha256=file_sha256(path),
+                sort_order=(i + 1) * 10, lqip=thumbs.tiny_placeholder_base64(path),
+            )
+            asset.set_variants(variants)
+            asset.update_manifest(manifest)
+            db.add(asset)
+        slug = f"bench-{os.urandom(3).hex()}"
+        db.add(models.ShareLink(album_id=album.id, slug=slug, allow_zip=True))
+        db.commit()
+        ids = [a.id for a in db.query(models.Asset).filter_by(album_id=album.id)]
+    return slug, ids
+
+
+# ======================================================
+# Server
+# ======================================================
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, env: dict) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with status {proc.returncode}")
+        try:
+            with urllib.request.urlopen(base + "/admin/theme/config", timeout=2):
+                return proc, base
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit("server did not become ready in 60s")
+
+
+def _status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+# ======================================================
+# Scenarios + gate
+# ======================================================
+
+def scenarios(base: str, slug: str, ids: list[int]) -> list[tuple[str, object, bytes | None]]:
+    pick = random.Random(0).choice
+    like = json.dumps({"url": f"/s/{slug}/file/{ids[0]}", "liked": True}).encode()
+    return [
+        ("open_share", f"{base}/s/{slug}", None),
+        ("get_thumb", lambda: f"{base}/s/{slug}/thumb/{pick(ids)}", None),
+        ("get_file", lambda: f"{base}/s/{slug}/file/{pick(ids)}", None),
+        ("toggle_like", f"{base}/api/like", like),
+        ("zip", f"{base}/s/{slug}/zip", None),
+    ]
+
+
+def errors(codes: dict) -> int:
+    return sum(n for code, n in codes.items() if not (isinstance(code, int) and code < 400))
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Human-readable regressions of ``results`` against ``baseline`` (empty = pass)."""
+    failures = []
+    for name, r in results.items():
+        if r.get("skipped"):
+            continue
+        if r["errors"]:
+            failures.append(f"{name}: {r['errors']} error responses {r['codes']}")
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for metric, direction in GATED:
+            old, new = base[metric], r[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            if direction * change < -tolerance:
+                failures.append(f"{name}: {metric} {old:.1f} -> {new:.1f} ({change:+.0%})")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Public share load suite with a regression gate")
+    ap.add_argument("--assets", type=int, default=100, help="photos in the seeded album")
+    ap.add_argument("--photo-size", default="3000x2000", help="WxH of generated photos")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    ap.add_argument("--concurrency", type=int, default=50)
+    ap.add_argument("--seconds", type=float, default=10.0, help="duration per scenario")
+    ap.add_argument("--repeat", type=int, default=1,
+                    help="runs per scenario; the median-RPS run is reported")
+    ap.add_argument("--only", nargs="*", help="run only these scenarios")
+    ap.add_argument("--base-url", help="use a running server instead of seeding one")
+    ap.add_argument("--slug", help="open share on --base-url")
+    ap.add_argument("--asset-ids", help="comma-separated asset ids in that share")
+    ap.add_argument("--baseline", type=Path, help="fail if results regress against this file")
+    ap.add_argument("--tolerance", type=float, default=0.30, help="allowed relative regression")
+    ap.add_argument("--write-baseline", type=Path, help="store the results as the new baseline")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    server = None
+    workdir = None
+    if args.base_url:
+        if not (args.slug and args.asset_ids):
+            ap.error("--base-url needs --slug and --asset-ids")
+        base, slug = args.base_url.rstrip("/"), args.slug
+        ids = [int(x) for x in args.asset_ids.split(",")]
+    else:
+        workdir = tempfile.TemporaryDirectory(prefix="loadsuite-")
+        tmp = Path(workdir.name)
+        # يجب ضبطها قبل استيراد app (الإعدادات تُقرأ عند الاستيراد)؛ الخادم يرثها
+        os.environ.update({
+            "DATABASE_URL": f"sqlite:///{tmp / 'app.db'}",
+            "STORAGE_DIR": str(tmp / "storage"),
+            "THUMBS_DIR": str(tmp / "storage" / "_thumbs"),
+            "ENABLE_AVIF": "false",
+            "USE_GDRIVE": "false",
+        })
+        os.environ.setdefault("ADMIN_PASSWORD", "bench")
+        w, h = (int(x) for x in args.photo_size.lower().split("x"))
+        t0 = time.perf_counter()
+        slug, ids = seed(args.assets, (w, h))
+        print(f"[i] seeded {len(ids)} assets in {time.perf_counter() - t0:.1f}s")
+        server, base = start_server(args.workers, os.environ.copy())
+
+    config = {"assets": len(ids), "workers": args.workers, "concurrency": args.concurrency,
+              "seconds": args.seconds, "repeat": args.repeat}
+    results: dict = {}
+    try:
+        for name, url, body in scenarios(base, slug, ids):
+            if args.only and name not in args.only:
+                continue
+            probe = url() if callable(url) else url
+            if body is None and _status(probe) == 404:
+                print(f"[i] {name}: skipped ({probe} -> 404)")
+                results[name] = {"skipped": True}
+                continue
+            print(f"[i] {name}: {args.concurrency} clients for {args.seconds:.0f}s x{args.repeat}")
+            runs = sorted((run(url, body, args.concurrency, args.seconds)
+                           for _ in range(args.repeat)), key=lambda r: r["rps"])
+            r = runs[len(runs) // 2]
+            r["errors"] = sum(errors(x["codes"]) for x in runs)
+            r["codes"] = {str(k): v for k, v in r["codes"].items()}
+            results[name] = r
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+        if workdir:
+            workdir.cleanup()
+
+    report = {"config": config, "scenarios": results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("\n=== Load suite ===")
+        for name, r in results.items():
+            if r.get("skipped"):
+                print(f"{name:<12} skipped")
+                continue
+            print(f"{name:<12} rps={r['rps']:8.1f}  p50={r['p50']:7.1f}ms  p95={r['p95']:7.1f}ms  "
+                  f"p99={r['p99']:7.1f}ms  errors={r['errors']}")
+
+    if args.write_baseline:
+        args.write_baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"[i] baseline written to {args.write_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("config") != config:
+            print(f"[!] baseline config {baseline.get('config')} differs from this run {config}")
+        failures = compare(results, baseline, args.tolerance)
+        if failures:
+            print(f"\n[FAIL] regressions beyond {args.tolerance:.0%}:")
+            for f in failures:
+                print("  - " + f)
+            sys.exit(1)
+        print(f"\n[OK] within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
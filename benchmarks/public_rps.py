@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Load test: requests per second on the public share endpoints.
+
+Fires a fixed number of concurrent clients at the gallery page, the
+thumbnail route, the original-file route and ``/api/like`` for a few
+seconds each, then prints RPS and latency percentiles per endpoint.
+
+To compare the sync and async database paths, run it once against a server
+started from the commit before the async port and once against the current
+tree, with the same ``--concurrency`` and worker count:
+
+    uvicorn app.main:app --workers 1 --port 8000
+    python benchmarks/public_rps.py --base-url http://127.0.0.1:8000 \\
+        --slug my-open-efgh --asset-id 1 --concurrency 200
+
+With sync routes concurrency is capped by Starlette's threadpool (40
+threads per worker); the async routes keep serving from the event loop, so
+RPS at high concurrency is what to watch.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Callable, Union
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+def _request(url: str, body: bytes | None) -> tuple[float, int | str]:
+    headers = {"Content-Type": "application/json"} if body else {}
+    req = urllib.request.Request(url, data=body, headers=headers,
+                                 method="POST" if body else "GET")
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            resp.read()
+            code = resp.status
+    except urllib.error.HTTPError as e:
+        code = e.code
+    except Exception:
+        code = "error"
+    return (time.perf_counter() - t0) * 1000.0, code
+
+
+def run(url: Union[str, Callable[[], str]], body: bytes | None, concurrency: int,
+        seconds: float) -> dict:
+    """
+    Hammer ``url`` from ``concurrency`` threads for ``seconds``.
+
+    ``url`` may be a callable returning a fresh URL per request (e.g. a
+    random asset of the album) instead of a fixed string.
+    """
+    next_url = url if callable(url) else (lambda: url)
+    latencies: list[float] = []
+    codes: dict = {}
+    lock = threading.Lock()
+    end = time.monotonic() + seconds
+
+    def worker():
+        local, local_codes = [], {}
+        while time.monotonic() < end:
+            ms, code = _request(next_url(), body)
+            local.append(ms)
+            local_codes[code] = local_codes.get(code, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for k, v in local_codes.items():
+                codes[k] = codes.get(k, 0) + v
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": _pct(latencies, 50),
+        "p95": _pct(latencies, 95),
+        "p99": _pct(latencies, 99),
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+        "codes": codes,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="RPS of the public share endpoints")
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--slug", required=True, help="open (not password protected) share slug")
+    ap.add_argument("--asset-id", type=int, required=True, help="asset inside that share")
+    ap.add_argument("--concurrency", type=int, default=100, help="concurrent client threads")
+    ap.add_argument("--seconds", type=float, default=10.0, help="duration per endpoint")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    base = args.base_url.rstrip("/")
+    like = json.dumps({"url": f"/s/{args.slug}/file/{args.asset_id}", "liked": True}).encode()
+    targets = [
+        ("open_share", f"{base}/s/{args.slug}", None),
+        ("get_thumb", f"{base}/s/{args.slug}/thumb/{args.asset_id}", None),
+        ("get_file", f"{base}/s/{args.slug}/file/{args.asset_id}", None),
+        ("toggle_like", f"{base}/api/like", like),
+    ]
+
+    results = {}
+    for name, url, body in targets:
+        print(f"[i] {name}: {args.concurrency} clients for {args.seconds:.0f}s")
+        results[name] = run(url, body, args.concurrency, args.seconds)
+
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+        return
+    print("\n=== Public endpoints ===")
+    for name, r in results.items():
+        print(
+            f"{name:<12} rps={r['rps']:8.1f}  p50={r['p50']:7.1f}ms  p95={r['p95']:7.1f}ms  "
+            f"p99={r['p99']:7.1f}ms  codes={dict(sorted(r['codes'].items(), key=str))}"
+        )
+
+
+if __name__ == "__main__":
+    main()
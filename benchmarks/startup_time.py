@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Benchmark: cold-start time of one worker (import + lifespan startup).
+
+Each run starts a fresh interpreter with ``python -X importtime``, imports
+``app.main`` and enters the app lifespan exactly like a gunicorn/uvicorn
+worker does, then exits. Reported per run:
+
+* ``import_ms``   wall time of ``import app.main``
+* ``lifespan_ms`` wall time of the lifespan startup (storage dirs, schema)
+* the modules with the largest self/cumulative import time, parsed from
+  the ``-X importtime`` output of the last run
+
+Usage:
+    python benchmarks/startup_time.py --runs 5
+    python benchmarks/startup_time.py --runs 10 --json > startup.json
+
+Set ``DATABASE_URL``/``STORAGE_DIR`` to a scratch location; the lifespan
+creates the storage dirs and (with ``AUTO_MIGRATE``) migrates the schema.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_PROBE = """
+import asyncio, json, time
+t0 = time.perf_counter()
+import app.main as m
+t1 = time.perf_counter()
+async def _startup():
+    async with m.lifespan(m.app):
+        return time.perf_counter()
+t2 = asyncio.run(_startup())
+print("@@STARTUP@@" + json.dumps({"import_ms": (t1 - t0) * 1000, "lifespan_ms": (t2 - t1) * 1000}))
+"""
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """Parse ``-X importtime`` lines into ``(module, self_us, cumulative_us)``."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            _, rest = line.split(":", 1)
+            self_us, cum_us, name = (part.strip() for part in rest.split("|", 2))
+            rows.append((name, int(self_us), int(cum_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def run_once(python: str) -> tuple[dict, list[tuple[str, int, int]]]:
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", _PROBE],
+        cwd=ROOT, capture_output=True, text=True, env=os.environ.copy(), check=False,
+    )
+    marker = next((l for l in proc.stdout.splitlines() if l.startswith("@@STARTUP@@")), None)
+    if proc.returncode != 0 or marker is None:
+        sys.stderr.write(proc.stderr[-2000:])
+        raise SystemExit(f"startup probe failed (exit {proc.returncode})")
+    return json.loads(marker[len("@@STARTUP@@"):]), parse_importtime(proc.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cold-start time of one app worker")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    ap.add_argument("--python", default=sys.executable)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    timings, modules = [], []
+    for _ in range(args.runs):
+        t, modules = run_once(args.python)
+        timings.append(t)
+
+    imp = [t["import_ms"] for t in timings]
+    life = [t["lifespan_ms"] for t in timings]
+    total = [a + b for a, b in zip(imp, life)]
+    by_self = sorted(modules, key=lambda r: r[1], reverse=True)[: args.top]
+    app_mods = sorted((r for r in modules if r[0].lstrip().startswith("app")),
+                      key=lambda r: r[2], reverse=True)[: args.top]
+
+    result = {
+        "runs": args.runs,
+        "import_ms": {"median": statistics.median(imp), "min": min(imp), "max": max(imp)},
+        "lifespan_ms": {"median": statistics.median(life), "min": min(life), "max": max(life)},
+        "total_ms": {"median": statistics.median(total)},
+        "modules_imported": len(modules),
+        "top_self": [{"module": n.strip(), "self_ms": s / 1000, "cumulative_ms": c / 1000}
+                     for n, s, c in by_self],
+        "app_cumulative": [{"module": n.strip(), "cumulative_ms": c / 1000} for n, _, c in app_mods],
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"=== Worker cold start ({args.runs} runs) ===")
+    print(f"import app.main : median {result['import_ms']['median']:7.1f}ms "
+          f"(min {result['import_ms']['min']:.1f}, max {result['import_ms']['max']:.1f})")
+    print(f"lifespan start  : median {result['lifespan_ms']['median']:7.1f}ms")
+    print(f"total           : median {result['total_ms']['median']:7.1f}ms  "
+          f"({result['modules_imported']} modules)")
+    print(f"\nSlowest imports (self time, last run):")
+    for row in result["top_self"]:
+        print(f"  {row['self_ms']:8.1f}ms  {row['cumulative_ms']:8.1f}ms cum  {row['module']}")
+    print(f"\napp.* modules (cumulative):")
+    for row in result["app_cumulative"]:
+        print(f"  {row['cumulative_ms']:8.1f}ms  {row['module']}")
+
+
+if __name__ == "__main__":
+    main()
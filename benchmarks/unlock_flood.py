@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Load test: gallery latency while /s/<slug>/unlock is being brute-forced.
+
+Measures GET latency of a public gallery page first on an idle server, then
+while attacker threads hammer ``POST /s/<slug>/unlock`` with wrong
+passwords. With the bounded bcrypt pool and the per-slug/IP limiter the
+two latency distributions should stay close; before that change the
+unlock burst tied up the Starlette threadpool and gallery p95 exploded.
+
+Run against a live server (e.g. ``uvicorn app.main:app --workers 1``):
+
+    python benchmarks/unlock_flood.py --base-url http://127.0.0.1:8000 \\
+        --locked-slug my-protected-abcd --gallery-slug my-open-efgh
+
+Notes:
+    * Attacker threads use spoofed ``X-Forwarded-For`` values only when
+      ``--spread-ips`` is given (and the server trusts proxy headers);
+      otherwise every attempt comes from one IP and is cut off quickly.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+def _get(url: str) -> float:
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            resp.read()
+    except urllib.error.HTTPError:
+        pass
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+def measure(url: str, seconds: float, interval: float) -> list[float]:
+    """Sample GET latency (ms) of ``url`` for ``seconds``."""
+    out = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        out.append(_get(url))
+        time.sleep(interval)
+    return out
+
+
+def attacker(url: str, stop: threading.Event, counts: dict, idx: int, spread_ips: bool) -> None:
+    """POST wrong passwords until ``stop`` is set, counting response codes."""
+    body = urllib.parse.urlencode({"password": "wrong-password"}).encode()
+    n = 0
+    while not stop.is_set():
+        n += 1
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        if spread_ips:
+            headers["X-Forwarded-For"] = f"10.{idx % 250}.{(n // 250) % 250}.{n % 250}"
+        req = urllib.request.Request(url, data=body, method="POST", headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                code = resp.status
+        except urllib.error.HTTPError as e:
+            code = e.code
+        except Exception:
+            code = "error"
+        counts[code] = counts.get(code, 0) + 1
+
+
+def report(label: str, samples: list[float]) -> None:
+    print(
+        f"{label:<10} n={len(samples):<5} p50={_pct(samples, 50):7.1f}ms "
+        f"p95={_pct(samples, 95):7.1f}ms p99={_pct(samples, 99):7.1f}ms "
+        f"mean={statistics.fmean(samples) if samples else 0:7.1f}ms"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Gallery latency under an unlock brute-force burst")
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--locked-slug", required=True, help="password-protected share to attack")
+    ap.add_argument("--gallery-slug", required=True, help="open share whose page latency is measured")
+    ap.add_argument("--attackers", type=int, default=64, help="concurrent attacker threads")
+    ap.add_argument("--seconds", type=float, default=15.0, help="duration of each phase")
+    ap.add_argument("--interval", type=float, default=0.05, help="pause between gallery probes")
+    ap.add_argument("--spread-ips", action="store_true", help="vary X-Forwarded-For per attempt")
+    args = ap.parse_args()
+
+    base = args.base_url.rstrip("/")
+    gallery = f"{base}/s/{args.gallery_slug}"
+    unlock = f"{base}/s/{args.locked_slug}/unlock"
+
+    print(f"[i] baseline: probing {gallery} for {args.seconds:.0f}s")
+    idle = measure(gallery, args.seconds, args.interval)
+
+    print(f"[i] flood: {args.attackers} attackers on {unlock}")
+    stop = threading.Event()
+    counts: dict = {}
+    threads = [
+        threading.Thread(target=attacker, args=(unlock, stop, counts, i, args.spread_ips), daemon=True)
+        for i in range(args.attackers)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(1.0)  # دع الهجوم يبلغ ذروته
+    flood = measure(gallery, args.seconds, args.interval)
+    stop.set()
+    for t in threads:
+        t.join(timeout=35)
+
+    print("\n=== Gallery latency ===")
+    report("idle", idle)
+    report("flood", flood)
+    total = sum(counts.values())
+    print(f"\nUnlock attempts: {total}  by status: {dict(sorted(counts.items(), key=str))}")
+    if idle and flood:
+        ratio = _pct(flood, 95) / max(_pct(idle, 95), 0.001)
+        print(f"p95 ratio flood/idle: {ratio:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
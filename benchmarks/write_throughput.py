@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Load test: write throughput under concurrency (SQLite vs Postgres).
+
+Two modes:
+
+* ``http`` (default): N client threads POST ``/api/like`` to a running
+  server, so the full stack is measured (gunicorn workers, pools, driver).
+
+      gunicorn -c gunicorn.conf.py app.main:app
+      python benchmarks/write_throughput.py --base-url http://127.0.0.1:8000 \\
+          --concurrency 64 --seconds 20
+
+* ``direct``: N processes (standing in for gunicorn workers) insert likes
+  through ``app.database.SessionLocal`` against ``DATABASE_URL``, no HTTP.
+
+      DATABASE_URL=postgresql://u:p@localhost/dichfoto \\
+          python benchmarks/write_throughput.py --mode direct --concurrency 8
+
+Run both against the SQLite default and a Postgres ``DATABASE_URL``: with
+SQLite every write is serialized on the database file lock (throughput
+stays flat and ``database is locked`` errors appear as concurrency grows),
+with Postgres it should scale with the number of workers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+# --mode direct يستورد app/ من جذر المستودع (العمليات الفرعية تعيد استيراد هذا الملف)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+def _http_worker(url: str, end: float, idx: int, out: list, lock: threading.Lock) -> None:
+    lat, ok, err = [], 0, 0
+    n = 0
+    while time.monotonic() < end:
+        n += 1
+        body = json.dumps({"url": f"/bench/{idx}/{n}", "liked": True}).encode()
+        req = urllib.request.Request(url, data=body, method="POST",
+                                     headers={"Content-Type": "application/json"})
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                resp.read()
+            ok += 1
+        except (urllib.error.HTTPError, urllib.error.URLError, OSError):
+            err += 1
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    with lock:
+        out.append((lat, ok, err))
+
+
+def _direct_worker(seconds: float, idx: int, queue) -> None:
+    # يُستورد داخل العملية: كل عملية تبني محركها وpool الخاص بها مثل عامل gunicorn
+    lat, ok, err = [], 0, 0
+    try:
+        from app.database import SessionLocal
+        from app import models
+    except Exception as e:
+        print(f"[!] writer {idx}: {e}", file=sys.stderr)
+        queue.put((lat, ok, 1))
+        return
+    end = time.monotonic() + seconds
+    n = 0
+    while time.monotonic() < end:
+        n += 1
+        t0 = time.perf_counter()
+        try:
+            with SessionLocal() as db:
+                db.add(models.Like(url=f"/bench/{idx}/{n}", liked=True))
+                db.commit()
+            ok += 1
+        except Exception:
+            err += 1
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    queue.put((lat, ok, err))
+
+
+def run_http(base_url: str, concurrency: int, seconds: float) -> list:
+    url = base_url.rstrip("/") + "/api/like"
+    out: list = []
+    lock = threading.Lock()
+    end = time.monotonic() + seconds
+    threads = [threading.Thread(target=_http_worker, args=(url, end, i, out, lock), daemon=True)
+               for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out
+
+
+def run_direct(concurrency: int, seconds: float) -> list:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_direct_worker, args=(seconds, i, queue)) for i in range(concurrency)]
+    for p in procs:
+        p.start()
+    out = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Write throughput under concurrency")
+    ap.add_argument("--mode", choices=("http", "direct"), default="http")
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000", help="server for --mode http")
+    ap.add_argument("--concurrency", type=int, default=32, help="client threads / writer processes")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    args = ap.parse_args()
+
+    print(f"[i] {args.mode}: {args.concurrency} writers for {args.seconds:.0f}s")
+    started = time.perf_counter()
+    if args.mode == "http":
+        parts = run_http(args.base_url, args.concurrency, args.seconds)
+    else:
+        parts = run_direct(args.concurrency, args.seconds)
+    elapsed = time.perf_counter() - started
+
+    latencies = [ms for lat, _, _ in parts for ms in lat]
+    ok = sum(p[1] for p in parts)
+    err = sum(p[2] for p in parts)
+    print("\n=== Writes ===")
+    print(f"committed={ok}  errors={err}  writes/s={ok / elapsed:.1f}")
+    if latencies:
+        print(f"p50={_pct(latencies, 50):.1f}ms  p95={_pct(latencies, 95):.1f}ms  "
+              f"p99={_pct(latencies, 99):.1f}ms  mean={statistics.fmean(latencies):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Gunicorn settings for production (``gunicorn -c gunicorn.conf.py app.main:app``).
+
+Every value can be overridden from the environment (``WEB_CONCURRENCY``,
+``GUNICORN_BIND`` ...) or the command line.
+
+* The schema is migrated once in the master (``on_starting``) before any
+  worker imports the app; ``AUTO_MIGRATE`` is False in the prod config so
+  workers never race each other on ``alembic upgrade``. The app itself has
+  no import-time side effects; per-worker setup lives in its lifespan.
+* With ``preload_app`` the master imports the app (and may open DB
+  connections); ``post_fork`` drops the inherited pools so each worker
+  opens its own connections.
+* Prometheus multiprocess mode: every process writes its metrics to
+  ``PROMETHEUS_MULTIPROC_DIR`` (set here, before the app imports
+  prometheus_client) and ``/metrics`` merges them; the directory is wiped
+  on start and dead workers are marked in ``child_exit``.
+"""
+
+import multiprocessing
+import os
+import shutil
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/dichfoto-prometheus")
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))   # رفع الصور الكبيرة
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = 200
+accesslog = "-"
+
+
+def on_starting(server):
+    """
+    One-time work in the master, before any worker is forked: storage dirs,
+    ``alembic upgrade head`` and importing heavy libraries (PIL plugins,
+    Google client) so workers inherit them instead of loading them again.
+    """
+    # قيم العمال السابقين (قبل إعادة التشغيل) لا تُجمع مع الجدد
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+    from PIL import Image
+
+    from app.config import check_settings, ensure_storage_dirs, settings
+    from app.migrate import upgrade_to_head
+
+    ensure_storage_dirs()
+    check_settings()
+    upgrade_to_head()
+    server.log.info("database schema is up to date")
+
+    Image.init()
+    if settings.USE_GDRIVE:
+        from app.services import gdrive
+
+        gdrive.preload()
+
+
+def post_fork(server, worker):
+    """Give each worker fresh connection pools instead of the master's."""
+    from app.database import reset_pools_after_fork
+
+    reset_pools_after_fork()
+
+
+def child_exit(server, worker):
+    """Drop the live gauges (in-flight requests) of a worker that exited."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
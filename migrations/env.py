@@ -0,0 +1,56 @@
+"""Alembic environment: runs migrations against ``settings.DATABASE_URL``."""
+
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.database import DATABASE_URL, Base, engine
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+
+# لا تُعِد ضبط السجلات عند الاستدعاء من داخل التطبيق (app/migrate.py)
+if config.config_file_name is not None and not config.attributes.get("embedded"):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Emit SQL to stdout instead of executing it (``alembic upgrade head --sql``)."""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=DATABASE_URL.startswith("sqlite"),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Run migrations on a connection from the app's engine."""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+    with engine.connect() as conn:
+        _run(conn)
+
+
+def _run(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",  # SQLite: ALTER عبر نسخ الجدول
+        compare_type=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
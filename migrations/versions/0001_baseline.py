@@ -0,0 +1,151 @@
+"""baseline schema (albums, share_links, assets, likes)
+
+Replaces ``Base.metadata.create_all`` and ``migrate_updated_at.py``. On an
+empty database it creates every table. On a database that was created by
+``create_all`` before migrations existed it only adds the columns that
+``migrate_updated_at.py`` used to add, so ``alembic upgrade head`` adopts
+existing installs without a separate ``stamp``.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-10-01
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# الأعمدة التي كان migrate_updated_at.py يضيفها لقواعد create_all القديمة
+_LEGACY_COLUMNS = {
+    "albums": [sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now())],
+    "share_links": [sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now())],
+    "likes": [sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now())],
+    "assets": [
+        sa.Column("variants_manifest", sa.Text(), nullable=True),
+        sa.Column("sha256", sa.String(length=64), nullable=True),
+    ],
+}
+
+
+def _adopt_existing(inspector) -> None:
+    for table, columns in _LEGACY_COLUMNS.items():
+        present = {c["name"] for c in inspector.get_columns(table)}
+        for col in columns:
+            if col.name in present:
+                continue
+            # SQLite لا يقبل ADD COLUMN بقيمة افتراضية غير ثابتة (now())
+            if op.get_bind().dialect.name == "sqlite":
+                col = sa.Column(col.name, col.type, nullable=True)
+            op.add_column(table, col)
+            if col.name == "updated_at":
+                op.execute(f"UPDATE {table} SET updated_at = created_at WHERE updated_at IS NULL")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "albums" in inspector.get_table_names():
+        _adopt_existing(inspector)
+        return
+
+    sqlite = bind.dialect.name == "sqlite"
+
+    # albums.cover_asset_id ↔ assets.album_id حلقة مفاتيح: SQLite يقبل المرجع
+    # المسبق داخل CREATE TABLE، أما Postgres فيُضاف القيد بعد إنشاء assets.
+    album_fks = [sa.ForeignKeyConstraint(["cover_asset_id"], ["assets.id"],
+                                         name="fk_albums_cover_asset_id", ondelete="SET NULL")] if sqlite else []
+    op.create_table(
+        "albums",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("photographer", sa.String(), nullable=True),
+        sa.Column("photographer_url", sa.String(length=255), nullable=True),
+        sa.Column("event_date", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("cover_asset_id", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        *album_fks,
+    )
+    op.create_index("ix_albums_id", "albums", ["id"])
+    op.create_index("ix_albums_cover_asset_id", "albums", ["cover_asset_id"])
+
+    op.create_table(
+        "assets",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("album_id", sa.Integer(), nullable=True),
+        sa.Column("sort_order", sa.Integer(), nullable=True),
+        sa.Column("filename", sa.String(length=255), nullable=False),
+        sa.Column("original_name", sa.String(length=255), nullable=False),
+        sa.Column("mime_type", sa.String(length=128), nullable=True),
+        sa.Column("size", sa.Integer(), nullable=True),
+        sa.Column("sha256", sa.String(length=64), nullable=True),
+        sa.Column("width", sa.Integer(), nullable=True),
+        sa.Column("height", sa.Integer(), nullable=True),
+        sa.Column("lqip", sa.Text(), nullable=True),
+        *[
+            sa.Column(f"{ext}_{w}", sa.String(length=255), nullable=True)
+            for ext in ("jpg", "webp", "avif")
+            for w in (480, 960, 1280, 1920)
+        ],
+        sa.Column("variants_manifest", sa.Text(), nullable=True),
+        sa.Column("gdrive_file_id", sa.String(length=255), nullable=True),
+        sa.Column("gdrive_thumb_id", sa.String(length=255), nullable=True),
+        sa.Column("is_hidden", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["album_id"], ["albums.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_assets_id", "assets", ["id"])
+    op.create_index("ix_assets_album_id", "assets", ["album_id"])
+    op.create_index("ix_assets_created_at", "assets", ["created_at"])
+    op.create_index("ix_assets_updated_at", "assets", ["updated_at"])
+
+    if not sqlite:
+        op.create_foreign_key("fk_albums_cover_asset_id", "albums", "assets",
+                              ["cover_asset_id"], ["id"], ondelete="SET NULL")
+
+    op.create_table(
+        "share_links",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("album_id", sa.Integer(), nullable=True),
+        sa.Column("slug", sa.String(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=True),
+        sa.Column("password_hash", sa.String(), nullable=True),
+        sa.Column("allow_zip", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["album_id"], ["albums.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_share_links_id", "share_links", ["id"])
+    op.create_index("ix_share_links_album_id", "share_links", ["album_id"])
+    op.create_index("ix_share_links_slug", "share_links", ["slug"], unique=True)
+
+    op.create_table(
+        "likes",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("url", sa.String(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("liked", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_likes_id", "likes", ["id"])
+    op.create_index("ix_likes_url", "likes", ["url"])
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        op.drop_constraint("fk_albums_cover_asset_id", "albums", type_="foreignkey")
+    op.drop_table("likes")
+    op.drop_table("share_links")
+    op.drop_table("assets")
+    op.drop_table("albums")
@@ -0,0 +1,23 @@
+"""albums.encoding_profile (per-album encoding profile override)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("albums", sa.Column("encoding_profile", sa.String(length=16), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("albums") as batch:
+        batch.drop_column("encoding_profile")
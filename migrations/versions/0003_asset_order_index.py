@@ -0,0 +1,21 @@
+"""assets(album_id, sort_order) index for gap-based ordering
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_assets_album_order", "assets", ["album_id", "sort_order"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_assets_album_order", table_name="assets")
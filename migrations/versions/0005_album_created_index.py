@@ -0,0 +1,21 @@
+"""albums.created_at index for the paginated admin album list
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_albums_created_at", "albums", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_albums_created_at", table_name="albums")
@@ -0,0 +1,40 @@
+"""analytics events log and daily counters
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "analytics_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("ts", sa.DateTime(), nullable=False),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("share_id", sa.Integer(), nullable=False),
+        sa.Column("asset_id", sa.Integer(), nullable=True),
+    )
+    op.create_index("ix_analytics_events_ts", "analytics_events", ["ts"])
+    op.create_table(
+        "analytics_daily",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("share_id", sa.Integer(), primary_key=True),
+        sa.Column("asset_id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(length=16), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("analytics_daily")
+    op.drop_index("ix_analytics_events_ts", table_name="analytics_events")
+    op.drop_table("analytics_events")
@@ -0,0 +1,29 @@
+"""assets.sort_order NOT NULL so ordering reads ix_assets_album_order directly
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # COALESCE(sort_order, 0) في ORDER BY لا يستعمل الفهرس (album_id, sort_order)؛
+    # نملأ القيم الفارغة بنفس القيمة ثم نمنعها فيصبح الترتيب على العمود نفسه.
+    op.execute("UPDATE assets SET sort_order = 0 WHERE sort_order IS NULL")
+    with op.batch_alter_table("assets") as batch:
+        batch.alter_column("sort_order", existing_type=sa.Integer(), nullable=False,
+                           server_default="0")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("assets") as batch:
+        batch.alter_column("sort_order", existing_type=sa.Integer(), nullable=True,
+                           server_default=None)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Find (and optionally delete) storage objects no database row points to.
+
+Deleting assets or albums queues their files and Drive objects as
+tombstones that the per-worker collector removes (``app/services/gc.py``).
+This script covers what happened before that existed or outside the app:
+it scans ``STORAGE_DIR/albums`` and ``THUMBS_DIR/albums`` (and with
+``--drive`` the ``albums`` folder under ``GDRIVE_ROOT_FOLDER_ID``) for
+files and album folders that no asset or album owns. Objects younger than
+``--min-age`` minutes are skipped so in-flight uploads are never touched.
+
+By default it only reports. ``--apply`` tombstones the orphans so they are
+deleted with the collector's retries; ``--collect`` also drains every due
+tombstone right away (useful with ``GC_INTERVAL_SECONDS=0``).
+
+Examples:
+    python reconcile_storage.py
+    python reconcile_storage.py --drive --apply
+    python reconcile_storage.py --apply --collect --min-age 10
+    python reconcile_storage.py --collect
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from app import models
+from app.config import ensure_storage_dirs, settings
+from app.database import SessionLocal
+from app.services import gc
+
+
+def main():
+    """Parse arguments, scan for orphans and optionally queue / collect them."""
+    ap = argparse.ArgumentParser(description="Reconcile local storage and Drive with the database")
+    ap.add_argument("--drive", action="store_true", help="also scan Google Drive")
+    ap.add_argument("--apply", action="store_true", help="tombstone the orphans found")
+    ap.add_argument("--collect", action="store_true", help="drain all due tombstones now")
+    ap.add_argument("--min-age", type=int, default=60,
+                    help="ignore objects modified within this many minutes")
+    ap.add_argument("--limit", type=int, default=50, help="orphans to list per source")
+    args = ap.parse_args()
+    if args.drive and not settings.USE_GDRIVE:
+        ap.error("--drive needs USE_GDRIVE=True")
+
+    ensure_storage_dirs()
+    db = SessionLocal()
+    try:
+        report = gc.reconcile(db, drive=args.drive, apply=args.apply,
+                              min_age=timedelta(minutes=args.min_age))
+        for p in report["local"][:args.limit]:
+            print(f"[local] {p}")
+        for file_id, path in report["drive"][:args.limit]:
+            print(f"[drive] {path} ({file_id})")
+        print(f"\nLocal orphans: {len(report['local'])}  Drive orphans: {len(report['drive'])}"
+              f"  Queued: {report['queued']}")
+
+        if args.collect:
+            totals = gc.drain(db)
+            print(f"Collected: {totals['deleted']} deleted, {totals['failed']} failed")
+
+        T = models.Tombstone
+        pending, stuck = db.execute(select(
+            func.count(T.id),
+            func.count(T.id).filter(T.attempts >= settings.GC_MAX_ATTEMPTS),
+        )).one()
+        print(f"Tombstones pending: {pending}  given up (attempts >= {settings.GC_MAX_ATTEMPTS}): {stuck}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
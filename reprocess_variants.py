@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Regenerate image variants for the whole library.
+
+Walks every asset (or a single album), works out which thumb/disp/big
+variants are missing or older than their original, and renders them in a
+process pool so all cores are used. Intended to be run after changing
+``SIZES``/quality in ``app/services/variants.py`` or enabling AVIF.
+Every processed asset gets its variant manifest refreshed; with ``--stale``
+only assets whose manifest was written by an older ``PIPELINE_VERSION``,
+with another encoding profile than their album's (``ENCODING_PROFILES``),
+or that have no manifest yet are selected, and those are fully
+re-rendered with the album's profile.
+
+Progress is checkpointed to a JSON file after each batch, so an interrupted
+run resumes where it stopped. The checkpoint records the run's options
+(``--album``, ``--kinds``, ``--formats``, ``--force``, ``--stale`` and the
+pipeline version) and is only resumed by a run with the same options; it is
+deleted once a run completes. Work can be throttled with ``--rate`` (assets
+per second), ``--max-load`` (pause while the 1-minute load average is above
+the threshold) and ``--nice`` (lower worker priority).
+
+Examples:
+    python reprocess_variants.py
+    python reprocess_variants.py --album 12 --force
+    python reprocess_variants.py --stale
+    python reprocess_variants.py --workers 2 --rate 5 --max-load 3 --nice 10
+    python reprocess_variants.py --reset
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.config import ensure_storage_dirs, settings
+from app.database import SessionLocal
+from app import models
+from app.services.variants import (
+    PIPELINE_VERSION, SIZES, describe_variant, expected_variants, manifest_profile,
+    render_variants, resolve_profile,
+)
+
+
+DEFAULT_CHECKPOINT = Path(settings.STORAGE_DIR) / ".reprocess_checkpoint.json"
+
+
+def load_checkpoint(path: Path, options: dict) -> int:
+    """Return the last fully processed asset id of an interrupted run with the
+    same ``options`` (0 if none)."""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return 0
+    if data.get("options") != options:
+        # تشغيل بخيارات أخرى (أو نسخة خط معالجة أخرى): لا يُستأنف
+        if data.get("last_id"):
+            print(f"[i] ignoring checkpoint of another run: {data.get('options')}")
+        return 0
+    try:
+        return int(data.get("last_id", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def save_checkpoint(path: Path, last_id: int, stats: dict, options: dict) -> None:
+    """Atomically persist the checkpoint so a crash never leaves it half-written."""
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"last_id": last_id, "options": options, **stats}), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def run_options(album: int | None, kinds: list[str], formats: list[str],
+                force: bool, stale: bool) -> dict:
+    """The options that decide which assets and variants a run touches."""
+    return {"album": album, "kinds": sorted(kinds), "formats": sorted(formats),
+            "force": force, "stale": stale, "pipeline": PIPELINE_VERSION}
+
+
+def _init_worker(nice: int) -> None:
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+def process_asset(job: dict) -> dict:
+    """Render the missing/outdated variants of one asset (runs in a worker).
+
+    Args:
+        job (dict): ``id``, ``album_id``, ``filename``, the album's encoding
+            ``profile`` and the ``kinds``, ``formats`` and ``force`` options.
+
+    Returns:
+        dict: ``id``, ``rendered`` (variant count), ``bytes`` written,
+        ``seconds`` spent, ``error`` (or None) and the ``manifest`` entries
+        for every expected variant.
+    """
+    t0 = time.perf_counter()
+    out = {"id": job["id"], "rendered": 0, "bytes": 0, "seconds": 0.0, "error": None,
+           "manifest": {}}
+    base = Path(settings.STORAGE_DIR)
+    rel = Path(str(job["filename"]).replace("\\", "/"))
+    orig = base / rel
+    try:
+        orig_mtime = orig.stat().st_mtime
+    except FileNotFoundError:
+        out["error"] = "original missing"
+        return out
+
+    manifest = out["manifest"]
+    targets = expected_variants(job["album_id"], rel.stem, job["kinds"], job["formats"])
+    if not job["force"]:
+        todo = {}
+        for (kind, fmt), vrel in targets.items():
+            p = base / vrel
+            try:
+                if p.stat().st_mtime >= orig_mtime:
+                    # موجود وأحدث من الأصل: سجّله في الـ manifest فقط
+                    describe_variant(p, SIZES[kind], fmt, manifest)
+                    continue
+            except FileNotFoundError:
+                pass
+            except Exception:
+                pass  # ملف تالف: أعد توليده
+            todo[(kind, fmt)] = vrel
+        targets = todo
+
+    if targets:
+        for vrel in targets.values():
+            (base / vrel).parent.mkdir(parents=True, exist_ok=True)
+        try:
+            out["bytes"] = render_variants(orig, base, targets, manifest=manifest,
+                                           profile=job["profile"])
+            out["rendered"] = len(targets)
+        except Exception as e:  # صورة تالفة مثلًا: سجّل وتابع
+            out["error"] = str(e)
+    if job["force"] and not out["error"]:
+        manifest["v"] = PIPELINE_VERSION
+    else:
+        # إعادة جزئية: المشتقات الأخرى ما زالت بملفها القديم
+        manifest.pop("p", None)
+    out["seconds"] = time.perf_counter() - t0
+    return out
+
+
+def manifest_version(raw: str | None) -> int:
+    """Return the pipeline version recorded in a raw manifest (0 if unknown)."""
+    try:
+        return int(json.loads(raw).get("v", 0)) if raw else 0
+    except (ValueError, TypeError, AttributeError):
+        return 0
+
+
+def is_stale(raw: str | None, album_profile: str | None) -> bool:
+    """True if a raw manifest predates ``PIPELINE_VERSION`` or another encoding profile."""
+    if manifest_version(raw) < PIPELINE_VERSION:
+        return True
+    return manifest_profile(json.loads(raw)) != resolve_profile(album_profile)
+
+
+def save_manifests(results: list[dict], replace: bool) -> None:
+    """Merge the manifests returned by the workers into the asset rows."""
+    with SessionLocal() as db:
+        for res in results:
+            if not res["manifest"].get("items"):
+                continue
+            asset = db.get(models.Asset, res["id"])
+            if asset:
+                asset.update_manifest(res["manifest"], replace=replace)
+        db.commit()
+
+
+def iter_batches(album_id: int | None, after_id: int, size: int):
+    """Yield batches of asset rows ordered by id, starting after ``after_id``."""
+    while True:
+        with SessionLocal() as db:
+            q = db.query(models.Asset.id, models.Asset.album_id, models.Asset.filename,
+                         models.Asset.variants_manifest, models.Album.encoding_profile)
+            q = q.join(models.Album, models.Asset.album_id == models.Album.id)
+            q = q.filter(models.Asset.id > after_id)
+            if album_id is not None:
+                q = q.filter(models.Asset.album_id == album_id)
+            rows = q.order_by(models.Asset.id).limit(size).all()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1].id
+
+
+def main():
+    """Parse arguments and run the reprocessing loop."""
+    formats = ["jpg", "webp"] + (["avif"] if settings.ENABLE_AVIF else [])
+    ap = argparse.ArgumentParser(description="Regenerate missing or outdated image variants")
+    ap.add_argument("--album", type=int, default=None, help="only this album id")
+    ap.add_argument("--kinds", default=",".join(settings.EAGER_VARIANTS),
+                    help=f"comma separated variant kinds (available: {','.join(SIZES)})")
+    ap.add_argument("--formats", default=",".join(formats), help="comma separated formats")
+    ap.add_argument("--force", action="store_true", help="re-render even up-to-date variants")
+    ap.add_argument("--stale", action="store_true",
+                    help=f"only assets whose manifest predates pipeline v{PIPELINE_VERSION} or "
+                         "their album's encoding profile (implies full re-render)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    ap.add_argument("--batch", type=int, default=64, help="assets per checkpointed batch")
+    ap.add_argument("--rate", type=float, default=0.0, help="max assets per second (0 = unlimited)")
+    ap.add_argument("--max-load", type=float, default=0.0,
+                    help="pause while the 1-min load average exceeds this (0 = off)")
+    ap.add_argument("--nice", type=int, default=0, help="niceness added to worker processes")
+    ap.add_argument("--checkpoint", default=str(DEFAULT_CHECKPOINT), help="checkpoint file")
+    ap.add_argument("--reset", action="store_true", help="ignore and overwrite the checkpoint")
+    args = ap.parse_args()
+
+    kinds = [k for k in args.kinds.split(",") if k]
+    unknown = [k for k in kinds if k not in SIZES]
+    if unknown:
+        ap.error(f"unknown kinds: {', '.join(unknown)}")
+    fmts = [f for f in args.formats.split(",") if f]
+
+    ensure_storage_dirs()
+    ckpt = Path(args.checkpoint)
+    options = run_options(args.album, kinds, fmts, args.force, args.stale)
+    last_id = 0 if args.reset else load_checkpoint(ckpt, options)
+    if last_id:
+        print(f"[i] resuming after asset id {last_id}")
+
+    stats = {"assets": 0, "rendered": 0, "bytes": 0, "errors": 0}
+    started = time.perf_counter()
+    min_interval = 1.0 / args.rate if args.rate > 0 else 0.0
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.nice,)) as pool:
+        for rows in iter_batches(args.album, last_id, args.batch):
+            futures = []
+            for row in rows:
+                if args.stale and not is_stale(row.variants_manifest, row.encoding_profile):
+                    continue
+                # ميزانية CPU/IO: انتظر إن كان الحمل مرتفعًا أو تجاوزنا المعدل
+                while args.max_load and os.getloadavg()[0] > args.max_load:
+                    time.sleep(1.0)
+                if min_interval:
+                    time.sleep(min_interval)
+                job = {"id": row.id, "album_id": row.album_id, "filename": row.filename,
+                       "profile": row.encoding_profile, "kinds": kinds, "formats": fmts,
+                       "force": args.force or args.stale}
+                futures.append(pool.submit(process_asset, job))
+
+            results = [fut.result() for fut in futures]
+            for res in results:
+                stats["assets"] += 1
+                stats["rendered"] += res["rendered"]
+                stats["bytes"] += res["bytes"]
+                if res["error"]:
+                    stats["errors"] += 1
+                    print(f"[!] asset {res['id']}: {res['error']}")
+
+            save_manifests(results, replace=args.force or args.stale)
+
+            last_id = rows[-1].id
+            save_checkpoint(ckpt, last_id, stats, options)
+
+            elapsed = time.perf_counter() - started
+            print(
+                f"[i] up to id {last_id}: {stats['assets']} assets, {stats['rendered']} variants, "
+                f"{stats['assets'] / elapsed:.1f} assets/s, "
+                f"{stats['bytes'] / (1024 * 1024) / elapsed:.1f} MB/s written"
+            )
+
+    # اكتمل التشغيل: التشغيل التالي يبدأ من الأول
+    ckpt.unlink(missing_ok=True)
+
+    elapsed = time.perf_counter() - started
+    print("\n=== Summary ===")
+    print(f"Assets: {stats['assets']}  Variants: {stats['rendered']}  Errors: {stats['errors']}")
+    print(f"Written: {stats['bytes'] / (1024 * 1024):.1f} MB in {elapsed:.1f}s "
+          f"({stats['assets'] / elapsed if elapsed else 0:.1f} assets/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+// صفحة الألبوم في لوحة الإدارة: شبكة أصول افتراضية
+// - الأصول تُجلب من /admin/albums/{id}/assets صفحة بعد صفحة (مؤشر keyset)
+// - تُرسم فقط الصفوف الظاهرة (+ هامش)، والباقي مساحة فارغة بنفس الارتفاع
+// - التحديد الجماعي والترتيب بالسحب يعملان على المصفوفة لا على الـ DOM
+// - المصغّرات من أطالس الألبوم (/admin/albums/{id}/sprites) إن كانت محدّثة،
+//   وإلا مصغّرة لكل أصل كالمعتاد
+(function () {
+  const grid = document.getElementById('asset-grid');
+  if (!grid) return;
+  const albumId = grid.dataset.album;
+  const coverId = +grid.dataset.cover || 0;
+  const win = grid.querySelector('.asset-window');
+  const tpl = document.getElementById('asset-card-tpl');
+  const status = document.getElementById('order-status');
+  const MIN_W = 180, BUFFER_ROWS = 2, PAGE = 500;
+  const BLANK = 'data:image/gif;base64,R0lGODlhAQABAAAAACH5BAEKAAEALAAAAAABAAEAAAICTAEAOw==';
+
+  const items = [];
+  const selected = new Set();
+  let loaded = false;
+  let sprite = null;
+  let cols = 1, rowH = 0, gap = 0, shown = '';
+
+  // ---------- تحميل ----------
+  async function loadAll() {
+    let cursor = null;
+    do {
+      const url = `/admin/albums/${albumId}/assets?limit=${PAGE}` + (cursor ? `&after=${encodeURIComponent(cursor)}` : '');
+      const res = await fetch(url, {headers: {'Accept': 'application/json'}});
+      if (!res.ok) {
+        status.textContent = 'تعذّر تحميل الصور، أعد تحميل الصفحة.';
+        return;
+      }
+      const data = await res.json();
+      items.push(...data.items);
+      cursor = data.next;
+      layout();
+    } while (cursor);
+    loaded = true;
+    render(true);
+  }
+
+  async function loadSprites() {
+    const res = await fetch(`/admin/albums/${albumId}/sprites`, {headers: {'Accept': 'application/json'}});
+    if (res.status !== 200) return;  // 202: يُبنى الآن، يُستخدم في الزيارة التالية
+    const data = await res.json();
+    // لا تبدّل إلى الأطالس إلا بعد تحميلها كلها
+    const ok = await Promise.all(data.sheets.map(([url]) => new Promise(done => {
+      const im = new Image();
+      im.onload = () => done(true);
+      im.onerror = () => done(false);
+      im.src = url;
+    })));
+    if (ok.every(Boolean)) {
+      sprite = data;
+      render(true);
+    }
+  }
+
+  // ---------- بطاقة ----------
+  function card(it) {
+    const el = tpl.content.firstElementChild.cloneNode(true);
+    el.dataset.id = it.id;
+    el.draggable = loaded;
+    el.classList.toggle('is-hidden', it.hidden);
+    const img = el.querySelector('img');
+    const rect = sprite && sprite.items[it.id];
+    if (rect) {
+      img.src = BLANK;
+      img.dataset.sprite = rect.join(',');
+    } else {
+      img.src = it.thumb;
+    }
+    img.alt = it.name;
+    el.querySelector('.bulk-pick').value = it.id;
+    el.querySelector('.bulk-pick').checked = selected.has(it.id);
+    el.querySelector('.caption').title = it.name;
+    el.querySelector('.name').textContent = it.name;
+    el.querySelector('.meta').textContent = `${it.w || '?'}×${it.h || '?'} · ${Math.floor(it.size / 1024)} KB`;
+    el.querySelector('.badge-cover').hidden = it.id !== coverId;
+    el.querySelectorAll('form[data-action]').forEach(f => {
+      f.action = f.dataset.action.replace('{id}', it.id);
+      if (f.dataset.cover) f.hidden = (f.dataset.cover === 'clear') !== (it.id === coverId);
+    });
+    return el;
+  }
+
+  // ---------- نافذة العرض ----------
+  function layout() {
+    gap = parseFloat(getComputedStyle(win).columnGap) || 0;
+    cols = Math.max(1, Math.floor((grid.clientWidth + gap) / (MIN_W + gap)));
+    win.style.gridTemplateColumns = `repeat(${cols}, minmax(0, 1fr))`;
+    if (!rowH && items.length) {
+      // قِس ارتفاع بطاقة واحدة مرة واحدة (كل البطاقات بنفس الارتفاع)
+      win.replaceChildren(card(items[0]));
+      rowH = win.firstElementChild.offsetHeight + gap;
+    }
+    grid.style.height = Math.max(0, Math.ceil(items.length / cols) * rowH - gap) + 'px';
+    render(true);
+  }
+
+  function render(force) {
+    if (!rowH) return;
+    const top = -grid.getBoundingClientRect().top;
+    const rows = Math.ceil(items.length / cols);
+    const r0 = Math.max(0, Math.floor(top / rowH) - BUFFER_ROWS);
+    const r1 = Math.min(rows, Math.ceil((top + window.innerHeight) / rowH) + BUFFER_ROWS);
+    const key = `${r0}:${r1}:${cols}`;
+    if (!force && key === shown) return;
+    shown = key;
+    win.style.transform = `translateY(${r0 * rowH}px)`;
+    win.replaceChildren(...items.slice(r0 * cols, r1 * cols).map(card));
+    fitSprites();
+  }
+
+  // خلفية الأطلس بتحجيم "cover" داخل إطار الصورة (مثل object-fit: cover)
+  function fitSprites() {
+    const imgs = win.querySelectorAll('img[data-sprite]');
+    if (!imgs.length) return;
+    const W = imgs[0].offsetWidth, H = imgs[0].offsetHeight;
+    imgs.forEach(img => {
+      const [si, x, y, w, h] = img.dataset.sprite.split(',').map(Number);
+      const [url, sw, sh] = sprite.sheets[si];
+      const k = Math.max(W / w, H / h);
+      const px = -(x * k - (W - w * k) / 2), py = -(y * k - (H - h * k) / 2);
+      img.style.background = `url("${url}") ${px}px ${py}px / ${sw * k}px ${sh * k}px no-repeat`;
+    });
+  }
+
+  let ticking = false;
+  window.addEventListener('scroll', () => {
+    if (ticking) return;
+    ticking = true;
+    requestAnimationFrame(() => { ticking = false; render(false); });
+  }, {passive: true});
+  window.addEventListener('resize', layout);
+
+  // ---------- ترتيب بالسحب والإفلات (الترتيب الكامل في طلب واحد) ----------
+  let dragId = null, before = '';
+  const order = () => items.map(it => it.id);
+
+  win.addEventListener('dragstart', e => {
+    const el = e.target.closest('.asset-card');
+    if (!el || !loaded) return;
+    dragId = +el.dataset.id;
+    before = order().join(',');
+    el.classList.add('dragging');
+    e.dataTransfer.effectAllowed = 'move';
+  });
+
+  win.addEventListener('dragover', e => {
+    if (dragId === null) return;
+    e.preventDefault();
+    const over = e.target.closest('.asset-card');
+    if (!over || +over.dataset.id === dragId) return;
+    const r = over.getBoundingClientRect();
+    const after = (e.clientX - r.left) > r.width / 2;
+    const from = items.findIndex(it => it.id === dragId);
+    const [moved] = items.splice(from, 1);
+    let to = items.findIndex(it => it.id === +over.dataset.id);
+    if (after) to += 1;
+    items.splice(to, 0, moved);
+    render(true);
+    const el = win.querySelector(`.asset-card[data-id="${dragId}"]`);
+    if (el) el.classList.add('dragging');
+  });
+
+  win.addEventListener('dragend', async () => {
+    if (dragId === null) return;
+    dragId = null;
+    render(true);
+    const ids = order();
+    if (ids.join(',') === before) return;
+    status.textContent = 'جارٍ الحفظ…';
+    try {
+      const res = await fetch(`/admin/albums/${albumId}/order`, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({ids}),
+      });
+      if (!res.ok) throw new Error(res.status);
+      status.textContent = 'تم حفظ الترتيب.';
+    } catch (err) {
+      status.textContent = 'تعذّر الحفظ، أعد تحميل الصفحة.';
+    }
+  });
+
+  // ---------- عمليات جماعية (طلب JSON واحد لكل المحدد) ----------
+  const bar = document.getElementById('bulk-bar');
+  const count = document.getElementById('bulk-count');
+  const updateCount = () => { count.textContent = selected.size; };
+
+  win.addEventListener('change', e => {
+    const pick = e.target.closest('.bulk-pick');
+    if (!pick) return;
+    if (pick.checked) selected.add(+pick.value); else selected.delete(+pick.value);
+    updateCount();
+  });
+  document.getElementById('bulk-all').addEventListener('change', e => {
+    selected.clear();
+    if (e.target.checked) items.forEach(it => selected.add(it.id));
+    updateCount();
+    render(true);
+  });
+
+  bar.addEventListener('click', async e => {
+    const btn = e.target.closest('button[data-op]');
+    if (!btn || !selected.size) return;
+    const ids = Array.from(selected);
+    const op = btn.dataset.op;
+    if (op === 'delete' && !confirm(`حذف نهائي لـ ${ids.length} صورة؟`)) return;
+    bar.querySelectorAll('button').forEach(b => { b.disabled = true; });
+    try {
+      const res = await fetch(`/admin/albums/${albumId}/bulk`, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({op, ids, dir: btn.dataset.dir || null}),
+      });
+      if (!res.ok) throw new Error(res.status);
+      location.reload();
+    } catch (err) {
+      alert('تعذّر تنفيذ العملية');
+      bar.querySelectorAll('button').forEach(b => { b.disabled = false; });
+    }
+  });
+
+  loadAll();
+  loadSprites();
+})();
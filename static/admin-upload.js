@@ -0,0 +1,84 @@
+// رفع مع معاينات من المتصفح (services/previews.py)
+// - لكل صورة: createImageBitmap يفك الأصل مرة (مع اتجاه EXIF) ثم يصغّره لكل عرض
+//   في data-preview-widths، وOffscreenCanvas يرمّزه JPEG (+ WebP إن دعمه المتصفح)
+// - الأصل والمعاينات وبصماتها (SHA-256) تُرسل في طلب واحد لكل صورة
+// - المتصفح القديم أو صورة لا يفكها (HEIC مثلًا) ← رفع عادي ويولّد الخادم المشتقات
+(function () {
+  const form = document.getElementById('upload-form');
+  if (!form || !form.dataset.previewWidths) return;
+  if (!window.OffscreenCanvas || !window.createImageBitmap || !(window.crypto && crypto.subtle)) return;
+  const widths = form.dataset.previewWidths.split(',').map(Number).filter(Boolean);
+  const input = form.querySelector('input[type=file]');
+  const status = document.getElementById('upload-status');
+  const QUALITY = 0.8;
+
+  const hex = buf => Array.from(new Uint8Array(buf), b => b.toString(16).padStart(2, '0')).join('');
+  const sha256 = async blob => hex(await crypto.subtle.digest('SHA-256', await blob.arrayBuffer()));
+
+  async function render(file) {
+    let bitmap;
+    try {
+      bitmap = await createImageBitmap(file, {imageOrientation: 'from-image'});
+    } catch (err) {
+      return [];
+    }
+    const out = [];
+    try {
+      for (const width of widths) {
+        // نفس حساب الخادم: لا تكبير، والارتفاع بالتقريب
+        const w = Math.min(width, bitmap.width);
+        const h = Math.max(1, Math.round(bitmap.height * w / bitmap.width));
+        const small = await createImageBitmap(bitmap, {resizeWidth: w, resizeHeight: h, resizeQuality: 'high'});
+        const canvas = new OffscreenCanvas(w, h);
+        canvas.getContext('2d').drawImage(small, 0, 0);
+        small.close();
+        for (const [fmt, type] of [['jpg', 'image/jpeg'], ['webp', 'image/webp']]) {
+          const blob = await canvas.convertToBlob({type, quality: QUALITY});
+          if (blob.type === type) out.push({key: `${width}.${fmt}`, blob});
+        }
+      }
+    } finally {
+      bitmap.close();
+    }
+    return out;
+  }
+
+  async function upload(file) {
+    const fd = new FormData();
+    fd.append('files', file, file.name);
+    const items = await render(file);
+    if (items.length) {
+      const hashes = {};
+      for (const it of items) {
+        hashes[it.key] = await sha256(it.blob);
+        fd.append('previews', it.blob, `0-${it.key}`);
+      }
+      fd.append('preview_meta', JSON.stringify([{sha256: await sha256(file), previews: hashes}]));
+    }
+    const res = await fetch(form.action, {
+      method: 'POST',
+      body: fd,
+      credentials: 'include',
+      headers: {'Accept': 'application/json'},
+    });
+    if (!res.ok) throw new Error(res.status);
+  }
+
+  form.addEventListener('submit', async e => {
+    const files = Array.from(input.files || []);
+    if (!files.length) return;
+    e.preventDefault();
+    const btn = form.querySelector('button[type=submit]');
+    btn.disabled = true;
+    try {
+      for (let i = 0; i < files.length; i++) {
+        status.textContent = `${i + 1} / ${files.length}…`;
+        await upload(files[i]);
+      }
+      location.reload();
+    } catch (err) {
+      status.textContent = 'تعذّر الرفع، حاول مرة أخرى.';
+      btn.disabled = false;
+    }
+  });
+})();
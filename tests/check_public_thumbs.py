@@ -4,7 +4,9 @@
 - يجلب آخر slug (أو slug تحدده أنت) ويستخرج album_id.
 - يسحب قائمة الأصول (assets) المرتبة.
 - لكل أصل:
-  - يحسب اسم الثمبنيل المتوقع حسب منطق public.py:
+  - إن كان للأصل variants_manifest يُعتمد عليه مباشرة (400.jpg|400.webp)،
+    ويُبلَّغ عن أي عنصر مسجَّل لكنه مفقود من القرص.
+  - وإلا يحسب اسم الثمبنيل المتوقع حسب منطق public.py:
     STORAGE_DIR/albums/<album_id>/thumb/400/<stem>.jpg|.webp
     حيث stem = Path(filename).stem
   - إن لم يجده، يجرّب fallback بلا اللاحقة -<digits> (مثال: DSC01084-17560.. → DSC01084)
@@ -20,6 +22,7 @@
 
 from __future__ import annotations
 import argparse
+import json
 import re
 import sqlite3
 from pathlib import Path
@@ -86,13 +89,15 @@ def main():
     print(f"[i] SLUG={slug}  ALBUM_ID={album_id}")
     print(f"[i] STORAGE_DIR={storage}")
 
-    # 2) اجلب الأصول المرئية مرتبة
+    # 2) اجلب الأصول المرئية مرتبة (مع الـ manifest إن كان العمود موجودًا)
+    cols = [r[1] for r in con.execute("PRAGMA table_info(assets)").fetchall()]
+    manifest_col = "variants_manifest" if "variants_manifest" in cols else "NULL"
     cur = con.execute(
-        """
-        SELECT id, filename, original_name
+        f"""
+        SELECT id, filename, original_name, {manifest_col}
         FROM assets
         WHERE album_id = ? AND (is_hidden IS NULL OR is_hidden=0)
-        ORDER BY COALESCE(sort_order,0), id
+        ORDER BY sort_order, id
         """,
         (album_id,),
     )
@@ -108,13 +113,15 @@ def main():
     fallback_ok = 0
     missing_cnt = 0
     fixed_cnt = 0
+    manifest_cnt = 0
+    stale_manifest_cnt = 0
 
     base = storage / "albums" / str(album_id) / "thumb" / "400"
     print(f"[i] سيتم البحث عن الملفات داخل: {base}")
     base.mkdir(parents=True, exist_ok=True)
 
     # 3) افحص حتى limit
-    for idx, (asset_id, filename, original_name) in enumerate(rows, start=1):
+    for idx, (asset_id, filename, original_name, manifest_raw) in enumerate(rows, start=1):
         if idx > args.limit:
             break
 
@@ -124,6 +131,22 @@ def main():
         expect_jpg = base / f"{stem}.jpg"
         expect_webp = base / f"{stem}.webp"
 
+        # الـ manifest هو المرجع الذي يقرأ منه public.py
+        try:
+            items = (json.loads(manifest_raw) or {}).get("items") if manifest_raw else None
+        except ValueError:
+            items = None
+        if items is not None:
+            listed = [p for key, p in (("400.jpg", expect_jpg), ("400.webp", expect_webp)) if key in items]
+            if listed and all(p.exists() for p in listed):
+                print(f"[OK] {asset_id:>5}  {bname}  -> manifest ({', '.join(p.name for p in listed)})")
+                manifest_cnt += 1
+                continue
+            if listed:
+                print(f"[STALE-MANIFEST] {asset_id:>5}  {bname}  -> مسجَّل في الـ manifest لكنه مفقود من القرص")
+                stale_manifest_cnt += 1
+                continue
+
         # موجود بالاسم المتوقع؟
         exists = expect_jpg.exists() or expect_webp.exists()
         if exists:
@@ -164,6 +187,7 @@ def main():
     total = min(args.limit, len(rows))
     print("\n=== Summary ===")
     print(f"Checked: {total}  OK: {ok_cnt}  FallbackFound: {fallback_ok}  Missing: {missing_cnt}  FixedByCopy: {fixed_cnt}")
+    print(f"Manifest OK: {manifest_cnt}  Manifest stale: {stale_manifest_cnt}  (أصلحها بـ reprocess_variants.py)")
 
     # 5) اختبار HTTP للثَمنبيل عبر الراوتر (إن طُلب)
     if args.http_test:
@@ -171,7 +195,7 @@ def main():
             import urllib.request
             print("\n=== HTTP test (/s/<slug>/thumb/<asset_id>) for first few assets ===")
             test_n = min(10, total)
-            for (asset_id, filename, _) in rows[:test_n]:
+            for (asset_id, filename, _, _) in rows[:test_n]:
                 url = f"https://upload.dichfoto.com/s/{slug}/thumb/{asset_id}"
                 req = urllib.request.Request(url, method="GET")
                 with urllib.request.urlopen(req, timeout=5) as resp:
@@ -0,0 +1,17 @@
+# tests/conftest.py
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import Base
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """In-memory database with the full schema; STORAGE_DIR/THUMBS_DIR under tmp_path."""
+    monkeypatch.setattr(settings, "STORAGE_DIR", tmp_path)
+    monkeypatch.setattr(settings, "THUMBS_DIR", tmp_path / "_thumbs")
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as s:
+        yield s
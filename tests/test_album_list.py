@@ -0,0 +1,71 @@
+# tests/test_album_list.py
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import Base
+from app.services import albums, variants
+
+def test_list_page_aggregates_in_one_query():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    t0 = datetime(2025, 1, 1)
+    for i in range(5):
+        db.add(models.Album(title=f"a{i}", created_at=t0 + timedelta(days=i)))
+    db.flush()
+    newest = db.query(models.Album).filter_by(title="a4").one()
+    for n in range(3):
+        db.add(models.Asset(album_id=newest.id, filename=f"albums/{newest.id}/original/{n}.jpg",
+                            original_name=f"{n}.jpg", size=1000,
+                            variants_manifest='{"items":{"400.jpg":[400,300,1]}}'))
+    db.add(models.ShareLink(album_id=newest.id, slug="s1"))
+    db.flush()
+    newest.cover_asset_id = db.query(models.Asset).first().id
+    db.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    rows, total = albums.list_page(db, page=1, per_page=2)
+    assert len(statements) == 1
+    assert total == 5 and [r["title"] for r in rows] == ["a4", "a3"]
+    top = rows[0]
+    assert (top["assets"], top["bytes"], top["shares"]) == (3, 3000, 1)
+    v = variants.variant_version({"items": {"400.jpg": [400, 300, 1]}}, 400)
+    assert top["cover_url"] == f"/media/albums/{newest.id}/thumb/400/0.jpg?v={v}"
+    assert rows[1]["assets"] == 0 and rows[1]["cover_url"] is None
+
+    rows, total = albums.list_page(db, page=3, per_page=2)
+    assert [r["title"] for r in rows] == ["a0"] and total == 5
+    assert albums.list_page(db, page=9, per_page=2) == ([], 5)
+
+def test_assets_page_keyset():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    album = models.Album(title="t")
+    db.add(album)
+    db.flush()
+    # مفاتيح مكررة: الترتيب (sort_order, id) كما في العرض
+    for n, key in enumerate([0, 5, 5, 0, 3]):
+        db.add(models.Asset(album_id=album.id, filename=f"albums/{album.id}/original/{n}.jpg",
+                            original_name=f"{n}.jpg", sort_order=key))
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        items, nxt = albums.assets_page(db, album.id, albums.parse_cursor(cursor), limit=2)
+        seen += [it["name"] for it in items]
+        if not nxt:
+            break
+        cursor = nxt
+    assert seen == ["0.jpg", "3.jpg", "4.jpg", "1.jpg", "2.jpg"]
+    assert items[-1]["thumb"] == f"/admin/thumb/{db.query(models.Asset).filter_by(original_name='2.jpg').one().id}"
+
+def test_thumb_url_changes_when_thumb_is_rewritten():
+    before = albums.thumb_url(1, 7, "albums/1/original/a.jpg", '{"items":{"400.jpg":[400,300,10]}}')
+    after = albums.thumb_url(1, 7, "albums/1/original/a.jpg", '{"r":1,"items":{"400.jpg":[300,400,12]}}')
+    assert before.split("?")[0] == after.split("?")[0] == "/media/albums/1/thumb/400/a.jpg"
+    assert before != after
@@ -0,0 +1,87 @@
+# tests/test_analytics.py
+from collections import deque
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app import models
+from app.config import settings
+from app.services import analytics
+
+@pytest.fixture(autouse=True)
+def buffer(monkeypatch):
+    monkeypatch.setattr(analytics, "_buffer", deque(maxlen=100))
+
+def _counts(db):
+    D = models.AnalyticsDaily
+    return {(r.share_id, r.asset_id, r.kind): r.count for r in db.scalars(select(D))}
+
+def test_flush_appends_events_and_bumps_daily_counters(db):
+    analytics.record(analytics.VISIT, 1)
+    analytics.record(analytics.VIEW, 1, 10)
+    analytics.record(analytics.VIEW, 1, 10)
+    assert analytics.drain(db) == 3
+    analytics.record(analytics.VIEW, 1, 10)
+    analytics.record(analytics.DOWNLOAD, 2, 20)
+    assert analytics.drain(db) == 2
+    assert analytics.flush(db) == 0
+
+    assert db.query(models.AnalyticsEvent).count() == 5
+    assert _counts(db) == {(1, 0, "visit"): 1, (1, 10, "view"): 3, (2, 20, "download"): 1}
+
+def test_flush_is_batched(db, monkeypatch):
+    monkeypatch.setattr(settings, "ANALYTICS_BATCH_SIZE", 2)
+    for _ in range(5):
+        analytics.record(analytics.THUMB, 1, 1)
+    assert analytics.flush(db) == 2
+    assert len(analytics._buffer) == 3
+    assert analytics.drain(db) == 3
+
+def test_full_buffer_drops_oldest(db, monkeypatch):
+    monkeypatch.setattr(analytics, "_buffer", deque(maxlen=3))
+    for asset_id in range(5):
+        analytics.record(analytics.VIEW, 1, asset_id)
+    assert [e[3] for e in analytics._buffer] == [2, 3, 4]
+
+def test_disabled_records_nothing(db, monkeypatch):
+    monkeypatch.setattr(settings, "ANALYTICS_ENABLED", False)
+    analytics.record(analytics.VISIT, 1)
+    assert not analytics._buffer
+
+def test_stats_read_the_aggregates(db):
+    album = models.Album(title="Wedding")
+    db.add(album)
+    db.flush()
+    share = models.ShareLink(album_id=album.id, slug="w")
+    asset = models.Asset(album_id=album.id, filename="a.jpg", original_name="a.jpg")
+    db.add_all([share, asset])
+    db.commit()
+    today = date.today()
+    D = models.AnalyticsDaily
+    db.add_all([
+        D(day=today, share_id=share.id, asset_id=0, kind="visit", count=4),
+        D(day=today, share_id=share.id, asset_id=asset.id, kind="view", count=3),
+        D(day=today - timedelta(days=1), share_id=share.id, asset_id=asset.id, kind="download", count=2),
+        D(day=today - timedelta(days=40), share_id=share.id, asset_id=asset.id, kind="view", count=100),
+        D(day=today, share_id=999, asset_id=0, kind="visit", count=1),  # رابط محذوف
+    ])
+    db.commit()
+
+    since = today - timedelta(days=29)
+    shares = analytics.share_totals(db, since)
+    assert shares[0] == {"share_id": share.id, "slug": "w", "album_id": album.id, "title": "Wedding",
+                         "visit": 4, "thumb": 0, "view": 3, "download": 2}
+    assert shares[1]["share_id"] == 999 and shares[1]["slug"] is None
+    top = analytics.top_assets(db, since)
+    assert [(a["asset_id"], a["view"], a["download"]) for a in top] == [(asset.id, 3, 2)]
+    assert [d["day"] for d in analytics.daily_totals(db, since)] == [today - timedelta(days=1), today]
+
+def test_prune_keeps_counters(db):
+    E = models.AnalyticsEvent
+    now = datetime(2026, 1, 1)
+    db.add_all([E(ts=now - timedelta(days=settings.ANALYTICS_RETENTION_DAYS + 1), kind="view", share_id=1),
+                E(ts=now, kind="view", share_id=1)])
+    db.commit()
+    assert analytics.prune(db, now=now) == 1
+    assert db.query(E).count() == 1
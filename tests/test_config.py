@@ -0,0 +1,21 @@
+# tests/test_config.py
+import pytest
+
+from app.config import check_settings, db_connections, settings
+
+@pytest.fixture
+def postgres(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", "postgresql://u@db/app")
+    monkeypatch.setattr(settings, "USE_GDRIVE", False)
+
+def test_default_pools_fit_postgres_on_four_cores(postgres, monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "9")
+    assert db_connections() == 90 <= settings.DB_MAX_CONNECTIONS
+    check_settings()
+
+def test_too_many_connections_fail_fast(postgres, monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "17")
+    with pytest.raises(RuntimeError, match="170 connections"):
+        check_settings()
+    monkeypatch.setattr(settings, "DATABASE_URL", "sqlite:///app.db")  # بلا pool
+    check_settings()
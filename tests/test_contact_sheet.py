@@ -0,0 +1,56 @@
+# tests/test_contact_sheet.py
+import re
+
+from PIL import Image
+
+from app import models
+from app.services import contact_sheet
+from app.services.variants import variant_rel
+
+def _thumb(tmp_path, name, size=(400, 267)):
+    p = tmp_path / variant_rel(1, name, 400, "jpg")
+    p.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size, "red").save(p)
+    return str(p)
+
+def test_render_pdf_pages_and_xref(tmp_path):
+    entries = [(_thumb(tmp_path, f"a{i}"), f"a{i}.jpg") for i in range(5)] + [(None, "missing.jpg")]
+    out = tmp_path / "sheet.pdf"
+    assert contact_sheet.render_pdf("Album", entries, str(out), cols=2, rows=2, dpi=36) == 2
+
+    data = out.read_bytes()
+    assert data.startswith(b"%PDF-1.4") and data.endswith(b"%%EOF\n")
+    assert re.search(rb"/Type /Pages /Kids \[[^\]]+\] /Count 2", data)
+    # كل إزاحة في جدول xref تشير إلى بداية كائنها
+    start = int(re.search(rb"startxref\n(\d+)", data).group(1))
+    rows = data[start:].split(b"\n")[3:]
+    for num, row in enumerate(rows[:data.count(b" 0 obj\n")], start=1):
+        offset = int(row[:10])
+        assert data[offset:].startswith(b"%d 0 obj\n" % num)
+
+def test_render_pdf_empty_album_has_one_page(tmp_path):
+    out = tmp_path / "empty.pdf"
+    assert contact_sheet.render_pdf("Empty", [], str(out), cols=4, rows=5, dpi=36) == 1
+    assert b"/Count 1" in out.read_bytes()
+
+def test_plan_follows_order_and_visibility(db, tmp_path):
+    album = models.Album(title="t")
+    db.add(album)
+    db.commit()
+    a = models.Asset(album_id=album.id, filename="albums/1/original/a.jpg", original_name="a.jpg",
+                     sort_order=2, variants_manifest='{"items":{"400.jpg":[400,267,1]}}')
+    b = models.Asset(album_id=album.id, filename="albums/1/original/b.jpg", original_name="b.jpg",
+                     sort_order=1)
+    db.add_all([a, b])
+    db.commit()
+
+    v1, entries = contact_sheet.plan(db, album)
+    assert [name for _, name in entries] == ["b.jpg", "a.jpg"]
+    assert entries[0][0] is None and entries[1][0].endswith("thumb/400/a.jpg")
+    assert contact_sheet.plan(db, album)[0] == v1
+
+    b.is_hidden = True
+    db.commit()
+    v2, entries = contact_sheet.plan(db, album)
+    assert v2 != v1 and [name for _, name in entries] == ["a.jpg"]
+    assert contact_sheet.export_path(album.id, v2).name == f"contact-{v2}.pdf"
@@ -0,0 +1,24 @@
+# tests/test_dbstats.py
+from sqlalchemy import create_engine, text
+
+from app.services import dbstats
+
+def test_counts_only_inside_a_request():
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))  # خارج أي طلب: لا شيء يُسجَّل
+
+        stats = dbstats.RequestStats()
+        token = dbstats._current.set(stats)
+        try:
+            dbstats.count_session()
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        finally:
+            dbstats._current.reset(token)
+
+    assert stats.sessions == 1
+    assert stats.queries == 2
+    assert stats.seconds >= 0
+    assert stats.header().startswith("sessions=1; queries=2; time=")
+    assert dbstats.current() is None
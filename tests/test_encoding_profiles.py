@@ -0,0 +1,31 @@
+# tests/test_encoding_profiles.py
+from PIL import Image
+
+from app.config import settings
+from app.services import variants
+
+def test_unknown_profile_falls_back_to_default():
+    assert variants.resolve_profile(None) == settings.ENCODING_PROFILE
+    assert variants.resolve_profile("nope") == settings.ENCODING_PROFILE
+    assert variants.resolve_profile("fast") == "fast"
+    assert variants.manifest_profile({}) == variants.LEGACY_PROFILE
+
+def test_make_variants_records_profile(tmp_path):
+    src = tmp_path / "src.jpg"
+    Image.effect_noise((900, 600), 40).convert("RGB").save(src, quality=95)
+
+    sizes = {}
+    for profile in ("fast", "max"):
+        manifest: dict = {}
+        out = tmp_path / profile
+        variants.make_variants(src, out, 1, "src", create=["thumb"], manifest=manifest,
+                               profile=profile)
+        assert manifest["p"] == profile
+        sizes[profile] = manifest["items"]["400.webp"][2]
+
+        # إعادة الترميز بملف آخر تستبدل الملفات وتحدّث الاسم
+        again: dict = {}
+        variants.reencode_variants(src, out, 1, "src", [(400, "webp")], manifest=again,
+                                   profile="balanced")
+        assert again["p"] == "balanced" and "400.webp" in again["items"]
+    assert sizes["max"] <= sizes["fast"]
@@ -0,0 +1,126 @@
+# tests/test_gc.py
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app import models
+from app.config import settings
+from app.services import gc
+
+def _asset(db, tmp_path, album_id, name):
+    a = models.Asset(album_id=album_id, filename=f"albums/{album_id}/original/{name}.jpg",
+                     original_name=f"{name}.jpg", variants_manifest='{"items":{"400.jpg":[1,1,1]}}')
+    db.add(a)
+    db.commit()
+    for p in gc.asset_paths(a)[:2]:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_bytes(b"x")
+    return a
+
+def test_delete_tombstones_then_collects(db, tmp_path):
+    album = models.Album(title="t")
+    db.add(album)
+    db.commit()
+    a = _asset(db, tmp_path, album.id, "a")
+    files = gc.asset_paths(a)[:2]
+
+    db.delete(a)
+    db.commit()
+    assert all(p.exists() for p in files)  # الحذف نفسه لا يلمس الملفات
+    assert db.scalar(select(models.Tombstone.id).limit(1)) is not None
+
+    assert gc.drain(db)["failed"] == 0
+    assert not any(p.exists() for p in files)
+    assert db.scalars(select(models.Tombstone)).all() == []
+
+def test_failures_back_off(db, monkeypatch):
+    monkeypatch.setattr(settings, "USE_GDRIVE", True)
+
+    def boom(file_id):
+        raise RuntimeError("drive down")
+    monkeypatch.setattr(gc.gdrive, "delete_file", boom)
+    gc.bury(db, [(gc.DRIVE, "abc")])
+    db.commit()
+
+    now = datetime.utcnow()
+    assert gc.collect(db, now=now)["failed"] == 1
+    row = db.scalars(select(models.Tombstone)).one()
+    assert row.attempts == 1 and "drive down" in row.last_error
+    assert row.next_attempt_at == now + gc.retry_delay(1)
+    assert gc.collect(db, now=now)["batch"] == 0  # لم يحن موعده بعد
+    assert gc.retry_delay(30) == timedelta(hours=6)
+
+def test_album_delete_and_reconcile(db, tmp_path):
+    keep, gone = models.Album(title="keep"), models.Album(title="gone")
+    db.add_all([keep, gone])
+    db.commit()
+    _asset(db, tmp_path, keep.id, "a")
+    stray = tmp_path / "albums" / str(keep.id) / "original" / "stray.jpg"
+    stray.write_bytes(b"x")
+    dead = tmp_path / "albums" / "999"
+    dead.mkdir(parents=True)
+
+    report = gc.reconcile(db, min_age=timedelta(0))
+    assert sorted(report["local"]) == sorted([stray, dead]) and report["queued"] == 0
+
+    (tmp_path / "albums" / str(gone.id)).mkdir()
+    db.delete(gone)
+    db.commit()
+    report = gc.reconcile(db, apply=True, min_age=timedelta(0))
+    assert report["queued"] == 2  # مجلد الألبوم المحذوف له tombstone مسبقًا
+    gc.drain(db)
+    assert not stray.exists() and not dead.exists()
+    assert not (tmp_path / "albums" / str(gone.id)).exists()
+    assert (tmp_path / "albums" / str(keep.id) / "original" / "a.jpg").exists()
+
+def test_drive_derivatives_and_album_folder(db, monkeypatch):
+    monkeypatch.setattr(settings, "USE_GDRIVE", True)
+    monkeypatch.setattr(settings, "GDRIVE_ROOT_FOLDER_ID", "root")
+    tree = {"root": [("albums", "f-albums")], "f-albums": [("1", "f-1"), ("2", "f-2")]}
+    monkeypatch.setattr(gc.gdrive, "list_children", lambda fid: [
+        {"id": i, "name": n, "mimeType": "application/vnd.google-apps.folder"} for n, i in tree.get(fid, [])
+    ])
+    deleted = []
+    monkeypatch.setattr(gc.gdrive, "delete_file", deleted.append)
+
+    db.add_all([models.Album(id=1, title="a"), models.Album(id=2, title="b")])
+    a = models.Asset(album_id=1, filename="albums/1/original/a.jpg", original_name="a.jpg",
+                     gdrive_file_id="o", gdrive_thumb_id="t",
+                     variants_manifest='{"items":{},"drive":{"400.jpg":"t","400.webp":"tw","1600.jpg":"dj"}}')
+    db.add(a)
+    db.commit()
+    assert gc.drive_ids(a) == ["o", "t", "tw", "dj"]
+    a.update_manifest({"items": {}}, replace=True)  # إعادة توليد محلية لا تنسى نسخ Drive
+    assert gc.drive_ids(a) == ["o", "t", "tw", "dj"]
+    db.delete(a)
+    db.commit()
+    gc.drain(db)
+    assert sorted(deleted) == ["dj", "o", "t", "tw"]
+
+    deleted.clear()
+    db.delete(db.get(models.Album, 1))
+    db.delete(db.get(models.Album, 2))
+    db.commit()
+    db.add(models.Album(id=2, title="reused"))  # معرّف أُعيد استخدامه قبل الجمع
+    db.commit()
+    gc.drain(db)
+    assert deleted == ["f-1"]
+    assert db.scalars(select(models.Tombstone)).all() == []
+
+def test_reused_album_id_keeps_new_files(db, tmp_path):
+    old = models.Album(id=5, title="old")
+    db.add(old)
+    db.commit()
+    _asset(db, tmp_path, 5, "a")
+    (tmp_path / "_thumbs" / "albums" / "5").mkdir(parents=True)
+    db.delete(old)
+    db.commit()
+
+    # ألبوم جديد بنفس المعرّف قبل أن يعمل الجامع
+    db.add(models.Album(id=5, title="new"))
+    db.commit()
+    files = gc.asset_paths(_asset(db, tmp_path, 5, "b"))[:2]
+    gc.collect(db)
+    assert all(p.exists() for p in files)
+    assert (tmp_path / "_thumbs" / "albums" / "5").exists()
+    assert db.scalars(select(models.Tombstone.kind)).all() == [gc.DRIVE_DIR]  # Drive معطّل
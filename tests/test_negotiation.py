@@ -0,0 +1,23 @@
+# tests/test_negotiation.py
+from app.services.negotiation import parse_accept, pick_format
+
+CHROME = "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8"
+OLD_SAFARI = "image/png,image/svg+xml,image/*;q=0.8,video/*;q=0.8,*/*;q=0.5"
+
+def test_parse_accept_quality():
+    prefs = parse_accept("image/webp;q=0.5, image/jpeg")
+    assert prefs == {"image/webp": 0.5, "image/jpeg": 1.0}
+
+def test_prefers_avif_when_advertised():
+    assert pick_format(CHROME, ["jpg", "webp", "avif"]) == "avif"
+    assert pick_format(CHROME, ["jpg", "webp"]) == "webp"
+
+def test_wildcard_does_not_unlock_modern_formats():
+    assert pick_format(OLD_SAFARI, ["jpg", "webp", "avif"]) == "jpg"
+
+def test_explicit_refusal():
+    assert pick_format("image/webp;q=0, image/*", ["jpg", "webp"]) == "jpg"
+
+def test_fallback_without_jpeg():
+    assert pick_format(None, ["webp"]) == "webp"
+    assert pick_format(CHROME, []) is None
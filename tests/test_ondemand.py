@@ -0,0 +1,44 @@
+# tests/test_ondemand.py
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.database import Base
+from app.services import ondemand
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return engine
+
+def test_concurrent_manifest_entries_are_both_kept(engine):
+    with Session(engine) as db:
+        db.add(models.Asset(id=1, album_id=1, filename="albums/1/original/a.jpg", original_name="a.jpg",
+                            variants_manifest='{"v":1,"items":{"400.jpg":[400,300,10]}}'))
+        db.commit()
+
+    # طلبان أوليان لعرضين مختلفين قرأ كلاهما نفس الـ manifest
+    with Session(engine) as s1, Session(engine) as s2:
+        a1, a2 = s1.get(models.Asset, 1), s2.get(models.Asset, 1)
+        assert a1.variants_manifest and a2.variants_manifest
+        assert ondemand.save_manifest(s1, a1, {"items": {"800.jpg": [800, 600, 20]}})
+        assert ondemand.save_manifest(s2, a2, {"items": {"1200.webp": [1200, 900, 30]}})
+        assert set(a2.manifest["items"]) == {"400.jpg", "800.jpg", "1200.webp"}
+
+    with Session(engine) as db:
+        assert set(db.get(models.Asset, 1).manifest["items"]) == {"400.jpg", "800.jpg", "1200.webp"}
+
+def test_save_manifest_on_deleted_asset(engine):
+    with Session(engine) as db:
+        db.add(models.Asset(id=1, album_id=1, filename="a.jpg", original_name="a.jpg",
+                            variants_manifest='{"items":{}}'))
+        db.commit()
+    with Session(engine) as s1, Session(engine) as s2:
+        a = s1.get(models.Asset, 1)
+        assert a.variants_manifest
+        s2.delete(s2.get(models.Asset, 1))
+        s2.commit()
+        assert ondemand.save_manifest(s1, a, {"items": {"800.jpg": [1, 1, 1]}}) is False
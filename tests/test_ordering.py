@@ -0,0 +1,67 @@
+# tests/test_ordering.py
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import Base
+from app.services import ordering
+
+def _album(n, keys=None):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    album = models.Album(title="t")
+    db.add(album)
+    db.flush()
+    for i in range(n):
+        db.add(models.Asset(album_id=album.id, filename=f"{i}.jpg", original_name=f"{i}.jpg",
+                            sort_order=keys[i] if keys else (i + 1) * ordering.GAP))
+    db.commit()
+    return engine, db, album.id
+
+def test_key_between():
+    assert ordering.key_between(None, None) == 0
+    assert ordering.key_between(None, 10) == 10 - ordering.GAP
+    assert ordering.key_between(10, None) == 10 + ordering.GAP
+    assert ordering.key_between(10, 20) == 15
+    assert ordering.key_between(10, 11) is None
+
+def test_move_updates_one_row():
+    engine, db, album_id = _album(5)
+    ids = ordering.album_order(db, album_id)
+    updates = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cur, stmt, *a: updates.append(stmt) if stmt.startswith("UPDATE") else None)
+
+    asset = db.get(models.Asset, ids[4])
+    assert ordering.move(db, asset, "up")
+    db.commit()
+    assert ordering.album_order(db, album_id) == ids[:3] + [ids[4], ids[3]]
+    assert len(updates) == 1
+
+    assert ordering.move(db, db.get(models.Asset, ids[2]), "top")
+    assert ordering.move(db, db.get(models.Asset, ids[0]), "bottom")
+    assert not ordering.move(db, db.get(models.Asset, ids[0]), "down")
+    db.commit()
+    assert ordering.album_order(db, album_id) == [ids[2], ids[1], ids[4], ids[3], ids[0]]
+
+def test_exhausted_gap_rebalances():
+    _, db, album_id = _album(3, keys=[1, 2, 3])
+    ids = ordering.album_order(db, album_id)
+    assert ordering.move(db, db.get(models.Asset, ids[0]), "down")
+    db.commit()
+    assert ordering.album_order(db, album_id) == [ids[1], ids[0], ids[2]]
+    keys = sorted(a.sort_order for a in db.query(models.Asset))
+    assert min(b - a for a, b in zip(keys, keys[1:])) > 1
+
+def test_apply_order_requires_permutation():
+    _, db, album_id = _album(3)
+    ids = ordering.album_order(db, album_id)
+    ordering.apply_order(db, album_id, ids[::-1])
+    db.commit()
+    assert ordering.album_order(db, album_id) == ids[::-1]
+    with pytest.raises(ValueError):
+        ordering.apply_order(db, album_id, ids[:2])
+    with pytest.raises(ValueError):
+        ordering.apply_order(db, album_id, ids + [ids[0]])
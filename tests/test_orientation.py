@@ -0,0 +1,88 @@
+# tests/test_orientation.py
+import pytest
+from PIL import Image, ImageOps
+
+from app.services import orientation, variants
+
+def _scan(path):
+    # البيانات المضغوطة من SOS حتى النهاية: يجب ألا تتغير بالتدوير
+    data = path.read_bytes()
+    return data[data.index(b"\xff\xda"):]
+
+@pytest.mark.parametrize("o", range(1, 9))
+@pytest.mark.parametrize("dir", ["cw", "ccw"])
+def test_compose_matches_exif_transpose(o, dir):
+    im = Image.new("L", (2, 3))
+    im.putdata(range(6))
+
+    def shown(value):
+        exif = Image.Exif()
+        exif[orientation.ORIENTATION] = value
+        im.info["exif"] = exif.tobytes()
+        return ImageOps.exif_transpose(im.copy())
+
+    turn = Image.Transpose.ROTATE_270 if dir == "cw" else Image.Transpose.ROTATE_90
+    want = shown(o).transpose(turn)
+    got = shown(orientation.compose(o, dir))
+    assert got.size == want.size and list(got.getdata()) == list(want.getdata())
+
+@pytest.mark.parametrize("exif", [None, {0x010F: "Cam"}, {0x010F: "Cam", 0x0112: 3}])
+def test_rotate_jpeg_keeps_image_data(tmp_path, exif):
+    path = tmp_path / "a.jpg"
+    im = Image.effect_noise((64, 48), 40).convert("RGB")
+    kwargs = {}
+    if exif:
+        e = Image.Exif()
+        e.update(exif)
+        kwargs["exif"] = e.tobytes()
+    im.save(path, quality=90, **kwargs)
+    before = _scan(path)
+    start = (exif or {}).get(0x0112, 1)
+
+    assert orientation.rotate_jpeg(path, "cw") == orientation.compose(start, "cw")
+    assert _scan(path) == before
+    with Image.open(path) as out:
+        assert out.size == (64, 48)
+        assert out.getexif().get(0x010F) == (exif or {}).get(0x010F)
+        shown = ImageOps.exif_transpose(out)
+    assert shown.size == ((48, 64) if start in (1, 3) else (64, 48))
+
+@pytest.mark.parametrize("size", [(900, 600), (300, 200), (500, 500)])
+def test_rotate_variants_keeps_width_contract(tmp_path, size):
+    src = tmp_path / "src.jpg"
+    Image.effect_noise(size, 40).convert("RGB").save(src)
+    manifest: dict = {}
+    variants.make_variants(src, tmp_path, 1, "src", create=["thumb"], manifest=manifest)
+
+    # الأصل يُدوَّر أولًا؛ المشتقات تتبعه
+    with Image.open(src) as im:
+        im.transpose(Image.Transpose.ROTATE_270).save(src)
+    turned = (size[1], size[0])
+    rotated: dict = {}
+    assert variants.rotate_variants(src, tmp_path, 1, "src", manifest["items"], "cw", turned,
+                                    manifest=rotated) == 2
+    want = variants.fit_size(turned, 400)
+    assert rotated["items"]["400.jpg"][:2] == list(want)
+    with Image.open(tmp_path / variants.variant_rel(1, "src", 400, "webp")) as im:
+        assert im.size == want
+
+def test_rotate_variants_derives_from_largest_variant(tmp_path):
+    src = tmp_path / "src.jpg"
+    Image.effect_noise((900, 600), 40).convert("RGB").save(src)
+    manifest: dict = {}
+    variants.make_variants(src, tmp_path, 1, "src", create=["thumb", "disp"], manifest=manifest)
+
+    # disp (900×600) يغطي كل العروض بعد التدوير: الأصل لا يُفتح أصلًا
+    rotated: dict = {}
+    assert variants.rotate_variants(tmp_path / "missing.jpg", tmp_path, 1, "src", manifest["items"],
+                                    "cw", (600, 900), manifest=rotated) == 4
+    assert rotated["items"]["400.webp"][:2] == [400, 600]
+    assert rotated["items"]["1600.jpg"][:2] == [600, 900]
+
+def test_variant_version_changes_on_rewrite():
+    m = {"p": "max", "items": {"400.jpg": [400, 267, 100], "1600.jpg": [1600, 1067, 900]}}
+    v = variants.variant_version(m, 400)
+    assert v and variants.variant_version(m, 2048) is None
+    assert variants.variant_version({**m, "items": {**m["items"], "1600.jpg": [1, 1, 1]}}, 400) == v
+    assert variants.variant_version({**m, "r": 1}, 400) != v
+    assert variants.variant_version({**m, "p": "fast"}, 400) != v
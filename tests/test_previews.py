@@ -0,0 +1,81 @@
+# tests/test_previews.py
+import hashlib
+import io
+
+import pytest
+from PIL import Image
+
+from app.services import previews, variants
+
+def _encode(size, fmt="JPEG", exif=None):
+    buf = io.BytesIO()
+    kwargs = {"exif": exif.tobytes()} if exif else {}
+    Image.new("RGB", size, "gray").save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+def test_parse_name():
+    assert previews.parse_name("3-400.jpg") == (3, "400.jpg")
+    with pytest.raises(ValueError):
+        previews.parse_name("thumb.jpg")
+
+def test_oriented_size_swaps_for_rotated_exif(tmp_path):
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    path = tmp_path / "a.jpg"
+    path.write_bytes(_encode((300, 200), exif=exif))
+    assert previews.oriented_size(path) == (200, 300)
+
+@pytest.mark.parametrize("size,fmt,ok", [
+    ((400, 267), "jpg", True),
+    ((400, 266), "jpg", True),    # فرق تقريب بكسل واحد
+    ((400, 300), "jpg", False),
+    ((399, 266), "jpg", False),
+    ((400, 267), "webp", False),  # الاسم webp والمحتوى JPEG
+])
+def test_check_preview_dimensions_and_format(size, fmt, ok):
+    data = _encode(size)
+    if ok:
+        assert previews.check_preview(data, _sha(data), 400, fmt, (6000, 4000)) == size
+    else:
+        with pytest.raises(ValueError):
+            previews.check_preview(data, _sha(data), 400, fmt, (6000, 4000))
+
+def test_check_preview_rejects_bad_hash_and_upscale():
+    data = _encode((400, 267))
+    with pytest.raises(ValueError):
+        previews.check_preview(data, "0" * 64, 400, "jpg", (6000, 4000))
+    # أصل أصغر من العرض المطلوب: المعاينة بحجم الأصل لا أكبر
+    small = _encode((300, 200))
+    assert previews.check_preview(small, _sha(small), 1600, "jpg", (300, 200)) == (300, 200)
+    with pytest.raises(ValueError):
+        previews.check_preview(data, _sha(data), 400, "jpg", (300, 200))
+
+def test_accept_stores_valid_previews(tmp_path):
+    original = tmp_path / "orig.jpg"
+    original.write_bytes(_encode((1200, 800)))
+    good = _encode((400, 267))
+    bad = _encode((400, 400), "WEBP")
+    manifest = {}
+    out = previews.accept(
+        {"400.jpg": good, "400.webp": bad},
+        {"sha256": _sha(original.read_bytes()), "previews": {"400.jpg": _sha(good), "400.webp": _sha(bad)}},
+        original, _sha(original.read_bytes()), tmp_path, 7, "orig", manifest,
+    )
+    rel = variants.variant_rel(7, "orig", 400, "jpg")
+    assert out == {"thumb_jpg": rel.as_posix()}
+    assert (tmp_path / rel).read_bytes() == good
+    assert not (tmp_path / variants.variant_rel(7, "orig", 400, "webp")).exists()
+    assert manifest["items"] == {"400.jpg": [400, 267, len(good)]}
+    assert (manifest["w"], manifest["h"], manifest["p"]) == (1200, 800, previews.CLIENT_PROFILE)
+
+def test_accept_ignores_previews_of_another_original(tmp_path):
+    original = tmp_path / "orig.jpg"
+    original.write_bytes(_encode((1200, 800)))
+    good = _encode((400, 267))
+    manifest = {}
+    out = previews.accept({"400.jpg": good}, {"sha256": "f" * 64, "previews": {"400.jpg": _sha(good)}},
+                          original, _sha(original.read_bytes()), tmp_path, 7, "orig", manifest)
+    assert out == {} and manifest == {}
@@ -0,0 +1,24 @@
+# tests/test_sendfile_range.py
+import pytest
+
+from app.services.sendfile import parse_range
+
+def test_no_or_multi_range_means_full_file():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+
+def test_explicit_and_open_ranges():
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+
+def test_suffix_range():
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+
+def test_unsatisfiable():
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+    with pytest.raises(ValueError):
+        parse_range("bytes=9-3", 100)
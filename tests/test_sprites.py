@@ -0,0 +1,81 @@
+# tests/test_sprites.py
+import json
+from datetime import timedelta
+
+import pytest
+from PIL import Image
+
+from app import models
+from app.config import settings
+from app.services import gc, sprites
+from app.services.variants import variant_rel
+
+@pytest.fixture(autouse=True)
+def small_sheets(monkeypatch):
+    monkeypatch.setattr(settings, "SPRITE_CELL", 20)
+    monkeypatch.setattr(settings, "SPRITE_PER_SHEET", 4)
+
+def _asset(db, tmp_path, album_id, name, size=(40, 30), thumb=True):
+    items = {}
+    if thumb:
+        p = tmp_path / variant_rel(album_id, name, 400, "jpg")
+        p.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", size, "red").save(p)
+        items["400.jpg"] = [size[0], size[1], p.stat().st_size]
+    a = models.Asset(album_id=album_id, filename=f"albums/{album_id}/original/{name}.jpg",
+                     original_name=f"{name}.jpg", variants_manifest=json.dumps({"items": items}))
+    db.add(a)
+    db.commit()
+    return a
+
+def test_build_maps_every_thumb(db, tmp_path):
+    assets = [_asset(db, tmp_path, 1, f"a{i}") for i in range(5)]
+    _asset(db, tmp_path, 1, "legacy", thumb=False)
+
+    m = sprites.build(db, 1)
+    assert m["v"] == sprites.version(db, 1) and sprites.load_map(1) == m
+    assert len(m["sheets"]) == 2  # 4 + 2 أصول
+    assert set(m["items"]) == {str(a.id) for a in assets}  # بلا مصغّرة ← خارج الخريطة
+    sheet, x, y, w, h = m["items"][str(assets[3].id)]
+    assert (sheet, x, y, w, h) == (0, 20, 20, 20, 15)
+    url, sw, sh = m["sheets"][0]
+    assert (sw, sh) == (40, 40)
+    with Image.open(tmp_path / url.removeprefix("/media/")) as im:
+        assert im.format == "WEBP" and im.size == (40, 40)
+        assert im.convert("RGB").getpixel((x + 5, y + 5))[0] > 200
+
+    assert sprites.build(db, 1) == m  # نسخة حالية ← لا بناء
+
+def test_rebuild_reuses_unchanged_sheets(db, tmp_path):
+    for i in range(5):
+        _asset(db, tmp_path, 1, f"a{i}")
+    first = sprites.build(db, 1)
+    before = (tmp_path / first["sheets"][0][0].removeprefix("/media/")).stat().st_mtime_ns
+
+    _asset(db, tmp_path, 1, "new")
+    second = sprites.build(db, 1)
+    assert second["v"] != first["v"]
+    assert second["sheets"][0] == first["sheets"][0]  # الأطلس الأول لم يتغير
+    assert (tmp_path / second["sheets"][0][0].removeprefix("/media/")).stat().st_mtime_ns == before
+    assert second["sheets"][1] != first["sheets"][1]
+    names = {p.name for p in sprites.sprite_dir(1).iterdir() if not p.name.startswith(".")}
+    assert names == {"map.json"} | {s[0].rsplit("/", 1)[1] for s in second["sheets"]}
+
+def test_missing_sheet_is_rebuilt(db, tmp_path):
+    for i in range(5):
+        _asset(db, tmp_path, 1, f"a{i}")
+    m = sprites.build(db, 1)
+    sheet = tmp_path / m["sheets"][1][0].removeprefix("/media/")
+    sheet.unlink()  # حذفه بناء متزامن في عامل آخر مثلًا
+    assert not sprites.is_complete(sprites.load_map(1))
+
+    assert sprites.build(db, 1) == m
+    assert sheet.is_file() and sprites.is_complete(m)
+    assert (sprites.sprite_dir(1) / ".lock").exists()
+
+def test_reconcile_ignores_sprites(db, tmp_path):
+    db.add(models.Album(id=1, title="t"))
+    db.commit()
+    _asset(db, tmp_path, 1, "a")
+    sprites.build(db, 1)
+    assert gc.scan_local(db, min_age=timedelta(0)) == []
@@ -0,0 +1,36 @@
+# tests/test_tracing.py
+import json
+
+from app.config import settings
+from app.services import tracing
+
+def test_span_is_noop_outside_a_trace():
+    with tracing.span("variant.encode", fmt="jpg") as sp:
+        assert sp is None
+    assert tracing.current_trace_id() is None
+
+def test_trace_writes_spans_and_summary(tmp_path, monkeypatch):
+    out = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(settings, "TRACE_FILE", out)
+    monkeypatch.setattr(settings, "TRACE_OTLP_ENDPOINT", None)
+
+    with tracing.trace("upload", files=1) as root:
+        with tracing.span("variants"):
+            with tracing.span("variant.encode", width=400, fmt="webp"):
+                pass
+            with tracing.span("variant.encode", width=400, fmt="webp"):
+                pass
+        with tracing.span("db.commit"):
+            pass
+
+    rows = [json.loads(l) for l in out.read_text(encoding="utf-8").splitlines()]
+    spans = [r for r in rows if r["type"] == "span"]
+    summary = rows[-1]
+    assert len(spans) == 5
+    assert {s["trace_id"] for s in spans} == {root.trace_id}
+    assert summary["type"] == "summary"
+    assert set(summary["stages"]) == {"variants", "db.commit"}
+    assert summary["breakdown"]["variant.encode[400/webp]"]["count"] == 2
+
+    otlp = tracing.to_otlp(root)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert sum("parentSpanId" not in s for s in otlp) == 1